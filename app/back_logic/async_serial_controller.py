@@ -0,0 +1,196 @@
+import asyncio
+
+import serial
+
+from app.back_logic.serial_controller import (
+	IDLE_GAP,
+	POLL_INTERVAL,
+	RESPONSE_DEADLINE,
+	ResponseFramer,
+	read_limit,
+)
+from app.back_logic.line_framer import LineFramer
+
+
+class AsyncSerialController:
+	"""
+	asyncio counterpart of SerialController. The port is opened non-blocking and incoming
+	bytes are collected by an event-loop reader on the port's file descriptor, so a single
+	process can drive many devices concurrently with asyncio.gather. Ports without a file
+	descriptor (loop://, Windows COM ports) fall back to polling from a background task.
+	Accepts any pyserial URL, e.g. socket://host:port or loop://.
+	"""
+
+	def __init__(
+			self,
+			port: str,
+			baudrate: int = 9600,
+			byte_size: int = serial.EIGHTBITS,
+			parity: str = serial.PARITY_NONE,
+			stop_bits: int = serial.STOPBITS_ONE,
+			response_deadline: float = RESPONSE_DEADLINE,
+			idle_gap: float = IDLE_GAP,
+	):
+		self.port = port
+		self.baudrate = baudrate if baudrate is not None else 9600
+		self.byte_size = byte_size
+		self.parity = parity
+		self.stop_bits = stop_bits
+		self.response_deadline = response_deadline
+		self.idle_gap = idle_gap
+
+		self.serial = None
+		self.rx = LineFramer()
+		self.data_ready = asyncio.Event()
+		self.reader_fd = None
+		self.poll_task = None
+		self.lock = asyncio.Lock()
+
+	async def open(self) -> bool:
+		if self.is_open():
+			return True
+
+		try:
+			self.serial = serial.serial_for_url(
+				self.port,
+				baudrate=self.baudrate,
+				bytesize=self.byte_size,
+				parity=self.parity,
+				stopbits=self.stop_bits,
+				timeout=0,
+			)
+		except serial.SerialException:
+			print("Serial port could not be opened.")
+			return False
+
+		loop = asyncio.get_running_loop()
+		try:
+			self.reader_fd = self.serial.fileno()
+			loop.add_reader(self.reader_fd, self.pump)
+		except (AttributeError, NotImplementedError, OSError, serial.SerialException):
+			self.reader_fd = None
+			self.poll_task = loop.create_task(self.poll())
+
+		return True
+
+	async def close(self):
+		if self.reader_fd is not None:
+			asyncio.get_running_loop().remove_reader(self.reader_fd)
+			self.reader_fd = None
+
+		if self.poll_task is not None:
+			self.poll_task.cancel()
+			self.poll_task = None
+
+		if self.serial is not None:
+			self.serial.close()
+
+	def is_open(self) -> bool:
+		return self.serial is not None and self.serial.is_open
+
+	def pump(self):
+		"""
+		Reads whatever the port has buffered into the receive buffer and wakes up the pending read.
+		"""
+		try:
+			received = self.rx.fill(self.serial)
+			if not received:
+				# readable with nothing waiting: a read tells EOF apart from a spurious wakeup
+				chunk = self.serial.read(1)
+				self.rx.feed(chunk)
+				received = len(chunk)
+		except serial.SerialException:
+			print("Serial port stopped responding.")
+			if self.reader_fd is not None:
+				asyncio.get_running_loop().remove_reader(self.reader_fd)
+				self.reader_fd = None
+			return
+
+		if received:
+			self.data_ready.set()
+
+	async def poll(self):
+		while self.is_open():
+			if self.serial.in_waiting:
+				self.pump()
+			await asyncio.sleep(POLL_INTERVAL)
+
+	async def send_command(
+			self,
+			command: str,
+			return_str: bool = True,
+			expected_lines: int | None = None,
+			deadline: float | None = None,
+	) -> str | bytes:
+		responses = await self.send_batch([command], [expected_lines], return_str, deadline)
+		response = responses[0] if responses[0] is not None else ""
+		return response if return_str else response.encode("utf-8")
+
+	async def send_batch(
+			self,
+			commands: list[str],
+			expected_lines: list[int | None] | None = None,
+			return_str: bool = True,
+			deadline: float | None = None,
+	) -> list[str | bytes | None]:
+		async with self.lock:
+			print(f"sending batch: {commands}")
+			if self.rx.pending:
+				# whatever is still buffered belongs to an earlier exchange
+				print(f"discarded data: {self.rx.take_partial()[0]!r}")
+			self.serial.write("".join(commands).encode("utf-8"))
+			responses = await self.read_responses(commands, expected_lines, deadline)
+
+		print(f"received batch: {responses}")
+
+		return [
+			response.encode("utf-8") if response is not None and not return_str else response
+			for response in responses
+		]
+
+	async def read_responses(
+			self,
+			commands: list[str],
+			expected_lines: list[int | None] | None = None,
+			deadline: float | None = None,
+	) -> list[str | None]:
+		deadline = self.response_deadline if deadline is None else deadline
+		framer = ResponseFramer(commands, expected_lines)
+		loop = asyncio.get_running_loop()
+		last_rx = loop.time()
+		limit = last_rx + read_limit(deadline, len(commands))
+
+		while not framer.done:
+			if loop.time() >= limit:
+				print("Response did not end in time, giving up.")
+				break
+
+			if self.data_ready.is_set():
+				self.data_ready.clear()
+				last_rx = loop.time()
+				for line, valid in self.rx.lines():
+					framer.feed(line, valid)
+					if framer.done:
+						break
+				continue
+
+			idle = loop.time() - last_rx
+			if idle >= self.idle_gap and framer.close_idle(self.rx):
+				continue
+			if idle >= deadline:
+				break
+
+			wait = self.idle_gap - idle if idle < self.idle_gap else deadline - idle
+			wait = min(wait, limit - loop.time())
+			try:
+				await asyncio.wait_for(self.data_ready.wait(), wait)
+			except asyncio.TimeoutError:
+				pass
+
+		return framer.finish(self.rx)
+
+	async def flush_buffer(self):
+		self.serial.reset_input_buffer()
+		self.serial.reset_output_buffer()
+		self.serial.flush()
+		self.rx.clear()
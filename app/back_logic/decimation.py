@@ -0,0 +1,153 @@
+import numpy as np
+
+from app.back_logic.telemetry_store import TelemetrySeries, rate
+
+BLOCK_FACTOR = 8  # samples per block of the first level, and blocks per block of the next
+MAX_LEVELS = 8
+
+
+class DecimatedSeries:
+	"""
+	A series of the telemetry store that can be drawn at any zoom in time proportional to
+	the pixel width. It keeps a pyramid of min/max levels over the store's samples, each
+	block of a level summarizing BLOCK_FACTOR blocks of the one below, extended
+	incrementally as samples arrive. A view is decimated from the coarsest level that
+	still has a couple of blocks per pixel, so neither drawing nor zooming and panning over
+	the full history scans the raw samples again.
+
+	The raw samples are not copied: they are read from the store's unwrapped values, or
+	with `rates`, derived from them for the few samples a view needs (the rate between two
+	consecutive samples, stamped at the later one).
+
+	A level is stored as a TelemetrySeries whose timestamps are the block start times and
+	whose value columns are the block end time, the minima and the maxima.
+	"""
+
+	def __init__(self, series: TelemetrySeries, rates: bool = False):
+		self.series = series
+		self.rates = rates
+		self.columns = series.columns
+		self.levels: list[TelemetrySeries] = []
+
+	def __len__(self):
+		return len(self.raw()[0])
+
+	def raw(self) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		Views of the store's timestamps and unwrapped values, taken together so they agree
+		while the poller keeps appending.
+		"""
+		times, values = self.series.unwrapped()
+		return (times[1:], (times, values)) if self.rates else (times, (times, values))
+
+	def values(self, source: tuple[np.ndarray, np.ndarray], first: int, last: int) -> np.ndarray:
+		"""
+		The raw values of samples `first` to `last` (exclusive), from the store arrays of raw().
+		"""
+		times, values = source
+		if self.rates:
+			return rate(times[first:last + 1], values[first:last + 1])
+		return values[first:last]
+
+	def update(self):
+		"""
+		Reduces the samples the store received since the last call into the levels.
+		"""
+		times, source = self.raw()
+		if self.levels and len(self.levels[0]) * BLOCK_FACTOR > len(times):
+			# the store series was cleared, its history starts over
+			self.levels = []
+
+		for depth in range(MAX_LEVELS):
+			count = len(times) if depth == 0 else len(self.levels[depth - 1])
+			complete = count // BLOCK_FACTOR
+			if complete == 0:
+				break
+			if depth == len(self.levels):
+				self.levels.append(TelemetrySeries(f"level {depth}", 1 + 2 * self.columns))
+
+			level = self.levels[depth]
+			if complete > len(level):
+				# only the blocks completed since the last update are reduced
+				first, last = len(level) * BLOCK_FACTOR, complete * BLOCK_FACTOR
+				if depth == 0:
+					starts = ends = times[first:last]
+					minima = maxima = self.values(source, first, last)
+				else:
+					starts, ends, minima, maxima = (blocks[first:last] for blocks in self.blocks(depth - 1))
+
+				edges = np.arange(0, last - first, BLOCK_FACTOR)
+				level.extend(
+					starts[::BLOCK_FACTOR],
+					np.column_stack([
+						ends[BLOCK_FACTOR - 1::BLOCK_FACTOR],
+						np.minimum.reduceat(minima, edges),
+						np.maximum.reduceat(maxima, edges),
+					]),
+				)
+
+	def blocks(self, depth: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+		"""
+		Start times, end times, minima and maxima of the blocks of a level, as views.
+		"""
+		starts, values = self.levels[depth].data()
+		return starts, values[:, 0], values[:, 1:1 + self.columns], values[:, 1 + self.columns:]
+
+	def time_range(self) -> tuple[float, float] | None:
+		times, _ = self.raw()
+		if not len(times):
+			return None
+		return times[0], times[-1]
+
+	def decimate(self, start: float, end: float, width: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+		"""
+		Min and max of the samples between `start` and `end` in each of `width` equal time
+		columns: (column indexes, minima, maxima), leaving out the empty columns. A level
+		block is placed in the column where it starts, so its extremes may belong to the
+		next column by less than a block.
+		"""
+		width = max(width, 1)
+		starts, minima, maxima = self.view(start, end, width)
+		if not len(starts):
+			empty = np.empty((0, self.columns))
+			return np.empty(0, dtype=np.int64), empty, empty
+
+		span = max(end - start, 1e-9)
+		columns = np.clip(((starts - start) / span * width).astype(np.int64), 0, width - 1)
+		# the blocks are in time order, so each column is one contiguous run
+		edges = np.flatnonzero(np.diff(columns, prepend=-1))
+		return columns[edges], np.minimum.reduceat(minima, edges), np.maximum.reduceat(maxima, edges)
+
+	def view(self, start: float, end: float, width: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+		"""
+		Start times, minima and maxima of the coarsest data with at least two blocks per
+		column between `start` and `end`: the blocks of one level that lie wholly inside
+		the window, with the raw samples before the first and after the last of them,
+		which are fewer than one block at each edge.
+		"""
+		raw_times, source = self.raw()
+		first = int(np.searchsorted(raw_times, start, side="left"))
+		last = int(np.searchsorted(raw_times, end, side="right"))
+		per_column = (last - first) / width
+
+		depth = -1
+		while depth + 1 < len(self.levels) and BLOCK_FACTOR ** (depth + 2) * 2 <= per_column:
+			depth += 1
+
+		if depth < 0:
+			values = self.values(source, first, last)
+			return raw_times[first:last], values, values
+
+		starts, ends, minima, maxima = self.blocks(depth)
+		samples_per_block = BLOCK_FACTOR ** (depth + 1)
+		block_first = int(np.searchsorted(starts, start, side="left"))
+		block_last = max(int(np.searchsorted(ends, end, side="right")), block_first)
+		# block i covers the raw samples from i * samples_per_block on
+		head = min(block_first * samples_per_block, last)
+		rest = max(block_last * samples_per_block, head)
+		head_values, rest_values = self.values(source, first, head), self.values(source, rest, last)
+		return (
+			np.concatenate([raw_times[first:head], starts[block_first:block_last], raw_times[rest:last]]),
+			np.concatenate([head_values, minima[block_first:block_last], rest_values]),
+			np.concatenate([head_values, maxima[block_first:block_last], rest_values]),
+		)
@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Any
+
+from app.back_logic.protocol import COMMANDS, DEVID, PULSECOUNT1, PULSECOUNT2, Command, read_values
+
+CACHE_TTL = 300.0  # seconds a cached value is served before it is read again
+UNCACHED = {PULSECOUNT1.name, PULSECOUNT2.name}  # change on their own, always read from the device
+SETTERS = {command.set_prefix: command.name for command in COMMANDS.values() if command.set_prefix is not None}
+
+
+def written_commands(data: str) -> set[str]:
+	"""
+	Names of the commands whose value is changed by the writes in `data`,
+	e.g. "AT+CONFIG=16,00\r\n" -> {"IN3MODE"}.
+	"""
+	names = set()
+	for line in data.split("\r\n"):
+		if "=" not in line:
+			continue
+		name = SETTERS.get(line.split("=")[0] + "=")
+		if name is not None:
+			names.add(name)
+	return names
+
+
+class DeviceCache:
+	"""
+	Read-through cache of configuration values, keyed by the device ID so values read from
+	one ECM are never shown for another. Values expire after `ttl` seconds, and the
+	controller drops a value as soon as a write for the same command goes out. The
+	connected device is identified on the first read after the port is (re)opened, with
+	AT+DEVID? riding along in the same batch. The counters in UNCACHED are never kept;
+	reading them through the cache always queries the device.
+	"""
+
+	def __init__(self, ttl: float = CACHE_TTL):
+		self.ttl = ttl
+		self.device_id = None
+		self.entries: dict[str, dict[str, tuple[float, Any]]] = {}
+		self.lock = threading.Lock()
+
+	def read(self, controller, commands: list[Command], refresh: bool = False) -> list[Any]:
+		"""
+		Returns the values of `commands`, reading the missing or expired ones (all of them
+		with `refresh`) from the device in one pipelined batch.
+		"""
+		with self.lock:
+			device_id = self.device_id
+			stale = commands if refresh or device_id is None else [
+				command for command in commands if self.lookup(device_id, command) is None
+			]
+
+		if stale or device_id is None:
+			identify = device_id is None and DEVID not in stale
+			queries = [DEVID] + stale if identify else stale
+			with controller.programming_mode():
+				values = read_values(controller, queries)
+
+			with self.lock:
+				if identify:
+					device_id = self.device_id = values.pop(0)
+				elif device_id is None:
+					device_id = self.device_id = values[stale.index(DEVID)]
+				now = time.monotonic()
+				entries = self.entries.setdefault(device_id, {})
+				for command, value in zip(stale, values):
+					if command.name not in UNCACHED:
+						entries[command.name] = (now, value)
+			fresh = {command.name: value for command, value in zip(stale, values)}
+		else:
+			fresh = {}
+
+		with self.lock:
+			entries = self.entries[device_id]
+			return [
+				fresh[command.name] if command.name in fresh else entries[command.name][1]
+				for command in commands
+			]
+
+	def store(self, command: Command, value: Any):
+		"""
+		Caches a value read outside of `read`, e.g. streamed. Ignored while the connected
+		device is not known.
+		"""
+		if command.name in UNCACHED:
+			return
+
+		with self.lock:
+			if self.device_id is not None:
+				self.entries.setdefault(self.device_id, {})[command.name] = (time.monotonic(), value)
+
+	def peek(self, commands: list[Command]) -> list[Any] | None:
+		"""
+		The cached values of `commands` for the connected device without touching the port,
+		or None if any of them would have to be read.
+		"""
+		with self.lock:
+			if self.device_id is None:
+				return None
+
+			values = [self.lookup(self.device_id, command) for command in commands]
+			if any(value is None for value in values):
+				return None
+			return [value[0] for value in values]
+
+	def lookup(self, device_id: str, command: Command) -> tuple[Any] | None:
+		if command.name in UNCACHED:
+			return None
+
+		entry = self.entries.get(device_id, {}).get(command.name)
+		if entry is None or time.monotonic() - entry[0] > self.ttl:
+			return None
+		return (entry[1],)
+
+	def invalidate_writes(self, data: str):
+		names = written_commands(data)
+		if not names:
+			return
+
+		with self.lock:
+			# with the device unknown the writes could belong to any of them
+			devices = [self.device_id] if self.device_id is not None else list(self.entries)
+			for device_id in devices:
+				for name in names:
+					self.entries.get(device_id, {}).pop(name, None)
+
+	def forget_device(self):
+		"""
+		Called when the port changes or closes, the next read identifies the device again.
+		"""
+		with self.lock:
+			self.device_id = None
+
+	def clear(self):
+		with self.lock:
+			self.device_id = None
+			self.entries.clear()
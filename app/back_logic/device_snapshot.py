@@ -0,0 +1,72 @@
+import time
+
+from app.back_logic.protocol import (
+	ACINPUT,
+	DEVID,
+	FPULSE,
+	IN3MODE,
+	MBADDR,
+	MBREGCFG,
+	MSGVAR,
+	NETWORK,
+	OFFSET,
+	PULSECOUNT1,
+	PULSECOUNT2,
+	SCHEDULE,
+)
+
+# every parameter shown by a panel or dialog, each read once
+SNAPSHOT_COMMANDS = [
+	NETWORK, DEVID, PULSECOUNT1, PULSECOUNT2, SCHEDULE, ACINPUT, IN3MODE,
+	MBADDR, MBREGCFG, MSGVAR, OFFSET, FPULSE,
+]
+
+
+class DeviceSnapshot:
+	"""
+	The whole configuration of one ECM as read in a single session, with the values
+	already parsed: `schedule`, `ac_input` and each of `registers` are dicts keyed by the
+	protocol field names, `msgvar` maps payload slots to variable codes.
+	"""
+
+	def __init__(
+			self,
+			network_type: int,
+			device_id: str,
+			pulse_count1: int,
+			pulse_count2: int,
+			schedule: dict[str, int],
+			ac_input: dict[str, int],
+			in3_mode: int,
+			modbus_address: int,
+			registers: list[dict[str, int]],
+			msgvar: dict[int, int | None],
+			offset: int | float,
+			pulse_factor: int | float,
+	):
+		self.network_type = network_type
+		self.device_id = device_id
+		self.pulse_count1 = pulse_count1
+		self.pulse_count2 = pulse_count2
+		self.schedule = schedule
+		self.ac_input = ac_input
+		self.in3_mode = in3_mode
+		self.modbus_address = modbus_address
+		self.registers = registers
+		self.msgvar = msgvar
+		self.offset = offset
+		self.pulse_factor = pulse_factor
+		self.read_at = time.time()
+
+	def __repr__(self):
+		return f"DeviceSnapshot(id={self.device_id}, network={self.network_type}, registers={len(self.registers)})"
+
+
+def read_snapshot(controller, refresh: bool = False) -> DeviceSnapshot:
+	"""
+	Reads every parameter of the connected device in one programming mode session, with all
+	the queries pipelined in a single batch. Values still in the device cache are not asked
+	again unless `refresh` is set, and the values read are left in the cache, so the panels
+	opened afterwards don't go to the port at all.
+	"""
+	return DeviceSnapshot(*controller.cache.read(controller, SNAPSHOT_COMMANDS, refresh))
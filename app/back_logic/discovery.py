@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import serial
+
+from app.back_logic.protocol import DEVID, NETWORK, NETWORK_TYPES, ResponseError
+from app.back_logic.serial_controller import SerialController, list_available_serial_ports
+
+DISCOVERY_BUDGET = 2.0  # seconds for the whole scan, however many ports there are
+PROBE_DEADLINE = 0.5  # seconds a single port gets to answer the handshake
+MAX_WORKERS = 16
+
+
+class DiscoveredDevice:
+	def __init__(self, port: str, device_id: str, network_type: str, baudrate: int, latency: float):
+		self.port = port
+		self.device_id = device_id
+		self.network_type = network_type
+		self.baudrate = baudrate
+		self.latency = latency  # seconds from the handshake write to the last answer
+
+	def __repr__(self):
+		return (
+			f"DiscoveredDevice({self.port}, id={self.device_id}, network={self.network_type}, "
+			f"baud={self.baudrate}, latency={self.latency * 1000:.0f}ms)"
+		)
+
+
+def probe_port(port: str, baudrate: int = 9600, deadline: float = PROBE_DEADLINE) -> DiscoveredDevice | None:
+	"""
+	Sends the AT+DEVID? / AT+NETWORK? handshake to `port` in one burst.
+	Returns the device found there, or None if the port is busy or nothing answered like an ECM.
+	"""
+	try:
+		controller = SerialController(port, baudrate=baudrate, timeout=0, response_deadline=deadline)
+	except (serial.SerialException, ValueError, OSError):
+		return None
+
+	if not controller.is_open():
+		return None
+
+	try:
+		start = time.monotonic()
+		# the scan has a time budget, a port that answers garbage is not worth a retry
+		device_id, network = controller.send_batch([DEVID.query(), NETWORK.query()], retries=0)
+		latency = time.monotonic() - start
+	except (serial.SerialException, OSError):
+		return None
+	finally:
+		controller.close()
+
+	try:
+		device_id = DEVID.parse(device_id)
+	except ResponseError:
+		return None
+
+	try:
+		network_type = NETWORK_TYPES.get(NETWORK.parse(network), "Desconocido")
+	except ResponseError:
+		network_type = "Desconocido"
+
+	return DiscoveredDevice(port, device_id, network_type, baudrate, latency)
+
+
+def discover_devices(
+		ports: list[str] | None = None,
+		baudrate: int = 9600,
+		budget: float = DISCOVERY_BUDGET,
+		max_workers: int = MAX_WORKERS,
+) -> list[DiscoveredDevice]:
+	"""
+	Probes every port in `ports` (all the serial ports of the machine by default) in
+	parallel and returns the ECM devices that answered, sorted by port. The scan never
+	takes much longer than `budget` seconds: ports still being probed when it runs out
+	are left out of the results.
+	"""
+	ports = list_available_serial_ports() if ports is None else ports
+	if not ports:
+		return []
+
+	deadline = min(PROBE_DEADLINE, budget)
+	pool = ThreadPoolExecutor(max_workers=min(max_workers, len(ports)), thread_name_prefix="discovery")
+	futures = [pool.submit(probe_port, port, baudrate, deadline) for port in ports]
+	done, not_done = wait(futures, timeout=budget)
+
+	# a port that hangs on open must not hold up the results, its thread finishes on its own
+	pool.shutdown(wait=False, cancel_futures=True)
+	if not_done:
+		print(f"Discovery budget exhausted, {len(not_done)} ports not probed")
+
+	devices = [future.result() for future in done if future.exception() is None and future.result() is not None]
+	devices.sort(key=lambda device: device.port)
+
+	return devices
@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+from contextlib import ExitStack
+from typing import Callable
+
+import serial
+
+from app.back_logic.protocol import (
+	DEVID,
+	NOT_CONFIGURED,
+	PULSECOUNT1,
+	PULSECOUNT2,
+	SCHEDULE,
+	ResponseError,
+	read_values,
+)
+from app.back_logic.pulse_monitor import MIN_SAMPLE_INTERVAL
+from app.back_logic.serial_controller import SerialController, cached_baud_rate
+from app.back_logic.serial_worker import SerialWorker, call_directly
+
+POLL_INTERVAL = 2.0  # seconds between two polls of the same port
+STOP_TIMEOUT = 5.0  # seconds all the ports together get to leave programming mode and close
+
+
+def format_time(hour: int, minute: int) -> str:
+	return f"{hour:02d}:{minute:02d}" if hour != NOT_CONFIGURED else "No configurado"
+
+
+def contactor_state(schedule: dict[str, int], now: time.struct_time | None = None) -> str:
+	"""
+	The state the schedule puts the contactor in at `now` (local time by default): the
+	on_relay state between the on and off times, the opposite outside, also across midnight.
+	"""
+	if schedule["on_hour"] == NOT_CONFIGURED or schedule["off_hour"] == NOT_CONFIGURED:
+		return "No configurado"
+
+	now = time.localtime() if now is None else now
+	minute = now.tm_hour * 60 + now.tm_min
+	on = schedule["on_hour"] * 60 + schedule["on_minute"]
+	off = schedule["off_hour"] * 60 + schedule["off_minute"]
+	in_on_period = on <= minute < off if on <= off else minute >= on or minute < off
+
+	closed = (schedule["on_relay"] == 1) == in_on_period
+	return "Cerrado" if closed else "Abierto"
+
+
+class DeviceReading:
+	"""
+	The last values polled from one port, as the strings the dashboard shows.
+	"""
+
+	def __init__(self, port: str):
+		self.port = port
+		self.device_id = ""
+		self.pulse_count1 = ""
+		self.pulse_count2 = ""
+		self.schedule_on = ""
+		self.schedule_off = ""
+		self.contactor = ""
+		self.status = "Conectando..."
+		self.updated_at = None
+
+	def cells(self) -> list[str]:
+		updated = time.strftime("%H:%M:%S", time.localtime(self.updated_at)) if self.updated_at else ""
+		return [
+			self.port,
+			self.device_id,
+			self.pulse_count1,
+			self.pulse_count2,
+			self.schedule_on,
+			self.schedule_off,
+			self.contactor,
+			self.status,
+			updated,
+		]
+
+
+class FleetMonitor:
+	"""
+	Watches several ECM units at once, one port each. Every port gets its own controller
+	and SerialWorker, so a slow or silent device never holds up the others, and one
+	scheduler thread spaces the polls evenly: with N ports a poll starts every
+	interval / N seconds, going round the ports in turn. A port whose previous poll has
+	not finished skips its turn.
+
+	`on_update(reading)` gets a copy of the port's DeviceReading after every poll, through
+	`dispatch` (wx.CallAfter in the GUI).
+	"""
+
+	def __init__(
+			self,
+			ports: list[str],
+			on_update: Callable[[DeviceReading], None],
+			interval: float = POLL_INTERVAL,
+			baudrate: int | None = None,
+			dispatch: Callable = call_directly,
+	):
+		self.ports = ports
+		self.on_update = on_update
+		self.interval = max(interval, MIN_SAMPLE_INTERVAL)
+		self.baudrate = baudrate
+		self.dispatch = dispatch
+
+		self.readings = {port: DeviceReading(port) for port in ports}
+		self.workers: dict[str, SerialWorker] = {}
+		self.pending = {}
+		self.sessions = {port: ExitStack() for port in ports}
+		self.stop_event = threading.Event()
+		self.thread = None
+
+	def start(self):
+		for port in self.ports:
+			self.workers[port] = SerialWorker(self.open_port(port), dispatch=self.dispatch)
+			self.workers[port].submit(lambda controller, port=port: self.enter_session(controller, port))
+
+		self.stop_event.clear()
+		self.thread = threading.Thread(target=self.run, name="fleet-monitor", daemon=True)
+		self.thread.start()
+
+	def open_port(self, port: str) -> SerialController:
+		baudrate = cached_baud_rate(port) or self.baudrate
+		return SerialController(port, baudrate=baudrate)
+
+	def enter_session(self, controller, port: str):
+		if controller.is_open():
+			# the polls stay in programming mode, like the single device monitor
+			self.sessions[port].enter_context(controller.programming_mode())
+
+	def stop(self, timeout: float = STOP_TIMEOUT):
+		"""
+		Every port leaves programming mode and closes at the same time, so stopping takes as
+		long as the slowest port, at most `timeout`. Blocks until then; the dashboard calls
+		it off the UI thread.
+		"""
+		if self.thread is not None:
+			self.stop_event.set()
+			self.thread.join()
+			self.thread = None
+
+		workers, self.workers = list(self.workers.items()), {}
+		for port, worker in workers:
+			worker.submit(lambda controller, port=port: self.leave_session(controller, port))
+			worker.request_stop()
+
+		deadline = time.monotonic() + timeout
+		for port, worker in workers:
+			worker.thread.join(max(0.0, deadline - time.monotonic()))
+			if worker.thread.is_alive():
+				print(f"{port} did not stop within {timeout}s")
+
+	def leave_session(self, controller, port: str):
+		try:
+			self.sessions[port].close()
+		except (serial.SerialException, OSError) as e:
+			print(f"Could not leave programming mode on {port}: {e}")
+		if controller.is_open():
+			controller.close()
+
+	def run(self):
+		slot = self.interval / len(self.ports)
+		next_tick = time.monotonic()
+		turn = 0
+		while not self.stop_event.wait(max(0.0, next_tick - time.monotonic())):
+			port = self.ports[turn % len(self.ports)]
+			turn += 1
+
+			pending = self.pending.get(port)
+			if pending is None or pending.done():
+				self.pending[port] = self.workers[port].submit(lambda controller, port=port: self.poll(controller, port))
+
+			next_tick += slot
+			behind = time.monotonic() - next_tick
+			if behind > 0:
+				# a late scheduler drops whole slots instead of firing a burst of polls
+				skipped = math.ceil(behind / slot)
+				next_tick += skipped * slot
+				turn += skipped
+
+	def poll(self, controller, port: str):
+		reading = self.readings[port]
+		if not controller.is_open():
+			reading.status = "No disponible"
+		else:
+			try:
+				# the ID and schedule rarely change, the cache only reads them again when stale
+				device_id, schedule = controller.cache.read(controller, [DEVID, SCHEDULE])
+				pulse_count1, pulse_count2 = read_values(controller, [PULSECOUNT1, PULSECOUNT2])
+			except (ResponseError, serial.SerialException, OSError) as e:
+				print(f"Poll of {port} failed: {e}")
+				reading.status = "Sin respuesta"
+			else:
+				reading.device_id = device_id.lstrip("0")
+				reading.pulse_count1 = str(pulse_count1)
+				reading.pulse_count2 = str(pulse_count2)
+				reading.schedule_on = format_time(schedule["on_hour"], schedule["on_minute"])
+				reading.schedule_off = format_time(schedule["off_hour"], schedule["off_minute"])
+				reading.contactor = contactor_state(schedule)
+				reading.status = "OK"
+				reading.updated_at = time.time()
+
+		snapshot = DeviceReading(port)
+		snapshot.__dict__.update(reading.__dict__)
+		self.dispatch(self.on_update, snapshot)
@@ -0,0 +1,62 @@
+from collections import deque
+
+LATENCY_WINDOW = 32  # samples kept per command verb
+MIN_SAMPLES = 5  # below this the default deadline is used
+PERCENTILE = 0.95
+FACTOR = 2.0
+MARGIN = 0.05  # seconds
+MIN_DEADLINE = 0.1
+MAX_DEADLINE = 5.0
+
+
+def command_verb(command: str) -> str:
+	"""
+	"AT+MBREGCFG=0,1,352\r\n" -> "AT+MBREGCFG=", "AT+MBREGCFG?\r\n" -> "AT+MBREGCFG?"
+	"""
+	command = command.strip()
+	if "=" in command:
+		return command.split("=")[0] + "="
+	return command
+
+
+class LatencyTracker:
+	"""
+	Rolling response times per command verb, used to give each command a deadline that
+	fits it: the 95th percentile of the recent samples times a factor plus a margin.
+	Until a verb has enough samples it gets the conservative `default`. A command that
+	times out drops the samples of its verb, so an estimate that turned out too tight
+	falls back to the default instead of failing forever. Timeouts are never samples
+	themselves: a silent device would otherwise push the deadline up to MAX_DEADLINE.
+	"""
+
+	def __init__(self, default: float, window: int = LATENCY_WINDOW):
+		self.default = default
+		self.window = window
+		self.samples: dict[str, deque] = {}
+
+	def record(self, command: str, latency: float):
+		verb = command_verb(command)
+		if verb not in self.samples:
+			self.samples[verb] = deque(maxlen=self.window)
+		self.samples[verb].append(latency)
+
+	def record_timeout(self, command: str):
+		self.samples.pop(command_verb(command), None)
+
+	def reset(self):
+		"""
+		Forgets every sample, for when the port or the device on it changes.
+		"""
+		self.samples.clear()
+
+	def deadline(self, command: str) -> float:
+		samples = self.samples.get(command_verb(command))
+		if samples is None or len(samples) < MIN_SAMPLES:
+			return self.default
+
+		ordered = sorted(samples)
+		percentile = ordered[round(PERCENTILE * (len(ordered) - 1))]
+		return min(max(percentile * FACTOR + MARGIN, MIN_DEADLINE), MAX_DEADLINE)
+
+	def batch_deadline(self, commands: list[str]) -> float:
+		return max((self.deadline(command) for command in commands), default=self.default)
@@ -0,0 +1,94 @@
+from typing import Iterator
+
+RX_BUFFER_SIZE = 4096
+LINE_BREAK = b"\r\n"
+
+
+class LineFramer:
+	"""
+	Receive buffer for the serial path. The port is read straight into a preallocated
+	bytearray with readinto, and complete CRLF-terminated lines are handed out as soon as
+	they arrive, each one decoded exactly once. Consumed space is reclaimed by moving the
+	unread tail back to the front, so the same buffer is reused for the whole connection.
+	A line that is not valid UTF-8 (noise, wrong baud rate) is counted as a framing error
+	and handed out with replacement characters instead of raising.
+	"""
+
+	def __init__(self, size: int = RX_BUFFER_SIZE):
+		self.buffer = bytearray(size)
+		self.view = memoryview(self.buffer)
+		self.start = 0  # first byte not handed out yet
+		self.end = 0  # one past the last byte received
+		self.framing_errors = 0
+
+	@property
+	def pending(self) -> int:
+		return self.end - self.start
+
+	def fill(self, port) -> int:
+		"""
+		Reads whatever `port` has waiting into the free space of the buffer.
+		Returns the number of bytes received.
+		"""
+		waiting = port.in_waiting
+		if not waiting:
+			return 0
+
+		self.reserve(waiting)
+		received = port.readinto(self.view[self.end:self.end + waiting]) or 0
+		self.end += received
+		return received
+
+	def feed(self, data: bytes):
+		self.reserve(len(data))
+		self.buffer[self.end:self.end + len(data)] = data
+		self.end += len(data)
+
+	def reserve(self, size: int):
+		if self.end + size <= len(self.buffer):
+			return
+
+		pending = self.pending
+		if pending + size <= len(self.buffer):
+			self.buffer[:pending] = self.view[self.start:self.end]
+		else:
+			grown = bytearray(max(2 * len(self.buffer), pending + size))
+			grown[:pending] = self.view[self.start:self.end]
+			self.view.release()
+			self.buffer = grown
+			self.view = memoryview(self.buffer)
+
+		self.start = 0
+		self.end = pending
+
+	def lines(self) -> Iterator[tuple[str, bool]]:
+		"""
+		Yields (text, valid) for every complete line in the buffer, without the line break.
+		`valid` is False when the line could not be decoded.
+		"""
+		while (end := self.buffer.find(LINE_BREAK, self.start, self.end)) >= 0:
+			raw = self.view[self.start:end]
+			self.start = end + len(LINE_BREAK)
+			yield self.decode(raw)
+
+		if self.start == self.end:
+			self.start = self.end = 0
+
+	def take_partial(self) -> tuple[str, bool]:
+		"""
+		Hands out the bytes of an unterminated line, e.g. when the device went quiet mid-line.
+		"""
+		partial = self.decode(self.view[self.start:self.end])
+		self.clear()
+		return partial
+
+	def decode(self, raw: memoryview) -> tuple[str, bool]:
+		try:
+			return str(raw, "utf-8"), True
+		except UnicodeDecodeError:
+			self.framing_errors += 1
+			print(f"framing error, undecodable line: {bytes(raw)}")
+			return str(raw, "utf-8", errors="replace"), False
+
+	def clear(self):
+		self.start = self.end = 0
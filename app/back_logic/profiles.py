@@ -0,0 +1,183 @@
+import json
+import struct
+import time
+import zlib
+from typing import Callable
+
+from app.back_logic.device_snapshot import DeviceSnapshot, read_snapshot
+from app.back_logic.provisioning import build_commands
+from app.back_logic.verification import write_session
+from app.back_logic.write_journal import send_journaled, start_journal
+
+PROFILE_FORMAT = "ecm-profile"
+PROFILE_VERSION = 1
+PROFILE_KEYS = [
+	"schedule", "ac_input", "in3_mode", "modbus_address", "modbus_registers", "msgvar", "offset", "pulse_factor",
+]
+
+# binary form: magic, version, payload length, zlib compressed JSON payload, CRC32 of everything before it
+BINARY_MAGIC = b"ECMP"
+BINARY_HEADER = struct.Struct("<4sBI")
+BINARY_CRC = struct.Struct("<I")
+BINARY_EXTENSION = ".ecmp"
+
+
+class ProfileError(ValueError):
+	"""
+	The profile file is damaged, from a newer version, or holds values that can't be applied.
+	"""
+
+
+def profile_from_config(config: dict, name: str = "", source_device: str | None = None) -> dict:
+	validate_config(config)
+	return {
+		"format": PROFILE_FORMAT,
+		"version": PROFILE_VERSION,
+		"name": name,
+		"source_device": source_device,
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"config": config,
+	}
+
+
+def profile_from_snapshot(snapshot: DeviceSnapshot, name: str = "") -> dict:
+	"""
+	Everything the app can set on a device, taken from a snapshot of it. The payload
+	variables are kept in slot order, unassigned slots are left out.
+	"""
+	config = {
+		"schedule": snapshot.schedule,
+		"ac_input": snapshot.ac_input,
+		"in3_mode": snapshot.in3_mode,
+		"modbus_address": snapshot.modbus_address,
+		"modbus_registers": snapshot.registers,
+		"msgvar": [code for _, code in sorted(snapshot.msgvar.items()) if code is not None],
+		"offset": snapshot.offset,
+		"pulse_factor": snapshot.pulse_factor,
+	}
+	return profile_from_config(config, name, snapshot.device_id)
+
+
+def read_profile(controller, name: str = "") -> dict:
+	return profile_from_snapshot(read_snapshot(controller), name)
+
+
+def validate_config(config: dict):
+	unknown = set(config) - set(PROFILE_KEYS)
+	if unknown:
+		raise ProfileError(f"unknown profile keys: {sorted(unknown)}")
+
+	try:
+		build_commands(config)
+	except (KeyError, TypeError, ValueError) as e:
+		raise ProfileError(f"invalid profile values: {e!r}") from None
+
+
+def validate_profile(profile: dict) -> dict:
+	if not isinstance(profile, dict) or profile.get("format") != PROFILE_FORMAT:
+		raise ProfileError("not an ECM profile")
+	if not isinstance(profile.get("version"), int) or profile["version"] > PROFILE_VERSION:
+		raise ProfileError(f"unsupported profile version: {profile.get('version')}")
+	if not isinstance(profile.get("config"), dict):
+		raise ProfileError("profile has no configuration")
+
+	validate_config(profile["config"])
+	return profile
+
+
+def dumps_json(profile: dict) -> str:
+	return json.dumps(profile, indent=4)
+
+
+def loads_json(text: str) -> dict:
+	try:
+		profile = json.loads(text)
+	except json.JSONDecodeError as e:
+		raise ProfileError(f"invalid JSON: {e}") from None
+	return validate_profile(profile)
+
+
+def dumps_binary(profile: dict) -> bytes:
+	payload = zlib.compress(json.dumps(profile, separators=(",", ":")).encode(), 9)
+	data = BINARY_HEADER.pack(BINARY_MAGIC, profile["version"], len(payload)) + payload
+	return data + BINARY_CRC.pack(zlib.crc32(data))
+
+
+def loads_binary(data: bytes) -> dict:
+	if len(data) < BINARY_HEADER.size + BINARY_CRC.size:
+		raise ProfileError("profile file is truncated")
+
+	magic, version, length = BINARY_HEADER.unpack_from(data)
+	if magic != BINARY_MAGIC:
+		raise ProfileError("not an ECM profile")
+	if version > PROFILE_VERSION:
+		raise ProfileError(f"unsupported profile version: {version}")
+
+	end = BINARY_HEADER.size + length
+	if len(data) != end + BINARY_CRC.size:
+		raise ProfileError("profile file is truncated")
+	if BINARY_CRC.unpack_from(data, end)[0] != zlib.crc32(data[:end]):
+		raise ProfileError("profile checksum does not match, the file is damaged")
+
+	try:
+		profile = json.loads(zlib.decompress(data[BINARY_HEADER.size:end]))
+	except (zlib.error, ValueError) as e:
+		raise ProfileError(f"profile payload does not decode: {e}") from None
+	return validate_profile(profile)
+
+
+def save_profile(path: str, profile: dict):
+	"""
+	Writes the binary form when `path` ends with .ecmp, JSON otherwise.
+	"""
+	validate_profile(profile)
+	if path.lower().endswith(BINARY_EXTENSION):
+		with open(path, "wb") as profile_file:
+			profile_file.write(dumps_binary(profile))
+	else:
+		with open(path, "w", encoding="utf-8") as profile_file:
+			profile_file.write(dumps_json(profile))
+
+
+def load_profile(path: str) -> dict:
+	"""
+	Reads either form, told apart by the magic at the start of the file.
+	"""
+	with open(path, "rb") as profile_file:
+		data = profile_file.read()
+
+	if data.startswith(BINARY_MAGIC):
+		return loads_binary(data)
+	try:
+		return loads_json(data.decode("utf-8"))
+	except UnicodeDecodeError:
+		raise ProfileError("not an ECM profile") from None
+
+
+def apply_profile(
+		controller,
+		profile: dict,
+		on_progress: Callable[[int, int], None] | None = None,
+		verify: bool | None = None,
+) -> list[tuple[str, str]]:
+	"""
+	Writes the configuration of `profile` to the connected device in one programming mode
+	session, streaming the writes. `on_progress(done, total)` is called as each write is
+	answered. Returns (command, response) for every write the device did not accept.
+	With `verify` (the verify_writes setting by default) everything written is read back
+	at the end and VerificationError is raised if the device did not keep it.
+	"""
+	commands = build_commands(validate_profile(profile)["config"])
+	done = 0
+
+	def on_response(index, response):
+		nonlocal done
+		done += 1
+		if on_progress is not None:
+			on_progress(done, len(commands))
+
+	with write_session(controller, verify):
+		# journaled, so a push cut off midway resumes where it stopped the next time
+		journal = start_journal(controller, commands, profile.get("name") or "Perfil")
+		done = len(commands) - len(journal.remaining())
+		return send_journaled(controller, journal, journal.remaining(), on_response)
@@ -0,0 +1,279 @@
+import re
+from typing import Any, Callable
+
+NOT_CONFIGURED = 99  # hour value the device reports for a schedule slot that is not set
+MSGVAR_RESET = 255
+MBREGCFG_ROWS = 10
+NETWORK_TYPES = {0: "Sigfox", 1: "LoRaWAN", 2: "Celular"}
+
+SCHEDULE_FIELDS = ["on_hour", "on_minute", "on_relay", "off_hour", "off_minute", "off_relay"]
+ACINPUT_FIELDS = ["start_hour", "start_minute", "end_hour", "end_minute"]
+MBREGCFG_FIELDS = [
+	"register_position",
+	"enable_flag",
+	"modbus_register_address",
+	"data_type",
+	"num_bytes",
+	"sampling_frequency",
+	"decimal_positions",
+	"cumulative_flag",
+]
+
+LINE_BREAK_RE = re.compile(r"\r?\n")
+FIELD_RE = re.compile(r"^([A-Z0-9]+):\s*(.*?)\s*$")  # "DEVID: 00ABC123"
+CSV_RE = re.compile(r"\s*,\s*")
+INT_RE = re.compile(r"-?\d+")
+MSGVAR_RE = re.compile(r"^(\d+) - (.+?)$")  # "0 - 10", "2 - unassigned"
+
+
+class ResponseError(ValueError):
+	"""
+	The device answered ERROR, did not answer, or answered something that does not parse.
+	"""
+
+
+def value_lines(response: str | None) -> list[str]:
+	"""
+	Splits a response into its value lines, dropping blank lines and the OK terminator.
+	"""
+	if response is None:
+		raise ResponseError("no response")
+
+	lines = [line.strip() for line in LINE_BREAK_RE.split(response)]
+	if "ERROR" in lines:
+		raise ResponseError("device answered ERROR")
+
+	return [line for line in lines if line and line != "OK"]
+
+
+def first_line(lines: list[str]) -> str:
+	if not lines:
+		raise ResponseError("empty response")
+	return lines[0]
+
+
+def parse_field(lines: list[str], name: str | None = None) -> str:
+	"""
+	"NAME: value" -> "value". With `name`, a reply tagged with another name (the late
+	reply of an earlier command) is rejected.
+	"""
+	match = FIELD_RE.match(first_line(lines))
+	if match is None:
+		raise ResponseError(f"unexpected response: {lines[0]!r}")
+	if name is not None and match.group(1) != name:
+		raise ResponseError(f"reply of another command: {lines[0]!r}")
+	return match.group(2)
+
+
+def parse_int(text: str, base: int = 10) -> int:
+	try:
+		return int(text, base)
+	except ValueError:
+		raise ResponseError(f"not a number: {text!r}") from None
+
+
+def parse_number(text: str) -> int | float:
+	try:
+		return int(text)
+	except ValueError:
+		pass
+	try:
+		return float(text)
+	except ValueError:
+		raise ResponseError(f"not a number: {text!r}") from None
+
+
+def parse_csv(line: str, fields: list[str]) -> dict[str, int]:
+	# some firmware versions leave trailing characters after the last field, only the
+	# leading digits of each value are taken
+	values = CSV_RE.split(line.strip().rstrip(","))
+	if len(values) < len(fields):
+		raise ResponseError(f"expected {len(fields)} values: {line!r}")
+
+	parsed = {}
+	for field, value in zip(fields, values):
+		match = INT_RE.match(value)
+		if match is None:
+			raise ResponseError(f"not a number: {value!r}")
+		parsed[field] = int(match.group())
+	return parsed
+
+
+def parse_network(lines: list[str]) -> int:
+	return parse_int(parse_field(lines, "NETWORK"))
+
+
+def parse_device_id(lines: list[str]) -> str:
+	return parse_field(lines, "DEVID")
+
+
+def parse_pulse_count(lines: list[str]) -> int:
+	return parse_int(first_line(lines), 16)
+
+
+def parse_schedule(lines: list[str]) -> dict[str, int]:
+	return parse_csv(first_line(lines), SCHEDULE_FIELDS)
+
+
+def parse_ac_input(lines: list[str]) -> dict[str, int]:
+	return parse_csv(first_line(lines), ACINPUT_FIELDS)
+
+
+def parse_in3_mode(lines: list[str]) -> int:
+	"""
+	1 when the digital input only sends alerts (OPENING_DETECTION), 0 when it switches the relay.
+	"""
+	return 1 if "OPENING_DETECTION" in first_line(lines) else 0
+
+
+def parse_modbus_address(lines: list[str]) -> int:
+	return parse_int(first_line(lines).split(" ")[-1])
+
+
+def parse_registers(lines: list[str]) -> list[dict[str, int]]:
+	return [parse_csv(line, MBREGCFG_FIELDS) for line in lines]
+
+
+def parse_msgvar(lines: list[str]) -> dict[int, int | None]:
+	"""
+	Payload slot -> variable code, None for unassigned slots.
+	"""
+	slots = {}
+	for line in lines:
+		match = MSGVAR_RE.match(line)
+		if match is None:
+			continue
+		position, value = match.groups()
+		slots[int(position)] = None if value.lower() == "unassigned" else parse_int(value)
+	return slots
+
+
+def parse_last_number(lines: list[str]) -> int | float:
+	return parse_number(first_line(lines).split(" ")[-1])
+
+
+def encode_values(*values) -> str:
+	return ",".join(str(value) for value in values)
+
+
+def encode_fields(fields: list[str], time_fields: tuple[str, ...]) -> Callable[[dict], str]:
+	def encode(values: dict) -> str:
+		return ",".join(
+			str(values[field]).zfill(2) if field in time_fields else str(values[field])
+			for field in fields
+		)
+	return encode
+
+
+def encode_register(register: dict | str) -> str:
+	"""
+	Accepts a register dict as returned by MBREGCFG.parse or an already formatted CSV row.
+	"""
+	if isinstance(register, str):
+		return register
+	return ",".join(str(register[field]) for field in MBREGCFG_FIELDS)
+
+
+def encode_in3_mode(mode: int) -> str:
+	return f"{'16' if int(mode) == 1 else '00'},00"
+
+
+class Command:
+	"""
+	Declares one AT command once: AT+<name>? reads it, AT+<set_name>=<args> writes it.
+	`parse` turns the value lines of the query response into a typed value and `encode`
+	turns the set arguments into the argument string. `expected_lines` is the number of
+	value lines the query answers with, for commands that don't end with OK.
+	"""
+
+	def __init__(
+			self,
+			name: str,
+			parse: Callable[[list[str]], Any] | None = None,
+			encode: Callable[..., str] | None = encode_values,
+			expected_lines: int | None = None,
+			set_name: str | None = None,
+	):
+		self.name = name
+		self.parser = parse
+		self.encoder = encode
+		self.expected_lines = expected_lines
+		self.query_command = f"AT+{name}?\r\n" if parse is not None else None
+		self.set_prefix = f"AT+{set_name or name}=" if encode is not None else None
+
+	def query(self) -> str:
+		return self.query_command
+
+	def set(self, *args) -> str:
+		return f"{self.set_prefix}{self.encoder(*args)}\r\n"
+
+	def parse(self, response: str | None) -> Any:
+		try:
+			return self.parser(value_lines(response))
+		except ResponseError as e:
+			raise ResponseError(f"{self.name}: {e}") from None
+
+	def __repr__(self):
+		return f"Command({self.name})"
+
+
+NETWORK = Command("NETWORK", parse_network, encode=None, expected_lines=1)
+DEVID = Command("DEVID", parse_device_id, encode=None, expected_lines=1)
+PULSECOUNT1 = Command("PULSECOUNT1", parse_pulse_count, encode=None, expected_lines=1)
+PULSECOUNT2 = Command("PULSECOUNT2", parse_pulse_count, encode=None, expected_lines=1)
+SCHEDULE = Command(
+	"SCHEDULE",
+	parse_schedule,
+	encode_fields(SCHEDULE_FIELDS, ("on_hour", "on_minute", "off_hour", "off_minute")),
+	expected_lines=1,
+)
+ACINPUT = Command("ACINPUT", parse_ac_input, encode_fields(ACINPUT_FIELDS, tuple(ACINPUT_FIELDS)), expected_lines=1)
+IN3MODE = Command("IN3MODE", parse_in3_mode, encode_in3_mode, expected_lines=1, set_name="CONFIG")
+MBADDR = Command("MBADDR", parse_modbus_address, expected_lines=1)
+MBREGCFG = Command("MBREGCFG", parse_registers, encode_register, expected_lines=MBREGCFG_ROWS)
+MSGVAR = Command("MSGVAR", parse_msgvar)
+OFFSET = Command("OFFSET", parse_last_number, expected_lines=1)
+FPULSE = Command("FPULSE", parse_last_number, expected_lines=1)
+PROGMODE = Command("PROGMODE")
+
+COMMANDS = {
+	command.name: command
+	for command in [
+		NETWORK, DEVID, PULSECOUNT1, PULSECOUNT2, SCHEDULE, ACINPUT, IN3MODE,
+		MBADDR, MBREGCFG, MSGVAR, OFFSET, FPULSE, PROGMODE,
+	]
+}
+
+
+def read_values(controller, commands: list[Command]) -> list[Any]:
+	"""
+	Sends the queries of `commands` in one pipelined batch and returns their parsed values,
+	in order. Raises ResponseError if any of them did not come back or does not parse.
+	"""
+	def well_formed(index, response):
+		# an ERROR is a real answer, asking again would not change it
+		try:
+			commands[index].parse(response)
+		except ResponseError:
+			return is_error(response)
+		return True
+
+	responses = controller.send_batch(
+		[command.query() for command in commands],
+		expected_lines=[command.expected_lines for command in commands],
+		validate=well_formed,
+	)
+	return [command.parse(response) for command, response in zip(commands, responses)]
+
+
+def read_value(controller, command: Command) -> Any:
+	return read_values(controller, [command])[0]
+
+
+def is_ok(response: str | None) -> bool:
+	return response is not None and response.strip() == "OK"
+
+
+def is_error(response: str | None) -> bool:
+	return response is not None and response.strip().endswith("ERROR")
+
@@ -0,0 +1,181 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.back_logic.protocol import (
+	ACINPUT,
+	FPULSE,
+	IN3MODE,
+	MBADDR,
+	MBREGCFG,
+	MSGVAR,
+	MSGVAR_RESET,
+	OFFSET,
+	SCHEDULE,
+	ResponseError,
+	is_ok,
+)
+from app.back_logic.serial_controller import SerialController
+from app.back_logic.verification import VerificationError, write_session
+from app.back_logic.write_journal import send_journaled, start_journal
+
+MAX_WORKERS = 8  # ports provisioned at the same time, a USB hub rack is 8-16 units
+
+
+def build_commands(config: dict) -> list[str]:
+	"""
+	Turns a configuration into the AT write commands that apply it, in the order the GUI
+	panels send them. Every key is optional, missing ones are left untouched on the device:
+
+		schedule          dict as returned by SCHEDULE.parse
+		ac_input          dict as returned by ACINPUT.parse
+		in3_mode          1 for alert only, 0 for relay switching
+		modbus_address    Modbus slave address
+		modbus_registers  register dicts as returned by MBREGCFG.parse, or CSV rows
+		msgvar            list of variable codes, assigned to the payload slots in order
+		offset            display offset
+		pulse_factor      display pulse factor
+	"""
+	commands = []
+
+	if config.get("schedule") is not None:
+		commands.append(SCHEDULE.set(config["schedule"]))
+	if config.get("ac_input") is not None:
+		commands.append(ACINPUT.set(config["ac_input"]))
+	if config.get("in3_mode") is not None:
+		commands.append(IN3MODE.set(config["in3_mode"]))
+	if config.get("modbus_address") is not None:
+		commands.append(MBADDR.set(config["modbus_address"]))
+	for register in config.get("modbus_registers") or []:
+		commands.append(MBREGCFG.set(register))
+	if config.get("msgvar") is not None:
+		# slots are assigned in order, so start from a clean payload
+		commands.append(MSGVAR.set(MSGVAR_RESET))
+		for code in config["msgvar"]:
+			commands.append(MSGVAR.set(code))
+	if config.get("offset") is not None:
+		commands.append(OFFSET.set(config["offset"]))
+	if config.get("pulse_factor") is not None:
+		commands.append(FPULSE.set(config["pulse_factor"]))
+
+	return commands
+
+
+def send_commands(
+		controller,
+		commands: list[str],
+		on_response: Callable[[int, str | None], None] | None = None,
+) -> list[tuple[str, str]]:
+	"""
+	Streams write commands back to back, they are only answered with OK/ERROR.
+	Returns (command, response) for every write the device did not accept.
+	"""
+	responses = controller.send_windowed(commands, on_response=on_response)
+	return [
+		(command.strip(), (response or "").strip())
+		for command, response in zip(commands, responses)
+		if not is_ok(response)
+	]
+
+
+class ProvisioningResult:
+	def __init__(self, port: str):
+		self.port = port
+		self.device_id = None
+		self.sent = 0
+		self.failures = []  # (command, response) of every write the device did not accept
+		self.mismatches = []  # values read back that differ from the ones written
+		self.error = None
+		self.elapsed = 0.0
+
+	@property
+	def success(self) -> bool:
+		return self.error is None and not self.failures and not self.mismatches
+
+	def __str__(self):
+		if self.error is not None:
+			status = f"ERROR: {self.error}"
+		elif self.failures:
+			status = f"{len(self.failures)} of {self.sent} commands failed"
+		elif self.mismatches:
+			status = f"{len(self.mismatches)} values did not verify"
+		else:
+			status = f"OK ({self.sent} commands)"
+		return f"{self.port} [{self.device_id or '?'}] {status} in {self.elapsed:.2f}s"
+
+
+def provision_device(
+		port: str,
+		commands: list[str],
+		baudrate: int | None = None,
+		verify: bool = False,
+) -> ProvisioningResult:
+	"""
+	Opens `port`, applies `commands` in a single programming mode session and reports
+	how it went. With `verify` everything written is read back in one batch at the end.
+	Never raises, problems are recorded in the result.
+	"""
+	result = ProvisioningResult(port)
+	start = time.monotonic()
+
+	controller = SerialController(port, baudrate=baudrate)
+	if not controller.is_open():
+		result.error = "Serial port could not be opened."
+		result.elapsed = time.monotonic() - start
+		return result
+
+	try:
+		with write_session(controller, verify):
+			try:
+				journal = start_journal(controller, commands, "Aprovisionamiento")
+			except ResponseError as e:
+				# without the device ID there is no journal to keep, the push can still go ahead
+				print(f"Could not read the device ID on {port}: {e}")
+				result.failures = send_commands(controller, commands)
+				result.sent = len(commands)
+			else:
+				result.device_id = journal.device_id
+				remaining = journal.remaining()
+				result.failures = send_journaled(controller, journal, remaining)
+				result.sent = len(remaining)
+	except VerificationError as e:
+		result.mismatches = e.mismatches
+	except Exception as e:
+		print(f"Provisioning {port} failed: {e}")
+		result.error = str(e)
+	finally:
+		controller.close()
+
+	result.elapsed = time.monotonic() - start
+	return result
+
+
+def provision_fleet(
+		ports: list[str],
+		config: dict,
+		baudrate: int | None = None,
+		max_workers: int = MAX_WORKERS,
+		on_result: Callable[[ProvisioningResult], None] | None = None,
+		verify: bool = False,
+) -> list[ProvisioningResult]:
+	"""
+	Pushes one configuration to every device in `ports` concurrently, with at most
+	`max_workers` ports open at once. Each device gets its own SerialController, so the
+	total time is close to the slowest device rather than the sum of all of them.
+	`on_result` is called from the pool threads as each device finishes.
+	Returns one result per port, in the order of `ports`.
+	"""
+	commands = build_commands(config)
+
+	def run(port):
+		result = provision_device(port, commands, baudrate, verify)
+		print(f"Provisioned {result}")
+		if on_result is not None:
+			on_result(result)
+		return result
+
+	if not ports:
+		return []
+
+	with ThreadPoolExecutor(max_workers=min(max_workers, len(ports)), thread_name_prefix="provisioning") as pool:
+		return list(pool.map(run, ports))
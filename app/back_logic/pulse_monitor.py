@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import Callable
+
+import numpy as np
+import serial
+
+from app.back_logic.config_manager import get_from_config
+from app.back_logic.protocol import PULSECOUNT1, PULSECOUNT2, ResponseError, read_values
+
+SAMPLE_INTERVAL = 1.0  # seconds between polls
+MIN_SAMPLE_INTERVAL = 0.1
+RING_CAPACITY = 65536  # samples kept, 18 hours at one sample per second
+RATE_WINDOW = 60.0  # seconds averaged by the windowed rate
+COUNTER_MODULUS = 2 ** 32  # the counters are 8 hex digits and wrap around
+PULSE_INTERVAL_KEY = "pulse_poll_interval"
+
+
+def configured_interval() -> float:
+	try:
+		return max(float(get_from_config(PULSE_INTERVAL_KEY)), MIN_SAMPLE_INTERVAL)
+	except (TypeError, ValueError):
+		return SAMPLE_INTERVAL
+
+
+class PulseRing:
+	"""
+	Fixed-size ring of timestamped pulse count samples, allocated once up front so a
+	capture of any length uses the same memory: when full, each new sample overwrites the
+	oldest one. Appends come from the poller thread and reads from the UI, so both go
+	through a lock.
+	"""
+
+	def __init__(self, capacity: int = RING_CAPACITY):
+		self.capacity = capacity
+		self.times = np.zeros(capacity, dtype=np.float64)
+		self.counts = np.zeros((capacity, 2), dtype=np.int64)
+		self.next = 0
+		self.size = 0
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return self.size
+
+	def append(self, timestamp: float, count1: int, count2: int):
+		with self.lock:
+			self.times[self.next] = timestamp
+			self.counts[self.next] = (count1, count2)
+			self.next = (self.next + 1) % self.capacity
+			self.size = min(self.size + 1, self.capacity)
+
+	def clear(self):
+		with self.lock:
+			self.next = 0
+			self.size = 0
+
+	def samples(self, last: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		Copies of the last `last` samples (all of them by default), oldest first:
+		timestamps and an (n, 2) array of counts.
+		"""
+		with self.lock:
+			n = self.size if last is None else min(last, self.size)
+			indexes = (self.next - n + np.arange(n)) % self.capacity
+			return self.times[indexes], self.counts[indexes]
+
+	def latest(self) -> tuple[float, np.ndarray] | None:
+		with self.lock:
+			if not self.size:
+				return None
+			index = (self.next - 1) % self.capacity
+			return self.times[index], self.counts[index].copy()
+
+	def rates(self, window: float = RATE_WINDOW) -> tuple[np.ndarray, np.ndarray] | None:
+		"""
+		Pulses per second of both counters: instantaneous (between the last two samples) and
+		averaged over the last `window` seconds. None until there are two samples.
+		"""
+		times, counts = self.samples()
+		if len(times) < 2:
+			return None
+
+		# the window spans from the sample just before its start, so it is covered edge to edge
+		start = max(int(np.searchsorted(times, times[-1] - window, side="left")) - 1, 0)
+		times, counts = times[start:], counts[start:]
+
+		instant = counter_delta(counts[-2], counts[-1]) / (times[-1] - times[-2])
+		# the sum of the steps is the increase even if the counter wrapped inside the window
+		windowed = counter_delta(counts[:-1], counts[1:]).sum(axis=0) / (times[-1] - times[0])
+		return instant, windowed
+
+
+def counter_delta(before: np.ndarray, after: np.ndarray) -> np.ndarray:
+	return (after - before) % COUNTER_MODULUS
+
+
+class PulseMonitor:
+	"""
+	Polls AT+PULSECOUNT1?/AT+PULSECOUNT2? every `interval` seconds into a PulseRing. A
+	scheduler thread keeps the rate steady by aiming at absolute tick times instead of
+	sleeping between polls, and only queues a poll on the serial worker when the previous
+	one is done, so a slow device makes it skip ticks rather than pile up jobs. The device
+	stays in programming mode for as long as the monitor runs, so the polls don't pay the
+	mode switch.
+	"""
+
+	def __init__(
+			self,
+			serial_worker,
+			interval: float = SAMPLE_INTERVAL,
+			capacity: int = RING_CAPACITY,
+			on_sample: Callable[[float, int, int], None] | None = None,
+	):
+		self.serial_worker = serial_worker
+		self.interval = max(interval, MIN_SAMPLE_INTERVAL)
+		self.ring = PulseRing(capacity)
+		self.on_sample = on_sample  # called on the serial worker thread
+
+		self.errors = 0
+		self.skipped = 0
+		self.session = ExitStack()
+		self.stop_event = threading.Event()
+		self.thread = None
+		self.pending = None
+
+	@property
+	def running(self) -> bool:
+		return self.thread is not None and self.thread.is_alive()
+
+	def start(self):
+		if self.running:
+			return
+
+		self.serial_worker.submit(lambda controller: self.session.enter_context(controller.programming_mode()))
+		self.stop_event.clear()
+		self.thread = threading.Thread(target=self.run, name="pulse-monitor", daemon=True)
+		self.thread.start()
+
+	def stop(self) -> Future | None:
+		"""
+		Stops polling. Returns the future of leaving programming mode, queued behind the
+		last poll; wait on it before closing the port. None if the monitor was not running.
+		"""
+		if not self.running:
+			return None
+
+		self.stop_event.set()
+		self.thread.join()
+		self.thread = None
+		return self.serial_worker.submit(lambda controller: self.session.close())
+
+	def run(self):
+		next_tick = time.monotonic()
+		while not self.stop_event.wait(max(0.0, next_tick - time.monotonic())):
+			if self.pending is None or self.pending.done():
+				self.pending = self.serial_worker.submit(self.poll)
+			else:
+				self.skipped += 1
+
+			next_tick += self.interval
+			behind = time.monotonic() - next_tick
+			if behind > 0:
+				# missed ticks are dropped, not made up with a burst of polls
+				next_tick += math.ceil(behind / self.interval) * self.interval
+
+	def poll(self, controller):
+		try:
+			count1, count2 = read_values(controller, [PULSECOUNT1, PULSECOUNT2])
+		except (ResponseError, serial.SerialException) as e:
+			self.errors += 1
+			print(f"Pulse count poll failed: {e}")
+			return
+
+		timestamp = time.time()
+		self.ring.append(timestamp, count1, count2)
+		if self.on_sample is not None:
+			self.on_sample(timestamp, count1, count2)
@@ -0,0 +1,93 @@
+from typing import Callable, Iterator
+
+from app.back_logic.protocol import MBREGCFG, MBREGCFG_FIELDS, ResponseError, encode_register, is_ok, parse_csv
+from app.back_logic.serial_controller import WRITE_WINDOW
+from app.back_logic.write_journal import WriteJournal, send_journaled, start_journal
+
+RETRIES = 1  # extra passes over the rows that failed
+
+
+def register_position(register: dict | str) -> int:
+	return int(encode_register(register).split(",")[0])
+
+
+def read_registers(controller) -> Iterator[dict[str, int]]:
+	"""
+	Reads the register map with AT+MBREGCFG? and yields each register as soon as its line
+	is framed, so callers can show the first rows while the rest are still arriving.
+	Raises ResponseError if the device answers ERROR or a line does not parse.
+	"""
+	for line in controller.stream_lines(MBREGCFG.query(), expected_lines=MBREGCFG.expected_lines):
+		line = line.strip()
+		if line == "ERROR":
+			raise ResponseError("MBREGCFG: device answered ERROR")
+		if line and line != "OK":
+			yield parse_csv(line, MBREGCFG_FIELDS)
+
+
+def write_registers(
+		controller,
+		registers: list[dict | str],
+		window: int = WRITE_WINDOW,
+		retries: int = RETRIES,
+		on_progress: Callable[[int, int, int], None] | None = None,
+		journal: WriteJournal | None = None,
+) -> dict[int, str]:
+	"""
+	Pushes a whole register map with AT+MBREGCFG= lines streamed back to back, with at
+	most `window` rows waiting for their acknowledgement. Rows the device rejected or never
+	acknowledged are sent again, up to `retries` more times. Must run inside a programming
+	mode session. `on_progress(done, total, register_position)` is called as each row is
+	acknowledged. With a `journal` (see registers_journal) every acknowledgement is
+	recorded, so a push cut off midway can be resumed. Returns {register_position: last
+	response} for the rows that still failed, empty when every row was accepted.
+	"""
+	if journal is None:
+		commands = list({register_position(register): MBREGCFG.set(register) for register in registers}.values())
+	else:
+		commands = journal.commands
+	positions = [register_position(command.split("=", 1)[1]) for command in commands]
+
+	# a resumed journal only sends what did not get through last time
+	pending = journal.remaining() if journal is not None else list(range(len(commands)))
+	total = len(pending)
+	done = 0
+	responses = {}
+
+	for attempt in range(retries + 1):
+		if not pending:
+			break
+		if attempt:
+			print(f"Retrying registers {[positions[index] for index in pending]}")
+
+		def on_response(index, response):
+			nonlocal done
+			responses[index] = response
+			if is_ok(response):
+				done += 1
+				if on_progress is not None:
+					on_progress(done, total, positions[index])
+
+		# once every row got an answer the journal is gone, retrying rejected rows needs none
+		if journal is not None and not journal.complete:
+			send_journaled(controller, journal, pending, on_response, window)
+		else:
+			batch = pending
+			controller.send_windowed(
+				[commands[index] for index in batch],
+				window=window,
+				on_response=lambda position, response: on_response(batch[position], response),
+			)
+
+		pending = [index for index in pending if not is_ok(responses.get(index))]
+
+	return {positions[index]: (responses.get(index) or "").strip() for index in pending}
+
+
+def registers_journal(controller, registers: list[dict | str]) -> WriteJournal:
+	"""
+	The write journal of a register push on the connected device, resuming an interrupted
+	push of the same rows.
+	"""
+	commands = list({register_position(register): MBREGCFG.set(register) for register in registers}.values())
+	return start_journal(controller, commands, "Registros Modbus")
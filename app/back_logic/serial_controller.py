@@ -1,15 +1,159 @@
 import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator
 
 import serial
 import serial.tools.list_ports
 
+from app.back_logic.config_manager import get_from_config, save_to_config
+from app.back_logic.device_cache import DeviceCache
+from app.back_logic.latency import LatencyTracker
+from app.back_logic.line_framer import LineFramer
+from app.back_logic.protocol import DEVID, ResponseError
 
-def list_available_serial_ports():
+RESPONSE_TERMINATORS = ("OK", "ERROR")
+RESPONSE_DEADLINE = 1.0  # seconds of silence after which a device is taken as not answering
+READ_LIMIT_FACTOR = 2  # a read gives up after this many deadlines per command, even if the line never goes quiet
+IDLE_GAP = 0.1  # seconds of silence after the last byte that ends a response
+POLL_INTERVAL = 0.005
+READY_PROBE = "AT+DEVID?\r\n"  # cheap query used to confirm the device is listening
+READY_TIMEOUT = 3.0
+WRITE_WINDOW = 4  # writes allowed on the line without their OK/ERROR yet
+BAUD_RATES = [9600, 14400, 19200, 38400, 57600, 115200]
+AUTO_BAUD_RATE = "auto"  # baud_rate config value that asks for detection on connect
+BAUD_PROBE_DEADLINE = 0.3
+DETECTED_BAUD_RATES_KEY = "detected_baud_rates"
+QUERY_RETRIES = 2  # extra attempts for a query whose reply came back damaged
+RETRY_BACKOFF = 0.05  # seconds before the first retry, doubled on each further one
+MAX_RETRY_BACKOFF = 0.4
+
+
+def is_terminator(line: str) -> bool:
+	return line.strip().startswith(RESPONSE_TERMINATORS)
+
+
+def is_query(command: str) -> bool:
+	return command.strip().endswith("?")
+
+
+class ResponseFramer:
+	"""
+	Assigns incoming lines to one response frame per command, independent of how the
+	bytes are read. A frame ends on an OK/ERROR line or once it holds its entry in
+	`expected_lines`. A frame closed by its line count may still be followed by a bare OK;
+	that line is folded into it unless the next command is a write, whose whole reply is
+	that OK. Frames holding an undecodable line are listed in `corrupted`.
+	"""
+
+	def __init__(self, commands: list[str], expected_lines: list[int | None] | None = None):
+		self.commands = commands
+		self.expected_lines = list(expected_lines) if expected_lines is not None else [None] * len(commands)
+		self.lines: list[list[str] | None] = [None] * len(commands)
+		self.corrupted: set[int] = set()
+		self.cut_short: set[int] = set()
+
+		self.current: list[str] = []
+		self.index = 0
+		self.trailer_open = False
+
+	@property
+	def done(self) -> bool:
+		return self.index >= len(self.commands) and not self.trailer_open
+
+	def feed(self, line: str, valid: bool = True) -> int | None:
+		"""
+		Assigns one complete line. Returns the index of the response it went to,
+		or None for a stray line that arrived after every frame was complete.
+		"""
+		if self.trailer_open:
+			self.trailer_open = False
+			if line.strip() == "OK":
+				self.lines[self.index - 1].append(line)
+				return self.index - 1
+
+		if self.done:
+			return None
+
+		index = self.index
+		self.current.append(line)
+		if not valid:
+			self.corrupted.add(index)
+
+		terminated = valid and is_terminator(line)
+		expected = self.expected_lines[index]
+		if terminated or (expected is not None and len(self.current) >= expected):
+			self.close_current()
+			self.trailer_open = not terminated and (
+				self.index == len(self.commands) or is_query(self.commands[self.index])
+			)
+
+		return index
+
+	def close_idle(self, rx: LineFramer) -> bool:
+		"""
+		Called once the line has been quiet for the idle gap. Closes a pending trailer, or a
+		response of unknown length that already started. Returns True if anything was closed.
+		"""
+		if self.trailer_open:
+			self.trailer_open = False
+			return True
+
+		if self.index < len(self.commands) and self.expected_lines[self.index] is None and (self.current or rx.pending):
+			# unterminated response of unknown length, the line went quiet so it is over
+			self.take_partial(rx)
+			self.close_current()
+			return True
+
+		return False
+
+	def take_partial(self, rx: LineFramer):
+		if rx.pending:
+			line, valid = rx.take_partial()
+			self.current.append(line)
+			self.cut_short.add(self.index)
+			if not valid:
+				self.corrupted.add(self.index)
+
+	def close_current(self):
+		self.lines[self.index] = self.current
+		self.current = []
+		self.index += 1
+
+	def finish(self, rx: LineFramer) -> list[str | None]:
+		"""
+		Returns the response texts, keeping whatever arrived of a response that was cut short.
+		Commands that got no answer at all come back as None.
+		"""
+		if self.index < len(self.commands) and (self.current or rx.pending):
+			self.take_partial(rx)
+			self.close_current()
+
+		return [self.text(index) for index in range(len(self.commands))]
+
+	def text(self, index: int) -> str | None:
+		lines = self.lines[index]
+		if lines is None:
+			return None
+
+		text = "".join(f"{line}\r\n" for line in lines)
+		return text[:-2] if index in self.cut_short else text
+
+
+def read_limit(deadline: float, commands: int) -> float:
+	"""
+	Longest a read of `commands` responses may take in total. The deadline alone restarts
+	with every byte received, so a line full of noise would otherwise be read forever.
+	"""
+	return deadline * READ_LIMIT_FACTOR * max(commands, 1)
+
+
+def list_available_serial_ports() -> list[str]:
 	ports = serial.tools.list_ports.comports()
 
 	if not ports:
 		print("No serial ports found.")
-		return
+		return []
 
 	listed_ports = list()
 	for port in ports:
@@ -18,6 +162,19 @@ def list_available_serial_ports():
 	return listed_ports
 
 
+def cached_baud_rate(port: str) -> int | None:
+	detected = get_from_config(DETECTED_BAUD_RATES_KEY) or {}
+	return detected.get("ports", {}).get(port)
+
+
+def remember_baud_rate(port: str, device_id: str | None, baudrate: int):
+	detected = get_from_config(DETECTED_BAUD_RATES_KEY) or {}
+	detected.setdefault("ports", {})[port] = baudrate
+	if device_id:
+		detected.setdefault("devices", {})[device_id] = baudrate
+	save_to_config(DETECTED_BAUD_RATES_KEY, detected)
+
+
 class SerialController:
 	def __init__(
 			self,
@@ -27,6 +184,8 @@ class SerialController:
 			parity: str = serial.PARITY_NONE,
 			stop_bits: int = serial.STOPBITS_ONE,
 			timeout: float = 5.0,
+			response_deadline: float = RESPONSE_DEADLINE,
+			idle_gap: float = IDLE_GAP,
 	):
 		self.port = port
 		self.baudrate = baudrate if baudrate is not None else 9600  # set default baud rate to 9600
@@ -34,6 +193,14 @@ class SerialController:
 		self.parity = parity
 		self.stop_bits = stop_bits
 		self.timeout = timeout
+		self.response_deadline = response_deadline
+		self.idle_gap = idle_gap
+		self.progmode_depth = 0
+		self.rx = LineFramer()
+		self.latency = LatencyTracker(default=response_deadline)
+		self.cache = DeviceCache()
+		self.write_listeners: list[Callable[[str], None]] = []  # called with every chunk sent to the device
+		self.read_listeners: list[Callable[[str, str], None]] = []  # called with (command, line) for every line framed
 
 		self.serial_connection = None
 		self.serial_created = False
@@ -46,8 +213,9 @@ class SerialController:
 			self.serial = None
 
 	def create_serial(self):
-		self.serial = serial.Serial(
-			port=self.port,
+		# serial_for_url also accepts pyserial URLs such as socket:// or loop:// for testing without hardware
+		self.serial = serial.serial_for_url(
+			self.port,
 			baudrate=self.baudrate,
 			bytesize=self.byte_size,
 			parity=self.parity,
@@ -64,12 +232,16 @@ class SerialController:
 		if self.serial is None:
 			self.create_serial()
 			self.serial_created = True
+		self.cache.forget_device()
+		self.latency.reset()
 		self.port = port
 		self.serial.port = port
 
 	def open(self) -> bool:
 		if not self.is_open():
 			try:
+				self.cache.forget_device()
+				self.latency.reset()
 				self.serial.open()
 				self.serial_created = True
 				return True
@@ -78,6 +250,7 @@ class SerialController:
 				return False
 
 	def close(self):
+		self.cache.forget_device()
 		self.serial.close()
 
 	def is_open(self) -> bool:
@@ -86,25 +259,400 @@ class SerialController:
 		except AttributeError:
 			return False
 
-	def send_command(self, command: str, return_str: bool = True) -> str | bytes:
-		print(f"sending command: {command}")
-		self.serial.write(command.encode("utf-8"))
-		time.sleep(1)
-		try:
-			data = self.serial.read_all()
-		except serial.Timeout:
-			data = ""
+	def send_command(
+			self,
+			command: str,
+			return_str: bool = True,
+			expected_lines: int | None = None,
+			deadline: float | None = None,
+			retries: int = QUERY_RETRIES,
+	) -> str | bytes:
+		"""
+		Sends one command and reads its response, a batch of one: a query whose reply comes
+		back damaged or missing is sent again like in send_batch. Without an explicit
+		`deadline` the wait is derived from the latency observed so far for the same
+		command verb.
+		"""
+		adaptive = deadline is None
+		if adaptive:
+			deadline = self.latency.deadline(command)
+
+		start = time.monotonic()
+		data = self.send_batch([command], [expected_lines], deadline=deadline, retries=retries)[0] or ""
+
+		if adaptive:
+			if data:
+				self.latency.record(command, time.monotonic() - start)
+			else:
+				self.latency.record_timeout(command)
+
+		return data if return_str else data.encode("utf-8")
+
+	def send_batch(
+			self,
+			commands: list[str],
+			expected_lines: list[int | None] | None = None,
+			return_str: bool = True,
+			deadline: float | None = None,
+			validate: Callable[[int, str], bool] | None = None,
+			retries: int = QUERY_RETRIES,
+	) -> list[str | bytes | None]:
+		"""
+		Writes every command in a single burst and splits the incoming stream back into one
+		response per command, in order. Each response must be self-delimiting: it ends on an
+		OK/ERROR line or after its entry in `expected_lines`. If the device stops answering
+		midway, the commands without a response come back as None, and a response that was
+		cut short is returned as far as it got.
+
+		Queries whose response is missing, garbled, cut short or rejected by
+		`validate(index, response)` are sent again, up to `retries` times, after the line is
+		resynchronized (see resync). Writes are never sent twice: the device may have applied
+		them even if their OK got lost.
+		"""
+		deadline = self.latency.batch_deadline(commands) if deadline is None else deadline
+		expected_lines = list(expected_lines) if expected_lines is not None else [None] * len(commands)
+
+		print(f"sending batch: {commands}")
+		self.write("".join(commands))
+		responses, damaged = self.read_frames(commands, expected_lines, deadline)
+
+		for attempt in range(retries):
+			pending = [
+				index for index, command in enumerate(commands)
+				if is_query(command) and (
+					index in damaged
+					or responses[index] is None
+					or (validate is not None and not validate(index, responses[index]))
+				)
+			]
+			if not pending:
+				break
+
+			self.resync(attempt)
+			print(f"retrying {[commands[index] for index in pending]}")
+			self.write("".join(commands[index] for index in pending))
+			retried, retried_damaged = self.read_frames(
+				[commands[index] for index in pending],
+				[expected_lines[index] for index in pending],
+				deadline,
+			)
+			for position, index in enumerate(pending):
+				responses[index] = retried[position]
+				if position in retried_damaged:
+					damaged.add(index)
+				else:
+					damaged.discard(index)
+
+		print(f"received batch: {responses}")
+
+		return [
+			response.encode("utf-8") if response is not None and not return_str else response
+			for response in responses
+		]
+
+	def stream_lines(
+			self,
+			command: str,
+			expected_lines: int | None = None,
+			deadline: float | None = None,
+			retries: int = QUERY_RETRIES,
+	) -> Iterator[str]:
+		"""
+		Sends `command` and yields the lines of its response (terminator included) as soon as
+		each one is framed, so long answers such as AT+MBREGCFG? can be consumed while the
+		rest is still arriving.
+
+		A query whose reply comes back garbled, cut short or missing is sent again like in
+		send_batch, after resync, up to `retries` times. The lines already yielded are
+		skipped on the new reply, so the caller sees each line once, in order; this assumes
+		the device answers the same query with the same lines, as it does for its settings.
+		An undecodable line is never yielded.
+		"""
+		deadline = self.latency.deadline(command) if deadline is None else deadline
+		retries = retries if is_query(command) else 0
+		yielded = 0
+
+		for attempt in range(retries + 1):
+			if attempt:
+				self.resync(attempt - 1)
+				print(f"retrying {command}")
+
+			print(f"streaming command: {command}")
+			self.write(command)
+			framer = ResponseFramer([command], [expected_lines])
+			position = 0
+			for _, line in self.frame_lines(framer, deadline):
+				if framer.corrupted:
+					break
+				position += 1
+				if position > yielded:
+					yielded = position
+					yield line
+
+			response = framer.finish(self.rx)[0]
+			if response is not None and not framer.corrupted and not framer.cut_short:
+				return
+
+	def send_windowed(
+			self,
+			commands: list[str],
+			window: int = WRITE_WINDOW,
+			deadline: float | None = None,
+			on_response: Callable[[int, str | None], None] | None = None,
+	) -> list[str | None]:
+		"""
+		Streams commands back to back, keeping at most `window` of them waiting for their
+		reply, and matches each OK/ERROR to its command in order as it arrives. Meant for
+		runs of writes, whose only reply is the terminator. `on_response(index, response)`
+		is called as each reply comes in. Commands left without a reply come back as None.
+		"""
+		deadline = self.latency.batch_deadline(commands) if deadline is None else deadline
+		framer = ResponseFramer(commands)
+		reported = 0
+
+		def report():
+			nonlocal reported
+			while reported < framer.index:
+				if on_response is not None:
+					on_response(reported, framer.text(reported))
+				reported += 1
+
+		print(f"streaming batch: {commands}")
+		sent = min(window, len(commands))
+		self.write("".join(commands[:sent]))
+
+		for _ in self.frame_lines(framer, deadline):
+			report()
+			if sent < len(commands) and sent - framer.index < window:
+				# keep the window full, the replies of the earlier commands are still arriving
+				following = commands[sent:framer.index + window]
+				self.transmit("".join(following))
+				sent += len(following)
+
+		responses = framer.finish(self.rx)
+		report()
+		print(f"received batch: {responses}")
+
+		return responses
 
-		print(f"received data: {data}")
+	def write(self, data: str):
+		if self.rx.pending:
+			# whatever is still buffered belongs to an earlier exchange
+			print(f"discarded data: {self.rx.take_partial()[0]!r}")
+		self.transmit(data)
+
+	def transmit(self, data: str):
+		# whatever this changes on the device is no longer valid in the cache
+		self.cache.invalidate_writes(data)
+		for listener in self.write_listeners:
+			listener(data)
+		self.serial.write(data.encode("utf-8"))
+
+	def read_response(self, expected_lines: int | None = None, deadline: float | None = None) -> str:
+		"""
+		Reads a single response frame from the device. The frame is complete as soon as
+		an OK/ERROR line arrives, `expected_lines` lines have been received, or the line
+		stays idle for `idle_gap` seconds after the first byte. `deadline` bounds the
+		wait when the device never answers.
+		"""
+		return self.read_responses([""], expected_lines=[expected_lines], deadline=deadline)[0] or ""
+
+	def read_responses(
+			self,
+			commands: list[str],
+			expected_lines: list[int | None] | None = None,
+			deadline: float | None = None,
+	) -> list[str | None]:
+		"""
+		Splits the incoming stream into one response frame per command (see ResponseFramer).
+		Reading stops once every frame is complete or nothing arrives for `deadline` seconds.
+		"""
+		return self.read_frames(commands, expected_lines, deadline)[0]
+
+	def read_frames(
+			self,
+			commands: list[str],
+			expected_lines: list[int | None] | None = None,
+			deadline: float | None = None,
+	) -> tuple[list[str | None], set[int]]:
+		"""
+		Like read_responses, also returning the indexes of the responses that hold an
+		undecodable line or were cut short.
+		"""
+		framer = ResponseFramer(commands, expected_lines)
+		for _ in self.frame_lines(framer, deadline):
+			pass
+
+		responses = framer.finish(self.rx)
+		return responses, framer.corrupted | framer.cut_short
+
+	def frame_lines(self, framer: ResponseFramer, deadline: float | None = None) -> Iterator[tuple[int, str]]:
+		"""
+		Drives the receive loop for `framer`, yielding (response index, line) for every line
+		as soon as it is framed. Reading stops when nothing arrives for `deadline` seconds,
+		or at the read_limit counted from the start, whatever the line is doing.
+		"""
+		deadline = self.response_deadline if deadline is None else deadline
+		start = last_rx = time.monotonic()
+		limit = start + read_limit(deadline, len(framer.commands))
+
+		while not framer.done:
+			for line, valid in self.rx.lines():
+				index = framer.feed(line, valid)
+				if index is not None:
+					for listener in self.read_listeners:
+						listener(framer.commands[index], line)
+					yield index, line
+				if framer.done:
+					break
+			if framer.done:
+				break
+
+			now = time.monotonic()
+			if now >= limit:
+				print("Response did not end in time, giving up.")
+				break
+
+			try:
+				received = self.rx.fill(self.serial)
+			except serial.SerialException:
+				print("Serial port stopped responding.")
+				break
+
+			if received:
+				last_rx = now
+				continue
+
+			idle = now - last_rx
+			if idle >= self.idle_gap and framer.close_idle(self.rx):
+				continue
+			if idle >= deadline:
+				break
+
+			time.sleep(POLL_INTERVAL)
+
+	def detect_baud_rate(self, deadline: float = BAUD_PROBE_DEADLINE) -> int | None:
+		"""
+		Tries the candidate baud rates, most likely first, with a short AT+DEVID? probe and
+		locks onto the first one that gets a well-formed reply. The rate is remembered for
+		this port and device ID, so the next connection finds it on the first try.
+		Returns the detected rate, or None (keeping the current rate) if none worked.
+		"""
+		original = self.baudrate
+		for baudrate in self.baud_rate_candidates():
+			self.update_baud_rate(baudrate)
+			self.rx.clear()
+			self.serial.reset_input_buffer()
+
+			framing_errors = self.rx.framing_errors
+			# a garbled reply means a wrong rate here, not one to retry
+			response = self.send_command(DEVID.query(), deadline=deadline, retries=0)
+			if self.rx.framing_errors != framing_errors or not response.rstrip().endswith("OK"):
+				continue
+
+			try:
+				device_id = DEVID.parse(response)
+			except ResponseError:
+				continue
+
+			print(f"Detected baud rate {baudrate} on {self.port}")
+			remember_baud_rate(self.port, device_id, baudrate)
+			return baudrate
+
+		print(f"Could not detect the baud rate on {self.port}")
+		self.update_baud_rate(original)
+		return None
+
+	def baud_rate_candidates(self) -> list[int]:
+		"""
+		The rate last detected on this port, then the configured one, then the rates other
+		devices were found at (most common first), then the rest of the standard rates.
+		"""
+		detected = get_from_config(DETECTED_BAUD_RATES_KEY) or {}
+		device_rates = [rate for rate, _ in Counter(detected.get("devices", {}).values()).most_common()]
+		likely = [detected.get("ports", {}).get(self.port), int(self.baudrate)] + device_rates
+
+		return list(dict.fromkeys(rate for rate in likely + BAUD_RATES if rate))
+
+	@contextmanager
+	def programming_mode(self):
+		"""
+		Keeps the device in programming mode for the duration of the block. Sessions nest:
+		only the outermost one sends AT+PROGMODE=1 on entry and AT+PROGMODE=0 on exit, so
+		operations that run inside an existing session don't pay the mode switch again.
+		"""
+		if self.progmode_depth == 0:
+			self.enter_programming_mode()
+		self.progmode_depth += 1
 
 		try:
-			final_data = data.decode("utf-8") if return_str else data
-		except UnicodeDecodeError:
-			final_data = data
+			yield self
+		finally:
+			self.progmode_depth -= 1
+			if self.progmode_depth == 0:
+				self.exit_programming_mode()
+
+	def enter_programming_mode(self) -> bool:
+		self.send_command("AT+PROGMODE=1\r\n", False)  # entering programming mode to stop the device
+		return self.wait_until_ready()
+
+	def exit_programming_mode(self):
+		self.send_command("AT+PROGMODE=0\r\n", False)  # exiting programming mode to start the device
+
+	def wait_until_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+		"""
+		Replaces the fixed settle delay after AT+PROGMODE=1: drains whatever the device was
+		still sending until the line goes quiet, then probes it until a query is answered
+		with OK.
+		"""
+		end = time.monotonic() + timeout
+		while time.monotonic() < end:
+			self.drain()
+			response = self.send_command(READY_PROBE, retries=0)
+			if response.rstrip().endswith("OK"):
+				return True
+
+		print("Device did not confirm programming mode.")
+		return False
+
+	def drain(self, timeout: float | None = None) -> int:
+		"""
+		Reads and discards incoming data until the line stays quiet for `idle_gap` seconds.
+		Returns the number of bytes discarded.
+		"""
+		timeout = self.response_deadline if timeout is None else timeout
+		discarded = self.rx.pending
+		self.rx.clear()
+		start = last_rx = time.monotonic()
+
+		while True:
+			now = time.monotonic()
+			received = self.rx.fill(self.serial)
+			if received:
+				discarded += received
+				self.rx.clear()
+				last_rx = now
+			elif now - last_rx >= self.idle_gap or now - start >= timeout:
+				break
+			else:
+				time.sleep(POLL_INTERVAL)
+
+		if discarded:
+			print(f"discarded {discarded} bytes")
+
+		return discarded
 
-		return final_data
+	def resync(self, attempt: int = 0):
+		"""
+		Gets the line back in step after a damaged or out of phase reply: waits a backoff
+		that doubles with each `attempt`, then discards everything still arriving, such as
+		the late reply of an earlier command, until the line goes quiet.
+		"""
+		time.sleep(min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_BACKOFF))
+		self.drain()
 
 	def flush_buffer(self):
+		self.rx.clear()
 		self.serial.reset_input_buffer()
 		self.serial.reset_output_buffer()
 		self.serial.flush()
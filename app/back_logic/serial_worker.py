@@ -0,0 +1,80 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from app.back_logic.serial_controller import SerialController
+
+
+def call_directly(fn: Callable, *args):
+	fn(*args)
+
+
+class SerialWorker:
+	"""
+	Background thread that owns the SerialController. Panels submit jobs instead of talking
+	to the port from the UI thread; jobs run one at a time in submission order and their
+	results come back through a Future. Completion callbacks go through `dispatch`
+	(wx.CallAfter in the GUI) so they always run on the UI thread.
+	"""
+
+	def __init__(self, controller: SerialController, dispatch: Callable = call_directly):
+		self.controller = controller
+		self.dispatch = dispatch
+
+		self.jobs = queue.Queue()
+		self.thread = threading.Thread(target=self.run, name="serial-worker", daemon=True)
+		self.thread.start()
+
+	def submit(
+			self,
+			job: Callable[[SerialController], Any],
+			on_done: Callable[[Future], None] | None = None,
+	) -> Future:
+		future = Future()
+		self.jobs.put((future, job, on_done))
+		return future
+
+	def send_command(self, command: str, *args, on_done: Callable[[Future], None] | None = None, **kwargs) -> Future:
+		return self.submit(lambda controller: controller.send_command(command, *args, **kwargs), on_done)
+
+	def send_batch(self, commands: list[str], *args, on_done: Callable[[Future], None] | None = None, **kwargs) -> Future:
+		return self.submit(lambda controller: controller.send_batch(commands, *args, **kwargs), on_done)
+
+	def post(self, fn: Callable, *args):
+		"""
+		Runs `fn(*args)` on the UI thread, e.g. to update a progress dialog from inside a job.
+		"""
+		self.dispatch(fn, *args)
+
+	def request_stop(self):
+		"""
+		Lets the queued jobs finish and ends the worker thread, without waiting for it.
+		"""
+		self.jobs.put(None)
+
+	def stop(self, timeout: float | None = None):
+		"""
+		Lets the queued jobs finish and ends the worker thread.
+		"""
+		self.request_stop()
+		self.thread.join(timeout)
+
+	def run(self):
+		while True:
+			item = self.jobs.get()
+			if item is None:
+				break
+
+			future, job, on_done = item
+			if not future.set_running_or_notify_cancel():
+				continue
+
+			try:
+				future.set_result(job(self.controller))
+			except Exception as e:
+				print(f"Serial job failed: {e}")
+				future.set_exception(e)
+
+			if on_done is not None:
+				self.dispatch(on_done, future)
@@ -0,0 +1,373 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator
+
+import numpy as np
+
+from app.back_logic.config_manager import get_from_config
+from app.back_logic.device_cache import SETTERS
+from app.back_logic.latency import command_verb
+from app.back_logic.protocol import COMMANDS, PULSECOUNT1, PULSECOUNT2
+
+SESSIONS_DIR = os.path.join(os.path.expanduser("~"), "ECMConfig", "sessions")
+SESSION_EXTENSION = ".ecms"
+RECORD_SESSIONS_KEY = "record_sessions"
+
+# what a session records, the value of the record_sessions setting
+RECORD_OFF = "off"
+RECORD_EXCHANGES = "exchanges"
+RECORD_TELEMETRY = "telemetry"
+RECORD_BOTH = "both"
+
+# record directions, the first byte of every record
+SENT = 0
+RECEIVED = 1
+SAMPLE = 2
+DIRECTION_NAMES = {SENT: "TX", RECEIVED: "RX", SAMPLE: "SAMPLE"}
+
+# command IDs are positions in the registry, new commands must be added at its end to keep old logs readable
+COMMAND_IDS = {name: position + 1 for position, name in enumerate(COMMANDS)}
+COMMAND_NAMES = {command_id: name for name, command_id in COMMAND_IDS.items()}
+UNKNOWN_COMMAND = 0
+
+FILE_MAGIC = b"ECMS"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sB3x")
+# direction, timestamp, command ID, payload length, then the payload
+RECORD_HEADER = struct.Struct("<BdHH")
+MAX_PAYLOAD = 0xFFFF
+
+# an index block follows every INDEX_INTERVAL records, listing the timestamp and offset of
+# every INDEX_STRIDE-th record since the previous block, and the offset of that block
+INDEX_MAGIC = b"\xffIDX"
+INDEX_HEADER = struct.Struct("<4sQQI")
+INDEX_ENTRY = np.dtype([("timestamp", "<f8"), ("offset", "<u8")])
+INDEX_CRC = struct.Struct("<I")
+INDEX_INTERVAL = 4096
+INDEX_STRIDE = 64
+FLUSH_INTERVAL = 1.0  # seconds, records reach the file at least this often
+
+
+def command_id(command: str) -> int:
+	"""
+	"AT+PULSECOUNT1?\r\n" -> ID of PULSECOUNT1, "AT+CONFIG=16,1\r\n" -> ID of IN3MODE.
+	"""
+	verb = command_verb(command)
+	name = SETTERS.get(verb) or verb.removeprefix("AT+").rstrip("?=")
+	return COMMAND_IDS.get(name, UNKNOWN_COMMAND)
+
+
+def recording_mode() -> str:
+	return get_from_config(RECORD_SESSIONS_KEY) or RECORD_OFF
+
+
+def session_path(timestamp: float | None = None) -> str:
+	stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+	return os.path.join(SESSIONS_DIR, f"session-{stamp}{SESSION_EXTENSION}")
+
+
+class Record:
+	def __init__(self, timestamp: float, direction: int, command: int, payload: bytes):
+		self.timestamp = timestamp
+		self.direction = direction
+		self.command = command
+		self.payload = payload
+
+	@property
+	def command_name(self) -> str:
+		return COMMAND_NAMES.get(self.command, "?")
+
+	def values(self) -> np.ndarray:
+		"""
+		The values of a SAMPLE record.
+		"""
+		return np.frombuffer(self.payload, dtype="<f8")
+
+	def __str__(self):
+		when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp)) + f".{int(self.timestamp * 1000) % 1000:03d}"
+		if self.direction == SAMPLE:
+			content = " ".join(f"{value:g}" for value in self.values())
+		else:
+			content = self.payload.decode("utf-8", errors="replace").strip()
+		return f"{when} {DIRECTION_NAMES.get(self.direction, '?'):6} {self.command_name:12} {content}"
+
+
+class SessionRecorder:
+	"""
+	Append-only binary log of a session: the lines sent to and received from the device
+	and telemetry samples, each a 13 byte header plus its payload. Every INDEX_INTERVAL
+	records an index block is appended, chained to the previous one, so SessionReader can
+	seek by time without reading the log. A crash loses at most the last FLUSH_INTERVAL
+	seconds; the reader ignores a torn record at the end.
+
+	Records come from the serial worker and the monitor threads, so writing is locked.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.lock = threading.Lock()
+		os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+		self.file = open(path, "wb")
+		self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+		self.file.flush()
+
+		self.offset = FILE_HEADER.size
+		self.count = 0
+		self.entries = []
+		self.span_start = self.offset
+		self.previous_index = 0
+		self.flushed_at = time.monotonic()
+		self.last_sent = UNKNOWN_COMMAND
+
+	def record(self, direction: int, command: int, payload: bytes, timestamp: float | None = None):
+		timestamp = time.time() if timestamp is None else timestamp
+		payload = payload[:MAX_PAYLOAD]
+		with self.lock:
+			if self.file is None:
+				return
+
+			if self.count % INDEX_STRIDE == 0:
+				self.entries.append((timestamp, self.offset))
+			self.file.write(RECORD_HEADER.pack(direction, timestamp, command, len(payload)))
+			self.file.write(payload)
+			self.offset += RECORD_HEADER.size + len(payload)
+			self.count += 1
+
+			if self.count % INDEX_INTERVAL == 0:
+				self.write_index()
+			if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+				self.file.flush()
+				self.flushed_at = time.monotonic()
+
+	def write_index(self):
+		if not self.entries:
+			return
+
+		entries = np.array(self.entries, dtype=INDEX_ENTRY).tobytes()
+		block = INDEX_HEADER.pack(INDEX_MAGIC, self.previous_index, self.span_start, len(self.entries)) + entries
+		self.file.write(block + INDEX_CRC.pack(zlib.crc32(block)))
+		self.file.flush()
+
+		self.previous_index = self.offset
+		self.offset += len(block) + INDEX_CRC.size
+		self.span_start = self.offset
+		self.entries = []
+
+	def record_sent(self, data: str):
+		"""
+		Signature of SerialController.write_listeners.
+		"""
+		for line in data.split("\r\n"):
+			if line:
+				self.last_sent = command_id(line)
+				self.record(SENT, self.last_sent, line.encode("utf-8"))
+
+	def record_received(self, command: str, line: str):
+		"""
+		Signature of SerialController.read_listeners. Single replies are read without their
+		command, those are taken as the answer to the last line sent.
+		"""
+		self.record(RECEIVED, command_id(command) if command else self.last_sent, line.encode("utf-8"))
+
+	def record_sample(self, command: int, values, timestamp: float | None = None):
+		self.record(SAMPLE, command, np.asarray(values, dtype="<f8").tobytes(), timestamp)
+
+	def record_pulses(self, timestamp: float, count1: int, count2: int):
+		"""
+		Signature of PulseMonitor's on_sample.
+		"""
+		self.record_sample(COMMAND_IDS[PULSECOUNT1.name], [count1], timestamp)
+		self.record_sample(COMMAND_IDS[PULSECOUNT2.name], [count2], timestamp)
+
+	def attach(self, controller):
+		controller.write_listeners.append(self.record_sent)
+		controller.read_listeners.append(self.record_received)
+
+	def detach(self, controller):
+		if self.record_sent in controller.write_listeners:
+			controller.write_listeners.remove(self.record_sent)
+		if self.record_received in controller.read_listeners:
+			controller.read_listeners.remove(self.record_received)
+
+	def close(self):
+		with self.lock:
+			if self.file is None:
+				return
+			# the records after the last full interval get their index too
+			self.write_index()
+			self.file.close()
+			self.file = None
+
+
+class IndexBlock:
+	def __init__(self, offset: int, previous: int, span_start: int, entries: np.ndarray):
+		self.offset = offset
+		self.previous = previous
+		self.span_start = span_start
+		self.entries = entries
+
+	@property
+	def end(self) -> int:
+		return self.offset + INDEX_HEADER.size + self.entries.nbytes + INDEX_CRC.size
+
+
+class SessionReader:
+	"""
+	Reads a session log through a memory map, so opening it doesn't read the records: only
+	the chain of index blocks is read, walking back from the last one, plus the records
+	after the last block (fewer than INDEX_INTERVAL, left by a crash or a live log), which
+	are indexed in memory the same way. Seeking to a time bisects the blocks, then the
+	index entries of one block, and reads at most INDEX_STRIDE records from there, which
+	relies on the records being in time order.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.file = open(path, "rb")
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		magic, version = FILE_HEADER.unpack_from(self.map)
+		if magic != FILE_MAGIC:
+			self.close()
+			raise ValueError(f"{path} is not an ECM session log")
+		if version > FILE_VERSION:
+			self.close()
+			raise ValueError(f"unsupported session log version: {version}")
+
+		self.blocks = self.load_index()
+		self.block_times = [block.entries["timestamp"][0] for block in self.blocks]
+		self.tail = self.index_tail()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		self.map.close()
+		self.file.close()
+
+	def load_index(self) -> list[IndexBlock]:
+		blocks = []
+		block = self.last_index_block()
+		while block is not None:
+			blocks.append(block)
+			block = self.parse_index_block(self.map, block.previous)
+		blocks.reverse()
+		return blocks
+
+	def last_index_block(self) -> IndexBlock | None:
+		"""
+		The last intact index block. Only the records written after it are searched, the
+		magic may also turn up inside a payload, so each candidate must pass its CRC.
+		"""
+		end = len(self.map)
+		while True:
+			offset = self.map.rfind(INDEX_MAGIC, FILE_HEADER.size, end)
+			if offset < 0:
+				return None
+			block = self.parse_index_block(self.map, offset)
+			if block is not None:
+				return block
+			end = offset + len(INDEX_MAGIC) - 1
+
+	@staticmethod
+	def parse_index_block(data, offset: int) -> IndexBlock | None:
+		if offset < FILE_HEADER.size or offset + INDEX_HEADER.size > len(data):
+			return None
+
+		magic, previous, span_start, count = INDEX_HEADER.unpack_from(data, offset)
+		end = offset + INDEX_HEADER.size + count * INDEX_ENTRY.itemsize
+		if magic != INDEX_MAGIC or count == 0 or end + INDEX_CRC.size > len(data):
+			return None
+		if INDEX_CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+			return None
+
+		# copied, a view would keep the memory map from closing
+		entries = np.frombuffer(data, dtype=INDEX_ENTRY, count=count, offset=offset + INDEX_HEADER.size).copy()
+		return IndexBlock(offset, previous, span_start, entries)
+
+	def index_tail(self) -> np.ndarray:
+		"""
+		Index entries, like those of a block, for the records after the last index block.
+		"""
+		start = self.blocks[-1].end if self.blocks else FILE_HEADER.size
+		entries = [
+			(record.timestamp, offset)
+			for count, (offset, record) in enumerate(self.scan(start))
+			if count % INDEX_STRIDE == 0
+		]
+		return np.array(entries, dtype=INDEX_ENTRY)
+
+	def time_range(self) -> tuple[float, float] | None:
+		first = next(self.records(), None)
+		if first is None:
+			return None
+
+		# the last index entry is at most INDEX_STRIDE records from the end
+		last = first
+		entries = self.tail if len(self.tail) else self.blocks[-1].entries
+		for last in self.records_from(int(entries["offset"][-1])):
+			pass
+		return first.timestamp, last.timestamp
+
+	def seek(self, timestamp: float) -> int:
+		"""
+		Offset of a record at or before the first one recorded at `timestamp` or later,
+		at most INDEX_STRIDE records before it.
+		"""
+		if len(self.tail) and timestamp >= self.tail["timestamp"][0]:
+			entries = self.tail
+		else:
+			position = bisect.bisect_right(self.block_times, timestamp) - 1
+			if position < 0:
+				return FILE_HEADER.size
+			entries = self.blocks[position].entries
+
+		entry = int(np.searchsorted(entries["timestamp"], timestamp, side="right")) - 1
+		return int(entries["offset"][max(entry, 0)])
+
+	def records(self, start: float | None = None, end: float | None = None) -> Iterator[Record]:
+		"""
+		The records from `start` to `end` (timestamps, both optional) in file order.
+		"""
+		offset = FILE_HEADER.size if start is None else self.seek(start)
+		for record in self.records_from(offset):
+			if start is not None and record.timestamp < start:
+				continue
+			if end is not None and record.timestamp > end:
+				break
+			yield record
+
+	def records_from(self, offset: int) -> Iterator[Record]:
+		for _, record in self.scan(offset):
+			yield record
+
+	def scan(self, offset: int) -> Iterator[tuple[int, Record]]:
+		"""
+		(offset, record) for every record from `offset` on, stepping over the index blocks.
+		"""
+		size = len(self.map)
+		while offset + 1 <= size:
+			if self.map[offset:offset + len(INDEX_MAGIC)] == INDEX_MAGIC:
+				block = self.parse_index_block(self.map, offset)
+				if block is None:
+					break  # torn index block at the end
+				offset = block.end
+				continue
+
+			if offset + RECORD_HEADER.size > size:
+				break
+			direction, timestamp, command, length = RECORD_HEADER.unpack_from(self.map, offset)
+			payload_start = offset + RECORD_HEADER.size
+			if payload_start + length > size:
+				break  # torn record at the end
+			yield offset, Record(timestamp, direction, command, self.map[payload_start:payload_start + length])
+			offset = payload_start + length
+
@@ -0,0 +1,258 @@
+import threading
+
+import numpy as np
+
+from app.back_logic.pulse_monitor import COUNTER_MODULUS
+
+CHUNK_SIZE = 4096  # samples, arrays grow by whole chunks
+GROWTH = 1.5  # a full series grows to at least this many times its capacity
+PULSE_SERIES = "pulses"
+
+
+class TelemetrySeries:
+	"""
+	One polled quantity over time, stored by column: a timestamp array and a parallel
+	(n, columns) value array. The arrays are allocated a chunk at a time and grow
+	geometrically, so appending stays cheap over multi-day captures and the history is
+	always a contiguous array the derived metrics can work on in one vectorized pass.
+
+	`counter` marks values that only go up and wrap at `modulus`, like the pulse counts.
+	Their unwrapped totals are kept next to the raw values as samples arrive, so reading
+	them never unwraps the whole history again.
+	"""
+
+	def __init__(
+			self,
+			name: str,
+			columns: int = 1,
+			dtype=np.float64,
+			counter: bool = False,
+			modulus: int = COUNTER_MODULUS,
+	):
+		self.name = name
+		self.counter = counter
+		self.modulus = modulus
+
+		self.size = 0
+		self.times = np.empty(CHUNK_SIZE, dtype=np.float64)
+		self.values = np.empty((CHUNK_SIZE, columns), dtype=dtype)
+		self.totals = np.empty((CHUNK_SIZE, columns), dtype=np.int64) if counter else None
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return self.size
+
+	@property
+	def columns(self) -> int:
+		return self.values.shape[1]
+
+	def reserve(self, size: int):
+		if size <= len(self.times):
+			return
+
+		capacity = max(size, int(len(self.times) * GROWTH))
+		capacity = -(-capacity // CHUNK_SIZE) * CHUNK_SIZE
+		times = np.empty(capacity, dtype=np.float64)
+		values = np.empty((capacity, self.columns), dtype=self.values.dtype)
+		times[:self.size] = self.times[:self.size]
+		values[:self.size] = self.values[:self.size]
+		if self.counter:
+			totals = np.empty((capacity, self.columns), dtype=np.int64)
+			totals[:self.size] = self.totals[:self.size]
+			self.totals = totals
+		self.times, self.values = times, values
+
+	def append(self, timestamp: float, values):
+		self.extend([timestamp], [values])
+
+	def extend(self, timestamps, values):
+		timestamps = np.asarray(timestamps, dtype=np.float64)
+		values = np.asarray(values, dtype=self.values.dtype).reshape(len(timestamps), self.columns)
+		with self.lock:
+			first, last = self.size, self.size + len(timestamps)
+			self.reserve(last)
+			if self.counter and len(timestamps):
+				# carried on from the last sample, only the new ones are unwrapped
+				previous, total = (self.values[first - 1], self.totals[first - 1]) if first else (None, None)
+				self.totals[first:last] = unwrap_counter(values, self.modulus, previous, total)
+			self.times[first:last] = timestamps
+			self.values[first:last] = values
+			self.size = last
+
+	def clear(self):
+		with self.lock:
+			self.size = 0
+
+	def data(self) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		Views of the timestamps and values recorded so far. Samples are never modified once
+		appended and growing swaps in new arrays, so the views stay valid without copying
+		while the poller keeps appending.
+		"""
+		with self.lock:
+			return self.times[:self.size], self.values[:self.size]
+
+	def unwrapped(self) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		The values with counter wrap-arounds undone, as int64 totals that keep counting up.
+		Values that are not counters come back as they are. Views, like data().
+		"""
+		with self.lock:
+			values = self.totals if self.counter else self.values
+			return self.times[:self.size], values[:self.size]
+
+	def last_total(self) -> np.ndarray | None:
+		"""
+		The unwrapped values of the latest sample, None before the first one.
+		"""
+		with self.lock:
+			if not self.size:
+				return None
+			values = self.totals if self.counter else self.values
+			return values[self.size - 1].copy()
+
+	def rate(self) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		Change per second between consecutive samples, stamped at the later sample.
+		"""
+		times, values = self.unwrapped()
+		return times[1:], rate(times, values)
+
+	def moving_average(self, window: float) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		For counters, the average rate over the `window` seconds before each sample; for
+		other values, the average of the samples in that window.
+		"""
+		times, values = self.unwrapped()
+		if self.counter:
+			return times, windowed_rate(times, values, window)
+		return times, moving_average(times, values, window)
+
+
+def unwrap_counter(
+		values: np.ndarray,
+		modulus: int = COUNTER_MODULUS,
+		previous: np.ndarray | None = None,
+		total: np.ndarray | None = None,
+) -> np.ndarray:
+	"""
+	Running totals of a counter that wraps at `modulus`: every step is taken modulo it, so
+	a drop means the counter went around, never that it went back. To carry on earlier
+	totals, pass the raw value that came before `values` as `previous` and its `total`.
+	"""
+	values = np.asarray(values, dtype=np.int64)
+	if not len(values):
+		return values
+	if previous is None:
+		previous = total = values[0]
+
+	steps = np.diff(values, axis=0, prepend=np.asarray(previous, dtype=np.int64)[np.newaxis]) % modulus
+	return total + np.cumsum(steps, axis=0)
+
+
+def rate(times: np.ndarray, values: np.ndarray) -> np.ndarray:
+	elapsed = np.diff(times)
+	if values.ndim > 1:
+		elapsed = elapsed[:, np.newaxis]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return np.diff(values, axis=0) / elapsed
+
+
+def window_starts(times: np.ndarray, window: float) -> np.ndarray:
+	"""
+	Index of the first sample within `window` seconds before each sample.
+	"""
+	return np.searchsorted(times, times - window, side="left")
+
+
+def moving_average(times: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+	"""
+	Time-based moving average: each sample averaged with the samples up to `window` seconds
+	before it, from prefix sums, so the cost doesn't depend on how many samples a window holds.
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	prefix = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+	starts = window_starts(times, window)
+	ends = np.arange(1, len(times) + 1)
+	counts = ends - starts
+	if values.ndim > 1:
+		counts = counts[:, np.newaxis]
+	return (prefix[ends] - prefix[starts]) / counts
+
+
+def windowed_rate(times: np.ndarray, totals: np.ndarray, window: float) -> np.ndarray:
+	"""
+	Average rate over the `window` seconds before each sample, from unwrapped totals. The
+	first sample has no rate and comes back as NaN.
+	"""
+	starts = window_starts(times, window)
+	elapsed = times - times[starts]
+	if totals.ndim > 1:
+		elapsed = elapsed[:, np.newaxis]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return np.where(elapsed > 0, (totals - totals[starts]) / elapsed, np.nan)
+
+
+def energy(totals: np.ndarray, pulse_factor: float, offset: float = 0) -> np.ndarray:
+	"""
+	The meter reading the device displays for unwrapped pulse `totals`: AT+OFFSET plus the
+	pulse count times AT+FPULSE, the units per pulse.
+	"""
+	return offset + np.asarray(totals) * pulse_factor
+
+
+class TelemetryStore:
+	"""
+	The series recorded during a monitoring session, by name, plus the display
+	configuration (AT+OFFSET, AT+FPULSE) that turns pulse counts into energy.
+	"""
+
+	def __init__(self, offset: float = 0, pulse_factor: float = 1):
+		self.series: dict[str, TelemetrySeries] = {}
+		self.offset = offset
+		self.pulse_factor = pulse_factor
+
+	def __getitem__(self, name: str) -> TelemetrySeries:
+		return self.series[name]
+
+	def __contains__(self, name: str) -> bool:
+		return name in self.series
+
+	def add_series(self, name: str, columns: int = 1, dtype=np.float64, counter: bool = False) -> TelemetrySeries:
+		if name not in self.series:
+			self.series[name] = TelemetrySeries(name, columns, dtype, counter)
+		return self.series[name]
+
+	def record(self, name: str, timestamp: float, values):
+		"""
+		Appends one sample. A series seen for the first time holds plain float values; add
+		counters with add_series first.
+		"""
+		if name not in self.series:
+			self.add_series(name, np.size(values))
+		self.series[name].append(timestamp, values)
+
+	def record_pulses(self, timestamp: float, count1: int, count2: int):
+		"""
+		Signature of PulseMonitor's on_sample.
+		"""
+		self.add_series(PULSE_SERIES, 2, np.int64, counter=True).append(timestamp, (count1, count2))
+
+	def set_display_config(self, offset, pulse_factor):
+		if offset is not None:
+			self.offset = offset
+		if pulse_factor is not None:
+			self.pulse_factor = pulse_factor
+
+	def energy(self, name: str = PULSE_SERIES) -> tuple[np.ndarray, np.ndarray]:
+		times, totals = self.series[name].unwrapped()
+		return times, energy(totals, self.pulse_factor, self.offset)
+
+	def energy_totals(self, name: str = PULSE_SERIES) -> np.ndarray | None:
+		"""
+		The latest reading of each counter of `name`, None before its first sample or if
+		nothing was recorded under `name`.
+		"""
+		series = self.series.get(name)
+		totals = series.last_total() if series is not None else None
+		return energy(totals, self.pulse_factor, self.offset) if totals is not None else None
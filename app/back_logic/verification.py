@@ -0,0 +1,170 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from app.back_logic.config_manager import get_from_config
+from app.back_logic.device_cache import SETTERS
+from app.back_logic.protocol import (
+	COMMANDS,
+	IN3MODE,
+	MBREGCFG,
+	MSGVAR,
+	MSGVAR_RESET,
+	ResponseError,
+	is_error,
+	is_ok,
+	parse_int,
+)
+
+VERIFY_WRITES_KEY = "verify_writes"
+
+
+class Mismatch:
+	def __init__(self, name: str, expected: Any, actual: Any):
+		self.name = name
+		self.expected = expected
+		self.actual = actual
+
+	def __str__(self):
+		return f"{self.name}: expected {self.expected}, read {self.actual}"
+
+
+class VerificationError(ResponseError):
+	"""
+	Every write was acknowledged, but reading the values back shows the device did not keep them.
+	"""
+
+	def __init__(self, mismatches: list[Mismatch]):
+		super().__init__("; ".join(str(mismatch) for mismatch in mismatches))
+		self.mismatches = mismatches
+
+	def details(self) -> str:
+		return "\n".join(str(mismatch) for mismatch in self.mismatches)
+
+
+def verification_enabled() -> bool:
+	# off until it is turned on in the settings, it costs a read-back after every save
+	return get_from_config(VERIFY_WRITES_KEY) is True
+
+
+def written_values(lines: list[str]) -> dict[str, Any]:
+	"""
+	The values the write commands in `lines` leave on the device, typed like the parsed
+	query responses, keyed by command name. A later write of the same command wins. Writes
+	whose arguments don't parse back can't be verified and are left out.
+	"""
+	values = {}
+	for line in lines:
+		setter, _, args = line.strip().partition("=")
+		name = SETTERS.get(setter + "=")
+		command = COMMANDS.get(name)
+		if command is None or command.parser is None:
+			continue
+
+		try:
+			if command is IN3MODE:
+				values[name] = 1 if args.split(",")[0] == "16" else 0
+			elif command is MBREGCFG:
+				register = command.parser([args])[0]
+				values.setdefault(name, {})[register["register_position"]] = register
+			elif command is MSGVAR:
+				code = parse_int(args)
+				reset, codes = values.get(name, (False, []))
+				values[name] = (True, []) if code == MSGVAR_RESET else (reset, codes + [code])
+			else:
+				# the set arguments are formatted like the value line of the query
+				values[name] = command.parser([args])
+		except (ResponseError, IndexError) as e:
+			print(f"Cannot verify {line.strip()!r}: {e}")
+
+	return values
+
+
+def find_mismatches(name: str, expected: Any, actual: Any) -> list[Mismatch]:
+	if name == MBREGCFG.name:
+		registers = {register["register_position"]: register for register in actual}
+		return [
+			Mismatch(f"{name} {position}", register, registers.get(position))
+			for position, register in expected.items()
+			if registers.get(position) != register
+		]
+
+	if name == MSGVAR.name:
+		# slots are filled in order, without a reset the new codes land after the old ones
+		reset, codes = expected
+		assigned = [code for _, code in sorted(actual.items()) if code is not None]
+		found = assigned if reset else assigned[len(assigned) - len(codes):]
+		return [] if found == codes else [Mismatch(name, codes, assigned)]
+
+	return [] if actual == expected else [Mismatch(name, expected, actual)]
+
+
+def verify_writes(controller, lines: list[str]) -> list[Mismatch]:
+	"""
+	Reads back every parameter written by `lines` in one pipelined batch and compares the
+	values. The values read are left in the device cache.
+	"""
+	expected = written_values(lines)
+	if not expected:
+		return []
+
+	commands = [COMMANDS[name] for name in expected]
+	actual = controller.cache.read(controller, commands, refresh=True)
+
+	mismatches = []
+	for command, value in zip(commands, actual):
+		mismatches.extend(find_mismatches(command.name, expected[command.name], value))
+	return mismatches
+
+
+@contextmanager
+def write_session(controller, verify: bool | None = None) -> Iterator[list[str]]:
+	"""
+	A programming mode session that records everything written during it and, when the
+	body finishes without errors and the device answered OK to every write, reads all of
+	it back at once. Raises VerificationError if the device did not keep some value. A
+	write that was rejected or not answered skips the read-back: the body reports it, and
+	comparing would only find the same write again. `verify` defaults to the verify_writes
+	setting.
+	"""
+	verify = verification_enabled() if verify is None else verify
+	lines = []
+	answers = {}
+
+	def record(data: str):
+		lines.extend(line for line in data.split("\r\n") if "=" in line)
+
+	def record_answer(command: str, line: str):
+		# the last answer counts, a write retried after an ERROR may have gone through
+		if "=" in command and (is_ok(line) or is_error(line)):
+			answers[command.strip()] = line
+
+	with controller.programming_mode():
+		controller.write_listeners.append(record)
+		controller.read_listeners.append(record_answer)
+		try:
+			yield lines
+		finally:
+			controller.write_listeners.remove(record)
+			controller.read_listeners.remove(record_answer)
+
+		if verify:
+			rejected = [line for line in lines if not is_ok(answers.get(line))]
+			if rejected:
+				print(f"Not verifying, the device did not accept {rejected}")
+				return
+
+			mismatches = verify_writes(controller, lines)
+			if mismatches:
+				raise VerificationError(mismatches)
+
+
+def verification_message(future: Future) -> str | None:
+	"""
+	The message to show for a finished write job whose write_session found values the
+	device did not keep, None if it failed otherwise or went through.
+	"""
+	error = future.exception()
+	if not isinstance(error, VerificationError):
+		return None
+	return f"El dispositivo no guardó los valores escritos:\n{error.details()}"
@@ -0,0 +1,251 @@
+import json
+import os
+import time
+from typing import Callable
+
+from app.back_logic.protocol import DEVID, MSGVAR, MSGVAR_RESET, is_error, is_ok
+from app.back_logic.serial_controller import WRITE_WINDOW
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), "ECMConfig", "journals")
+FSYNC_INTERVAL = 0.25  # seconds, acknowledgements are synced to disk at most this often
+
+
+def journal_path(device_id: str) -> str:
+	return os.path.join(JOURNAL_DIR, f"{device_id}.journal")
+
+
+def is_idempotent(command: str) -> bool:
+	"""
+	Every write sets an absolute value except AT+MSGVAR=<code>, which appends to the payload.
+	"""
+	command = command.strip()
+	return not command.startswith(MSGVAR.set_prefix) or command == MSGVAR.set(MSGVAR_RESET).strip()
+
+
+class PendingJournalError(Exception):
+	"""
+	The device still has an interrupted write session for other writes, which has to be
+	resumed or discarded before a new one can start.
+	"""
+
+	def __init__(self, journal: "WriteJournal"):
+		super().__init__(
+			f"{journal.device_id} has an unfinished write session ({journal.label}), resume or discard it first"
+		)
+		self.journal = journal
+
+
+class WriteJournal:
+	"""
+	Append-only record of one write session on one device: a header line with every write
+	the session intends to send, then one line per write the device answered, acknowledged
+	or rejected. If the session is cut off (cable pulled, app closed) the journal stays on
+	disk and the next session on the same device can resume from the first write that got
+	no answer. A rejected write is not sent again on resume, the session reports it when it
+	happens. A session where every write got an answer deletes its journal.
+
+	The header is synced to disk before the first write goes out. Acknowledgements are
+	synced at most every FSYNC_INTERVAL seconds; one lost in a crash only means that write
+	is sent again on resume.
+	"""
+
+	def __init__(
+			self,
+			device_id: str,
+			commands: list[str],
+			label: str = "",
+			acked: set[int] | None = None,
+			nacked: set[int] | None = None,
+	):
+		self.device_id = device_id
+		self.commands = commands
+		self.label = label
+		self.acked = set() if acked is None else acked
+		self.nacked = set() if nacked is None else nacked
+		self.file = None
+		self.synced_at = 0.0
+
+	@classmethod
+	def begin(cls, device_id: str, commands: list[str], label: str = "") -> "WriteJournal":
+		"""
+		Starts the journal of a new session. Raises PendingJournalError instead of
+		overwriting an interrupted session of the same device.
+		"""
+		pending = cls.load(device_id)
+		if pending is not None and not pending.complete:
+			raise PendingJournalError(pending)
+
+		journal = cls(device_id, commands, label)
+		os.makedirs(JOURNAL_DIR, exist_ok=True)
+		journal.file = open(journal_path(device_id), "w", encoding="utf-8")
+		journal.append({"commands": commands, "label": label, "started": time.time()})
+		journal.sync()
+		return journal
+
+	@classmethod
+	def load(cls, device_id: str) -> "WriteJournal | None":
+		"""
+		The interrupted session of `device_id`, or None if there is none. Resuming it keeps
+		appending to the same file.
+		"""
+		try:
+			with open(journal_path(device_id), "r", encoding="utf-8") as journal_file:
+				lines = journal_file.read().splitlines()
+		except FileNotFoundError:
+			return None
+
+		records = []
+		for line in lines:
+			try:
+				records.append(json.loads(line))
+			except json.JSONDecodeError:
+				break  # the last line was torn by the crash, everything before it is good
+
+		if not records or "commands" not in records[0]:
+			return None
+
+		header = records[0]
+		acked = {record["ack"] for record in records[1:] if "ack" in record}
+		nacked = {record["nack"] for record in records[1:] if "nack" in record}
+		return cls(device_id, header["commands"], header.get("label", ""), acked, nacked)
+
+	@property
+	def answered(self) -> set[int]:
+		return self.acked | self.nacked
+
+	@property
+	def complete(self) -> bool:
+		return len(self.answered) == len(self.commands)
+
+	def resume_index(self) -> int:
+		"""
+		The first write to send again: the first one without an answer, or the payload reset
+		before it if payload variables follow, since appending them again is not harmless.
+		"""
+		answered = self.answered
+		pending = [index for index in range(len(self.commands)) if index not in answered]
+		if not pending:
+			return len(self.commands)
+
+		first = pending[0]
+		if all(is_idempotent(self.commands[index]) for index in pending):
+			return first
+
+		reset = MSGVAR.set(MSGVAR_RESET).strip()
+		for index in range(first, -1, -1):
+			if self.commands[index].strip() == reset:
+				return index
+		return 0
+
+	def remaining(self) -> list[int]:
+		"""
+		Indexes of the writes a resume sends: the ones without an answer from resume_index()
+		on, plus, when the payload is rebuilt, every payload write after its reset the device
+		acknowledged.
+		"""
+		start = self.resume_index()
+		answered = self.answered
+		rebuild_payload = start < len(self.commands) and start in answered
+		return [
+			index for index in range(start, len(self.commands))
+			if index not in answered or (
+				rebuild_payload and index in self.acked and self.commands[index].startswith(MSGVAR.set_prefix)
+			)
+		]
+
+	def acknowledge(self, index: int, accepted: bool = True):
+		"""
+		Records the device's answer to the write at `index`, OK when `accepted`, ERROR otherwise.
+		"""
+		if accepted:
+			self.acked.add(index)
+			self.append({"ack": index})
+		else:
+			self.nacked.add(index)
+			self.append({"nack": index})
+		if time.monotonic() - self.synced_at >= FSYNC_INTERVAL:
+			self.sync()
+
+	def append(self, record: dict):
+		if self.file is None:
+			self.file = open(journal_path(self.device_id), "a", encoding="utf-8")
+		self.file.write(json.dumps(record) + "\n")
+		self.file.flush()
+
+	def sync(self):
+		os.fsync(self.file.fileno())
+		self.synced_at = time.monotonic()
+
+	def close(self):
+		"""
+		Leaves the journal on disk so the session can be resumed. Acknowledging another
+		write opens it again.
+		"""
+		if self.file is not None:
+			self.sync()
+			self.file.close()
+			self.file = None
+
+	def finish(self):
+		if self.file is not None:
+			self.file.close()
+			self.file = None
+		self.discard()
+
+	def discard(self):
+		try:
+			os.remove(journal_path(self.device_id))
+		except FileNotFoundError:
+			pass
+
+
+def start_journal(controller, commands: list[str], label: str = "") -> WriteJournal:
+	"""
+	The journal for pushing `commands` to the connected device: the interrupted session
+	when it was pushing the very same writes, so they resume, or a new one. Raises
+	PendingJournalError if the interrupted session was pushing other writes.
+	"""
+	device_id = controller.cache.read(controller, [DEVID])[0]
+	journal = WriteJournal.load(device_id)
+	if journal is not None and journal.commands == commands:
+		print(f"Resuming the interrupted write session on {device_id}")
+		return journal
+	return WriteJournal.begin(device_id, commands, label)
+
+
+def send_journaled(
+		controller,
+		journal: WriteJournal,
+		indexes: list[int] | None = None,
+		on_response: Callable[[int, str | None], None] | None = None,
+		window: int = WRITE_WINDOW,
+) -> list[tuple[str, str]]:
+	"""
+	Streams the writes of `journal` (only those at `indexes` when given, e.g. its remaining
+	ones) and records each answer as it arrives. `on_response(index, response)` gets the
+	index into journal.commands. The journal is deleted once every write has been answered,
+	OK or ERROR, and kept for a later resume otherwise, also when the port fails midway.
+	Returns (command, response) for every write the device did not accept.
+	"""
+	indexes = list(range(len(journal.commands))) if indexes is None else indexes
+	commands = [journal.commands[index] for index in indexes]
+
+	def on_write_response(position, response):
+		if is_ok(response) or is_error(response):
+			journal.acknowledge(indexes[position], is_ok(response))
+		if on_response is not None:
+			on_response(indexes[position], response)
+
+	try:
+		responses = controller.send_windowed(commands, window=window, on_response=on_write_response)
+	finally:
+		journal.close()
+
+	if journal.complete:
+		journal.finish()
+
+	return [
+		(command.strip(), (response or "").strip())
+		for command, response in zip(commands, responses)
+		if not is_ok(response)
+	]
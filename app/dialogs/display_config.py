@@ -1,10 +1,14 @@
 import wx
 
+from app.back_logic.protocol import FPULSE, OFFSET, is_ok
+from app.back_logic.verification import verification_message, write_session
+
 
 class DisplayConfigDialog(wx.Dialog):
-    def __init__(self, parent, title, controller):
+    def __init__(self, parent, title, controller, serial_worker):
         super(DisplayConfigDialog, self).__init__(parent, title=title)
         self.controller = controller
+        self.serial_worker = serial_worker
 
         self.SetSize(500, 500)  # Set the size of the dialog
 
@@ -17,6 +21,11 @@ class DisplayConfigDialog(wx.Dialog):
 
         self.init_ui()
 
+        # values already read, e.g. by the snapshot taken when the port opened
+        cached = controller.cache.peek([OFFSET, FPULSE]) if controller.is_open() else None
+        if cached is not None:
+            self.show_display_config(*cached)
+
     def init_ui(self):
         panel = wx.Panel(self)
 
@@ -171,24 +180,33 @@ class DisplayConfigDialog(wx.Dialog):
                 parent=self,
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
-            offset_value = self.controller.send_command("AT+OFFSET?\r\n")
-            print(f"offset: {offset_value}")
-            offset_value = offset_value.split(" ")[-1]
-            dlg.Update(1, "Leyendo valor de offset...")
-
-            pulse_factor_value = self.controller.send_command("AT+FPULSE?\r\n")
-            print(f"Pulse factor: {pulse_factor_value}")
-            pulse_factor_value = pulse_factor_value.split(" ")[-1]
-            dlg.Update(2, "Leyendo valor de factor de pulsos...")
 
-            dlg.Destroy()
+            def read_display_config(controller):
+                self.serial_worker.post(dlg.Update, 1, "Leyendo valores de offset y factor de pulsos...")
+                values = controller.cache.read(controller, [OFFSET, FPULSE], refresh=True)
+                self.serial_worker.post(dlg.Update, 2, "Lectura completada")
+                return values
 
-            self.display_config_info["offset"]["text_ctrl"].SetValue(offset_value)
-            self.display_config_info["pulse_factor"]["text_ctrl"].SetValue(pulse_factor_value)
+            self.serial_worker.submit(read_display_config, lambda future: self.on_display_config_read(future, dlg))
         else:
             wx.MessageBox("No se puede leer la configuración de display, el puerto serial no está abierto",
                           "Error", wx.OK | wx.ICON_ERROR)
 
+    def on_display_config_read(self, future, dlg):
+        dlg.Destroy()
+        if future.exception() is not None:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        self.show_display_config(*future.result())
+
+    def show_display_config(self, offset_value, pulse_factor_value):
+        print(f"offset: {offset_value}")
+        print(f"Pulse factor: {pulse_factor_value}")
+
+        self.display_config_info["offset"]["text_ctrl"].SetValue(str(offset_value))
+        self.display_config_info["pulse_factor"]["text_ctrl"].SetValue(str(pulse_factor_value))
+
     def on_write(self, event):
         if self.controller.is_open():
             dlg = wx.ProgressDialog(
@@ -203,17 +221,36 @@ class DisplayConfigDialog(wx.Dialog):
             pulse_factor_value = self.pulse_factor_input.GetValue()
 
             # Format the values into the appropriate command strings
-            offset_command = f"AT+OFFSET={offset_value}\r\n"
-            self.controller.send_command(offset_command)
-            dlg.Update(1, "Cargando configuración de offset...")
+            offset_command = OFFSET.set(offset_value)
+            pulse_factor_command = FPULSE.set(pulse_factor_value)
 
-            pulse_factor_command = f"AT+FPULSE={pulse_factor_value}\r\n"
-            reply = self.controller.send_command(pulse_factor_command)
-            dlg.Update(2, "Cargando configuración de factor de pulsos...")
+            def write_display_config(controller):
+                with write_session(controller):
+                    offset_reply = controller.send_command(offset_command)
+                    self.serial_worker.post(dlg.Update, 1, "Cargando configuración de offset...")
 
-            dlg.Destroy()
+                    pulse_factor_reply = controller.send_command(pulse_factor_command)
+                    self.serial_worker.post(dlg.Update, 2, "Cargando configuración de factor de pulsos...")
+                return offset_reply, pulse_factor_reply
 
-            wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
+            self.serial_worker.submit(write_display_config, lambda future: self.on_display_config_saved(future, dlg))
         else:
             wx.MessageBox("No se puede escribir la configuración de display, el puerto serial no está abierto",
                           "Error", wx.OK | wx.ICON_ERROR)
+
+    def on_display_config_saved(self, future, dlg):
+        dlg.Destroy()
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        if future.exception() is not None:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        if not all(is_ok(reply) for reply in future.result()):
+            wx.MessageBox("No se pudieron guardar los valores", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
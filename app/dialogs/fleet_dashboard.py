@@ -0,0 +1,153 @@
+import threading
+
+import wx
+import wx.grid
+
+from app.back_logic.config_manager import get_from_config
+from app.back_logic.fleet_monitor import POLL_INTERVAL, FleetMonitor
+from app.back_logic.pulse_monitor import MIN_SAMPLE_INTERVAL
+from app.back_logic.serial_controller import list_available_serial_ports
+
+COLUMNS = [
+    "Puerto", "ID", "Pulsos 1", "Pulsos 2", "Encendido", "Apagado", "Contactor", "Estado", "Actualizado",
+]
+STATUS_COLUMN = COLUMNS.index("Estado")
+ERROR_COLOUR = wx.Colour(255, 220, 220)
+
+
+class FleetDashboardDialog(wx.Dialog):
+    """
+    Watches several devices at once, one serial port each. Readings arrive one port at
+    a time and only the cells whose text changed are set, so the grid repaints just
+    those cells instead of the whole table.
+    """
+
+    def __init__(self, parent, title, controller):
+        super(FleetDashboardDialog, self).__init__(
+            parent, title=title, size=(980, 520), style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER
+        )
+
+        self.controller = controller
+        self.monitor = None
+        self.rows = {}  # port -> grid row
+        self.shown = {}  # (row, column) -> text in the cell
+
+        self.init_ui()
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
+    def init_ui(self):
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        # the port the main window has open stays with it
+        ports = list_available_serial_ports()
+        if self.controller.is_open():
+            ports = [port for port in ports if port != self.controller.port]
+
+        vbox.Add(wx.StaticText(panel, label="Puertos a monitorear:"), flag=wx.LEFT | wx.TOP, border=10)
+        self.ports_list = wx.CheckListBox(panel, choices=ports, size=(-1, 100))
+        vbox.Add(self.ports_list, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        hbox.Add(wx.StaticText(panel, label="Intervalo por puerto (s):"), flag=wx.ALIGN_CENTER_VERTICAL)
+        self.interval_ctrl = wx.SpinCtrlDouble(
+            panel, min=MIN_SAMPLE_INTERVAL, max=60, inc=0.5, initial=POLL_INTERVAL, size=(80, -1)
+        )
+        hbox.Add(self.interval_ctrl, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=5)
+        self.start_btn = wx.Button(panel, label="Iniciar")
+        hbox.Add(self.start_btn, flag=wx.LEFT, border=10)
+        vbox.Add(hbox, flag=wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
+        self.grid = wx.grid.Grid(panel)
+        self.grid.CreateGrid(0, len(COLUMNS))
+        self.grid.EnableEditing(False)
+        self.grid.HideRowLabels()
+        for column, label in enumerate(COLUMNS):
+            self.grid.SetColLabelValue(column, label)
+            self.grid.SetColSize(column, 100)
+        vbox.Add(self.grid, proportion=1, flag=wx.EXPAND | wx.ALL, border=10)
+
+        panel.SetSizer(vbox)
+
+        self.Bind(wx.EVT_BUTTON, self.on_toggle, self.start_btn)
+
+    def on_toggle(self, event):
+        if self.monitor is not None:
+            self.stop_monitor()
+            return
+
+        ports = list(self.ports_list.GetCheckedStrings())
+        if not ports:
+            wx.MessageBox("Seleccione al menos un puerto")
+            return
+
+        self.set_rows(ports)
+        baud_rate = get_from_config("baud_rate")
+        self.monitor = FleetMonitor(
+            ports,
+            self.on_update,
+            interval=self.interval_ctrl.GetValue(),
+            baudrate=int(baud_rate) if str(baud_rate).isdigit() else None,
+            dispatch=wx.CallAfter,
+        )
+        self.monitor.start()
+
+        self.ports_list.Disable()
+        self.interval_ctrl.Disable()
+        self.start_btn.SetLabel("Detener")
+
+    def stop_monitor(self):
+        if self.monitor is None:
+            return
+
+        # the ports are released on their own thread, the button comes back once they are
+        monitor, self.monitor = self.monitor, None
+        threading.Thread(target=self.release_ports, args=(monitor,), name="fleet-stop").start()
+        self.start_btn.SetLabel("Iniciar")
+        self.start_btn.Disable()
+
+    def release_ports(self, monitor):
+        monitor.stop()
+        wx.CallAfter(self.on_ports_released)
+
+    def on_ports_released(self):
+        if not self:
+            # the dialog was closed while the ports were being released
+            return
+
+        self.ports_list.Enable()
+        self.interval_ctrl.Enable()
+        self.start_btn.Enable()
+
+    def set_rows(self, ports):
+        if self.grid.GetNumberRows():
+            self.grid.DeleteRows(0, self.grid.GetNumberRows())
+        self.grid.AppendRows(len(ports))
+
+        self.rows = {port: row for row, port in enumerate(ports)}
+        self.shown = {}
+        for port, row in self.rows.items():
+            self.set_cell(row, 0, port)
+
+    def set_cell(self, row, column, text):
+        if self.shown.get((row, column)) == text:
+            return
+
+        self.shown[(row, column)] = text
+        if column == STATUS_COLUMN:
+            self.grid.SetCellBackgroundColour(row, column, wx.WHITE if text == "OK" else ERROR_COLOUR)
+        # setting the value repaints only this cell
+        self.grid.SetCellValue(row, column, text)
+
+    def on_update(self, reading):
+        if not self or reading.port not in self.rows:
+            # the dialog was closed or restarted while the poll was running
+            return
+
+        row = self.rows[reading.port]
+        for column, text in enumerate(reading.cells()):
+            self.set_cell(row, column, text)
+
+    def on_close(self, event):
+        self.stop_monitor()
+        self.Destroy()
@@ -1,7 +1,27 @@
+import threading
+
 import wx
 
 from app.back_logic.config_manager import save_to_config, get_from_config
-from app.back_logic.serial_controller import list_available_serial_ports
+from app.back_logic.discovery import discover_devices
+from app.back_logic.serial_controller import AUTO_BAUD_RATE, BAUD_RATES, list_available_serial_ports
+from app.back_logic.session_recorder import (
+    RECORD_BOTH,
+    RECORD_EXCHANGES,
+    RECORD_OFF,
+    RECORD_SESSIONS_KEY,
+    RECORD_TELEMETRY,
+    recording_mode,
+)
+from app.back_logic.verification import VERIFY_WRITES_KEY, verification_enabled
+
+AUTO_BAUD_RATE_LABEL = "Automático"
+RECORDING_LABELS = {
+    RECORD_OFF: "No grabar",
+    RECORD_EXCHANGES: "Comunicación serial",
+    RECORD_TELEMETRY: "Telemetría",
+    RECORD_BOTH: "Comunicación y telemetría",
+}
 
 my_EVT_PORT_CHANGED = wx.NewEventType()
 EVT_PORT_CHANGED = wx.PyEventBinder(my_EVT_PORT_CHANGED, 1)
@@ -18,9 +38,10 @@ class PortChangedEvent(wx.PyCommandEvent):
 
 class SettingsDialog(wx.Dialog):
     def __init__(self, parent, title, controller):
-        super(SettingsDialog, self).__init__(parent, title=title, size=(400, 200))
+        super(SettingsDialog, self).__init__(parent, title=title, size=(520, 480))
 
         self.controller = controller
+        self.discovered_devices = []
         self.init_ui()
 
     def init_ui(self):
@@ -39,12 +60,39 @@ class SettingsDialog(wx.Dialog):
 
         baud_rate_label = wx.StaticText(panel, label="Baud Rate:")
         selected_baud_rate = get_from_config("baud_rate")
-        baud_rate_choices = ["9600", "14400", "19200", "38400", "57600", "115200"]
+        if selected_baud_rate == AUTO_BAUD_RATE:
+            selected_baud_rate = AUTO_BAUD_RATE_LABEL
+        baud_rate_choices = [AUTO_BAUD_RATE_LABEL] + [str(rate) for rate in BAUD_RATES]
         self.baud_rate_dropdown = wx.Choice(panel, choices=baud_rate_choices)
         self.baud_rate_dropdown.SetStringSelection(selected_baud_rate if selected_baud_rate else "9600")
         vbox.Add(baud_rate_label, flag=wx.EXPAND | wx.LEFT | wx.TOP, border=10)
         vbox.Add(self.baud_rate_dropdown, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
 
+        # Reads back every value written at the end of each save
+        self.verify_writes_checkbox = wx.CheckBox(panel, label="Verificar los valores después de guardarlos")
+        self.verify_writes_checkbox.SetValue(verification_enabled())
+        vbox.Add(self.verify_writes_checkbox, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
+        # Sessions are recorded to ~/ECMConfig/sessions
+        recording_label = wx.StaticText(panel, label="Grabar sesión:")
+        self.recording_dropdown = wx.Choice(panel, choices=list(RECORDING_LABELS.values()))
+        self.recording_dropdown.SetStringSelection(RECORDING_LABELS.get(recording_mode(), RECORDING_LABELS[RECORD_OFF]))
+        vbox.Add(recording_label, flag=wx.EXPAND | wx.LEFT | wx.TOP, border=10)
+        vbox.Add(self.recording_dropdown, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
+        # Devices found by probing every port, picking one fills in the port above
+        hbox_scan = wx.BoxSizer(wx.HORIZONTAL)
+        self.scan_btn = wx.Button(panel, label="Buscar dispositivos")
+        self.scan_status = wx.StaticText(panel, label="")
+        hbox_scan.Add(self.scan_btn)
+        hbox_scan.Add(self.scan_status, flag=wx.LEFT | wx.ALIGN_CENTER_VERTICAL, border=10)
+        vbox.Add(hbox_scan, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
+        self.devices_list = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for column, label in enumerate(["Puerto", "ID", "Red", "Baud Rate", "Latencia"]):
+            self.devices_list.InsertColumn(column, label)
+        vbox.Add(self.devices_list, proportion=1, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.TOP, border=10)
+
         hbox_btn = wx.BoxSizer(wx.HORIZONTAL)
         save_btn = wx.Button(panel, label="Guardar", size=(70, 30))
         cancel_btn = wx.Button(panel, label="Cancelar", size=(70, 30))
@@ -57,6 +105,53 @@ class SettingsDialog(wx.Dialog):
 
         self.Bind(wx.EVT_BUTTON, self.on_save, save_btn)
         self.Bind(wx.EVT_BUTTON, self.on_cancel, cancel_btn)
+        self.Bind(wx.EVT_BUTTON, self.on_scan, self.scan_btn)
+        self.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_device_selected, self.devices_list)
+
+    def on_scan(self, event):
+        """
+        Probes every serial port for ECM devices on a background thread, so the dialog
+        stays responsive. The port the application already has open is left alone.
+        """
+        ports = list_available_serial_ports()
+        if self.controller.is_open():
+            ports = [port for port in ports if port != self.controller.port]
+
+        baud_rate = self.baud_rate_dropdown.GetStringSelection()
+        baud_rate = int(baud_rate) if baud_rate.isdigit() else self.controller.baudrate
+
+        self.scan_btn.Disable()
+        self.scan_status.SetLabel("Buscando...")
+
+        def scan():
+            devices = discover_devices(ports, baudrate=baud_rate)
+            wx.CallAfter(self.on_devices_found, devices)
+
+        threading.Thread(target=scan, name="discovery", daemon=True).start()
+
+    def on_devices_found(self, devices):
+        if not self:
+            # the dialog was closed while the scan was running
+            return
+
+        self.discovered_devices = devices
+        self.devices_list.DeleteAllItems()
+        for row, device in enumerate(devices):
+            self.devices_list.InsertItem(row, device.port)
+            self.devices_list.SetItem(row, 1, device.device_id)
+            self.devices_list.SetItem(row, 2, device.network_type)
+            self.devices_list.SetItem(row, 3, str(device.baudrate))
+            self.devices_list.SetItem(row, 4, f"{device.latency * 1000:.0f} ms")
+
+        self.scan_status.SetLabel(f"{len(devices)} dispositivo(s) encontrado(s)")
+        self.scan_btn.Enable()
+
+    def on_device_selected(self, event):
+        device = self.discovered_devices[event.GetIndex()]
+        if self.port_dropdown.FindString(device.port) == wx.NOT_FOUND:
+            self.port_dropdown.Append(device.port)
+        self.port_dropdown.SetStringSelection(device.port)
+        self.baud_rate_dropdown.SetStringSelection(str(device.baudrate))
 
     def on_save(self, event):
         """
@@ -67,11 +162,17 @@ class SettingsDialog(wx.Dialog):
         selected_baud_rate = self.baud_rate_dropdown.GetStringSelection()
 
         # Save to config
+        if selected_baud_rate == AUTO_BAUD_RATE_LABEL:
+            # the main frame detects the rate once the port is open
+            save_to_config("baud_rate", AUTO_BAUD_RATE)
+        else:
+            save_to_config("baud_rate", selected_baud_rate)
+
+            # Update the controller's baud rate so the next open uses it
+            self.controller.update_baud_rate(int(selected_baud_rate))
         save_to_config("serial_port", selected_port)
-        save_to_config("baud_rate", selected_baud_rate)
-
-        # Update the controller's baud rate so the next open uses it
-        self.controller.update_baud_rate(int(selected_baud_rate))
+        save_to_config(VERIFY_WRITES_KEY, self.verify_writes_checkbox.GetValue())
+        save_to_config(RECORD_SESSIONS_KEY, list(RECORDING_LABELS)[self.recording_dropdown.GetSelection()])
 
         # Fire our custom event so MainFrame can react
         evt = PortChangedEvent(my_EVT_PORT_CHANGED, -1, selected_port)
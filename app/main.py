@@ -1,7 +1,7 @@
 import wx
 
 from app.back_logic.config_manager import get_from_config
-from app.back_logic.serial_controller import SerialController
+from app.back_logic.serial_controller import AUTO_BAUD_RATE, SerialController, cached_baud_rate
 from app.dir_paths import ASSETS_DIR
 from app.main_screen import MainFrame
 
@@ -24,11 +24,19 @@ class App(wx.App):
 	def setup_main_frame(self):
 		selected_port = get_from_config("serial_port")
 		baudrate = get_from_config("baud_rate")
+		auto_baud_rate = baudrate == AUTO_BAUD_RATE
+		if auto_baud_rate:
+			baudrate = cached_baud_rate(selected_port)
 		comms_controller = SerialController(selected_port, baudrate=baudrate)
 		frame = MainFrame(None, "ECM Config", comms_controller)
 		frame.Show(True)
 		self.SetTopWindow(frame)
 
+		if auto_baud_rate and comms_controller.is_open():
+			frame.detect_baud_rate()
+		if comms_controller.is_open():
+			frame.load_snapshot()
+
 
 def main():
 	app = App(False)
@@ -6,6 +6,7 @@ import win32con
 from ctypes import windll
 
 from app.dialogs.display_config import DisplayConfigDialog
+from app.dialogs.fleet_dashboard import FleetDashboardDialog
 from app.dir_paths import ASSETS_DIR
 from app.panels.ac_input import AcInputPanel
 from app.panels.device_status import DeviceStatusPanel
@@ -13,10 +14,30 @@ from app.panels.digital_input import DigitalInputPanel
 from app.panels.schedule_config import ScheduleConfigPanel
 from app.panels.modbus_config import ModbusConfigPanel
 from app.panels.payload_config_panel import PayloadConfigPanel
+from app.panels.pulse_chart import PulseChartPanel
 
 from app.back_logic.config_manager import get_from_config
+from app.back_logic.device_snapshot import read_snapshot
+from app.back_logic.provisioning import build_commands
+from app.back_logic.profiles import ProfileError, apply_profile, load_profile, read_profile, save_profile
+from app.back_logic.serial_controller import AUTO_BAUD_RATE, cached_baud_rate
+from app.back_logic.serial_worker import SerialWorker
+from app.back_logic.session_recorder import (
+	RECORD_BOTH,
+	RECORD_EXCHANGES,
+	RECORD_OFF,
+	RECORD_TELEMETRY,
+	SessionRecorder,
+	recording_mode,
+	session_path,
+)
+from app.back_logic.verification import verification_message, write_session
+from app.back_logic.write_journal import PendingJournalError, WriteJournal, send_journaled
 from app.dialogs.settings import SettingsDialog, EVT_PORT_CHANGED
 
+CLOSE_TIMEOUT = 5  # seconds the worker gets to leave programming mode and close the port before the window goes anyway
+PROFILE_WILDCARD = "Perfil ECM (*.ecmp)|*.ecmp|Perfil JSON (*.json)|*.json"
+
 
 def set_taskbar_icon(frame, icon_path):
 	icon_flags = win32con.LR_LOADFROMFILE | win32con.LR_DEFAULTSIZE
@@ -34,6 +55,14 @@ class MainFrame(wx.Frame):
 		super(MainFrame, self).__init__(parent, title=title, size=(1200, 700))
 
 		self.serial_controller = serial_controller
+		# every exchange with the device runs on this thread so the UI never blocks on the port
+		self.serial_worker = SerialWorker(serial_controller, dispatch=wx.CallAfter)
+		self.fleet_dashboard = None
+		self.recorder = None
+		self.recording_mode = RECORD_OFF
+		self.status_page = None
+		self.closing = False
+		self.close_timer = None
 
 		icon_path = f"{ASSETS_DIR}/logo.ico"
 		icon = wx.Icon(icon_path, wx.BITMAP_TYPE_ICO)
@@ -69,6 +98,7 @@ class MainFrame(wx.Frame):
 		self.update_port_status()
 
 		self.setup_tabs()
+		self.apply_recording_mode()
 
 		sizer = wx.BoxSizer(wx.VERTICAL)
 		sizer.Add(self.page_controller, 1, wx.EXPAND)
@@ -96,10 +126,41 @@ class MainFrame(wx.Frame):
 		event.Veto()
 
 	def on_close(self, event):
-		if self.serial_controller.is_open():
-			self.serial_controller.close()
+		if self.closing:
+			return
+		self.closing = True
+
+		self.stop_monitors()
+		if self.fleet_dashboard:
+			self.fleet_dashboard.Close()
+		self.Hide()
+
+		# the port is closed by the worker after the monitors have left programming mode and
+		# whatever else is still queued; the window goes once that is done, the UI never waits
+		self.serial_worker.submit(self.close_port, lambda future: self.finish_close())
+		self.serial_worker.request_stop()
+		self.close_timer = wx.CallLater(CLOSE_TIMEOUT * 1000, self.finish_close)
+
+	def finish_close(self):
+		if self.close_timer is None:
+			return  # already closed
+		self.close_timer.Stop()
+		self.close_timer = None
+		if self.recorder is not None:
+			self.recorder.close()
 		self.Destroy()
 
+	def stop_monitors(self):
+		"""
+		Stops every monitor. Leaving their programming mode session is queued on the serial
+		worker, so a job submitted afterwards, like closing or switching the port, only runs
+		once the device is out of it. Nothing here waits for the port.
+		"""
+		for index in range(self.page_controller.GetPageCount()):
+			page = self.page_controller.GetPage(index)
+			if hasattr(page, "stop_monitor"):
+				page.stop_monitor()
+
 	def setup_tabs(self):
 		tabs = [
 			("Estado del Dispositivo", DeviceStatusPanel),
@@ -108,10 +169,16 @@ class MainFrame(wx.Frame):
 			("Configuración de entrada Digital", DigitalInputPanel),
 			("Configuración de lectura Modbus", ModbusConfigPanel),
 			("Configuración de Mensaje", PayloadConfigPanel),
+			("Gráfica de pulsos", PulseChartPanel),
 		]
 		for tab_name, tab_class in tabs:
-			page = tab_class(self, self.serial_controller)
+			page = tab_class(self, self.serial_controller, self.serial_worker)
 			self.page_controller.AddPage(page, tab_name)
+			if isinstance(page, DeviceStatusPanel):
+				self.status_page = page
+			elif isinstance(page, PulseChartPanel):
+				# the chart plots what the status tab's monitor records
+				page.source = self.status_page
 
 	def setup_menu_bar(self):
 		menu_bar = wx.MenuBar()
@@ -121,18 +188,32 @@ class MainFrame(wx.Frame):
 		file_menu.Append(settings_item)
 		self.Bind(wx.EVT_MENU, self.on_ajustes, id=settings_item.GetId())
 
+		dashboard_item = wx.MenuItem(file_menu, wx.ID_ANY, "&Monitoreo de dispositivos...")
+		file_menu.Append(dashboard_item)
+		self.Bind(wx.EVT_MENU, self.on_fleet_dashboard, id=dashboard_item.GetId())
+
 		file_menu.AppendSeparator()
 
 		exit_item = wx.MenuItem(file_menu, wx.ID_EXIT, "&Exit\tAlt+F4")
 		file_menu.Append(exit_item)
 		self.Bind(wx.EVT_MENU, self.on_close, id=wx.ID_EXIT)
 
+		profile_menu = wx.Menu()
+		export_profile_item = wx.MenuItem(profile_menu, wx.ID_ANY, "&Exportar perfil...")
+		profile_menu.Append(export_profile_item)
+		self.Bind(wx.EVT_MENU, self.on_export_profile, id=export_profile_item.GetId())
+
+		apply_profile_item = wx.MenuItem(profile_menu, wx.ID_ANY, "&Aplicar perfil...")
+		profile_menu.Append(apply_profile_item)
+		self.Bind(wx.EVT_MENU, self.on_apply_profile, id=apply_profile_item.GetId())
+
 		help_menu = wx.Menu()
 		about_item = wx.MenuItem(help_menu, wx.ID_ANY, "&Acerca de")
 		help_menu.Append(about_item)
 		self.Bind(wx.EVT_MENU, self.on_about, id=about_item.GetId())
 
 		menu_bar.Append(file_menu, "&Archivo")
+		menu_bar.Append(profile_menu, "&Perfiles")
 		menu_bar.Append(help_menu, "&Ayuda")
 		self.SetMenuBar(menu_bar)
 
@@ -154,16 +235,162 @@ class MainFrame(wx.Frame):
 		self.Bind(wx.EVT_TOOL, self.on_display_config, id=display_config_id)
 		self.Bind(wx.EVT_TOOL, self.on_ajustes, id=ajustes_id)
 
+	def apply_recording_mode(self):
+		"""
+		Starts a new session log when the record_sessions setting asks for one, and closes
+		the current log when it changes. The serial exchanges are hooked on the worker
+		thread, which is the one that reads the listener lists.
+		"""
+		mode = recording_mode()
+		if mode == self.recording_mode:
+			return
+
+		recorder = self.recorder
+		if recorder is not None:
+			self.status_page.recorder = None
+			self.serial_worker.submit(lambda controller: (recorder.detach(controller), recorder.close()))
+			self.recorder = None
+
+		self.recording_mode = mode
+		if mode == RECORD_OFF:
+			return
+
+		path = session_path()
+		try:
+			self.recorder = SessionRecorder(path)
+		except OSError as e:
+			print(f"Could not start the session log {path}: {e}")
+			self.recording_mode = RECORD_OFF
+			return
+
+		print(f"Recording the session to {path}")
+		if mode in (RECORD_EXCHANGES, RECORD_BOTH):
+			self.serial_worker.submit(self.recorder.attach)
+		if mode in (RECORD_TELEMETRY, RECORD_BOTH):
+			self.status_page.recorder = self.recorder
+
 	def on_ajustes(self, event):
 		dialog = SettingsDialog(self, "Settings", self.serial_controller)
 		dialog.ShowModal()
 		dialog.Destroy()
 
+	def on_fleet_dashboard(self, event):
+		# not modal, so the main window can keep working with its own port meanwhile
+		if self.fleet_dashboard:
+			self.fleet_dashboard.Raise()
+			return
+
+		self.fleet_dashboard = FleetDashboardDialog(self, "Monitoreo de dispositivos", self.serial_controller)
+		self.fleet_dashboard.Show()
+
 	def on_display_config(self, event):
-		dialog = DisplayConfigDialog(self, "Configurar display", self.serial_controller)
+		dialog = DisplayConfigDialog(self, "Configurar display", self.serial_controller, self.serial_worker)
 		dialog.ShowModal()
 		dialog.Destroy()
 
+	def on_export_profile(self, event):
+		if not self.serial_controller.is_open():
+			wx.MessageBox("No se puede exportar el perfil, el puerto serial no está abierto", "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		with wx.FileDialog(
+				self,
+				"Exportar perfil",
+				wildcard=PROFILE_WILDCARD,
+				style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+		) as file_dialog:
+			if file_dialog.ShowModal() != wx.ID_OK:
+				return
+			path = file_dialog.GetPath()
+
+		self.serial_worker.submit(read_profile, lambda future: self.on_profile_read(future, path))
+
+	def on_profile_read(self, future, path):
+		if future.exception() is not None:
+			wx.MessageBox("No se pudo leer la configuración del dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		try:
+			save_profile(path, future.result())
+		except OSError as e:
+			wx.MessageBox(f"No se pudo guardar el perfil: {e}", "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		wx.MessageBox(f"Perfil guardado en {path}", "Perfil exportado", wx.OK | wx.ICON_INFORMATION)
+
+	def on_apply_profile(self, event):
+		if not self.serial_controller.is_open():
+			wx.MessageBox("No se puede aplicar el perfil, el puerto serial no está abierto", "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		with wx.FileDialog(
+				self,
+				"Aplicar perfil",
+				wildcard=PROFILE_WILDCARD,
+				style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
+		) as file_dialog:
+			if file_dialog.ShowModal() != wx.ID_OK:
+				return
+			path = file_dialog.GetPath()
+
+		try:
+			profile = load_profile(path)
+		except (OSError, ProfileError) as e:
+			wx.MessageBox(f"No se pudo cargar el perfil: {e}", "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		answer = wx.MessageBox(
+			f"Se sobrescribirá la configuración del dispositivo con el perfil "
+			f"'{profile.get('name') or path}'. ¿Desea continuar?",
+			"Aplicar perfil",
+			wx.YES_NO | wx.ICON_QUESTION,
+		)
+		if answer != wx.YES:
+			return
+
+		dlg = wx.ProgressDialog(
+			"Aplicando perfil",
+			"Por favor espere mientras se escribe la configuración",
+			maximum=max(1, len(build_commands(profile["config"]))),
+			parent=self,
+			style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
+		)
+
+		def on_progress(done, total):
+			self.serial_worker.post(dlg.Update, done, f"Escribiendo comando {done} de {total}...")
+
+		self.serial_worker.submit(
+			lambda controller: apply_profile(controller, profile, on_progress),
+			lambda future: self.on_profile_applied(future, dlg),
+		)
+
+	def on_profile_applied(self, future, dlg):
+		dlg.Destroy()
+		self.report_writes(future, "Perfil aplicado correctamente", "Aplicar perfil")
+
+	def report_writes(self, future, success_message, title):
+		"""
+		Shows how a job that returned send_journaled / send_commands failures went.
+		"""
+		if isinstance(future.exception(), PendingJournalError):
+			# nothing was written, the interrupted session has to be dealt with first
+			self.offer_resume(future.exception().journal)
+			return
+
+		failure = verification_message(future)
+		if failure is not None:
+			wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+		elif future.exception() is not None:
+			wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+		elif future.result():
+			failed = "\n".join(command for command, _ in future.result())
+			wx.MessageBox(f"El dispositivo rechazó los siguientes comandos:\n{failed}", "Error", wx.OK | wx.ICON_ERROR)
+		else:
+			wx.MessageBox(success_message, title, wx.OK | wx.ICON_INFORMATION)
+
+		# the writes dropped what they changed from the cache, this reads it back into the tabs
+		self.load_snapshot()
+
 	def on_about(self, event):
 		wx.MessageBox(
 			"ECM Config v1.1.2\n\n"
@@ -173,28 +400,39 @@ class MainFrame(wx.Frame):
 		)
 
 	def on_open_port(self, event):
-		if self.serial_controller.serial_created:
-			self.serial_controller.open()
-			print(f"Status of serial port {self.serial_controller.port} is "
-				  f"{'open' if self.serial_controller.is_open() else 'closed'}")
+		self.serial_worker.submit(self.open_port, self.on_port_opened)
+
+	def open_port(self, controller):
+		# runs on the serial worker, like every other use of the port
+		if controller.serial_created:
+			controller.open()
 		else:
-			try:
-				self.serial_controller.create_serial()
-				self.serial_controller.serial_created = True
-			except serial.SerialException:
-				wx.MessageBox("Puerto Serial no disponible, seleccione otro")
+			controller.create_serial()
+			controller.serial_created = True
+		print(f"Status of serial port {controller.port} is {'open' if controller.is_open() else 'closed'}")
+		return controller.is_open()
+
+	def on_port_opened(self, future):
+		if future.exception() is not None:
+			wx.MessageBox("Puerto Serial no disponible, seleccione otro")
+		elif future.result():
+			self.load_snapshot()
 
 		self.update_port_status()
 
 	def on_close_port(self, event):
-		if self.serial_controller.serial_created:
-			self.serial_controller.close()
-			print(f"Status of serial port {self.serial_controller.port} is "
-				  f"{'open' if self.serial_controller.is_open() else 'closed'}")
-		else:
+		self.stop_monitors()
+		if not self.serial_controller.serial_created:
 			wx.MessageBox("Puerto Serial no disponible, seleccione otro")
+			self.update_port_status()
+			return
 
-		self.update_port_status()
+		self.serial_worker.submit(self.close_port, lambda future: self.update_port_status())
+
+	def close_port(self, controller):
+		if controller.is_open():
+			controller.close()
+		print(f"Status of serial port {controller.port} is {'open' if controller.is_open() else 'closed'}")
 
 	def update_port_status(self):
 		"""
@@ -220,28 +458,108 @@ class MainFrame(wx.Frame):
 	def on_port_changed(self, event):
 		"""
 		Called when the SettingsDialog is closed and the user saved changes to
-		port or baud rate. We'll use the new port, re-open it immediately (if possible),
-		and refresh the toolbar text.
+		port or baud rate. The serial worker switches to the new port and re-opens it
+		immediately (if possible), then the toolbar text is refreshed.
 		"""
 		new_port = event.get_port()
+		self.stop_monitors()
+		self.apply_recording_mode()
 
 		# The user might also have changed baud rate, so re-check config:
 		new_baud_rate = get_from_config("baud_rate")
-		if new_baud_rate is not None:
-			self.serial_controller.update_baud_rate(int(new_baud_rate))
+		auto_baud_rate = new_baud_rate == AUTO_BAUD_RATE
+		if auto_baud_rate:
+			# start from the rate last detected on this port, detection confirms it below
+			baud_rate = cached_baud_rate(new_port) or self.serial_controller.baudrate
+		elif new_baud_rate is not None:
+			baud_rate = int(new_baud_rate)
+		else:
+			baud_rate = None
 
-		# Update the port in the controller
-		self.serial_controller.update_port(new_port)
+		# the switch is queued behind the jobs still using the old port
+		self.serial_worker.submit(
+			lambda controller: self.switch_port(controller, new_port, baud_rate),
+			lambda future: self.on_port_switched(future, auto_baud_rate),
+		)
 
-		# Attempt to open the port immediately with the new settings
-		if not self.serial_controller.is_open():
-			if not self.serial_controller.open():
-				wx.MessageBox("No se pudo abrir el puerto serial con la nueva configuración.")
-				self.serial_controller.serial_created = False
-		else:
-			# If it was already open with an old port, close and re-open
-			self.serial_controller.close()
-			self.serial_controller.open()
+	def switch_port(self, controller, port, baud_rate):
+		if baud_rate is not None:
+			controller.update_baud_rate(baud_rate)
+		if controller.is_open():
+			controller.close()
+
+		controller.update_port(port)
+		if not controller.open():
+			controller.serial_created = False
+		return controller.is_open()
+
+	def on_port_switched(self, future, auto_baud_rate):
+		if future.exception() is not None or not future.result():
+			wx.MessageBox("No se pudo abrir el puerto serial con la nueva configuración.")
 
 		# Now reflect the changes on the toolbar
 		self.update_port_status()
+
+		if self.serial_controller.is_open():
+			if auto_baud_rate:
+				self.detect_baud_rate()
+			self.load_snapshot()
+
+	def load_snapshot(self, refresh=False):
+		"""
+		Reads the whole device configuration in the background and fills every tab with it.
+		Jobs run in order, so a baud rate detection submitted before runs first.
+		"""
+		self.serial_worker.submit(lambda controller: read_snapshot(controller, refresh), self.on_snapshot_read)
+
+	def on_snapshot_read(self, future):
+		if future.exception() is not None:
+			# nothing was asked by the user, the tabs can still be read one by one
+			print(f"Could not read the device snapshot: {future.exception()}")
+			return
+
+		snapshot = future.result()
+		print(f"Device snapshot: {snapshot}")
+		for index in range(self.page_controller.GetPageCount()):
+			page = self.page_controller.GetPage(index)
+			if hasattr(page, "show_snapshot"):
+				page.show_snapshot(snapshot)
+
+		journal = WriteJournal.load(snapshot.device_id)
+		if journal is not None and journal.complete:
+			journal.discard()
+		elif journal is not None:
+			self.offer_resume(journal)
+
+	def offer_resume(self, journal):
+		"""
+		A write session on this device was cut off before every write was answered, the
+		user can finish it instead of starting over.
+		"""
+		remaining = journal.remaining()
+		answer = wx.MessageBox(
+			f"La última escritura en el dispositivo {journal.device_id} ({journal.label}) se interrumpió: "
+			f"{len(journal.answered)} de {len(journal.commands)} comandos recibieron respuesta.\n\n"
+			f"¿Reanudar enviando los {len(remaining)} comandos restantes?",
+			"Escritura interrumpida",
+			wx.YES_NO | wx.ICON_QUESTION,
+		)
+		if answer != wx.YES:
+			journal.discard()
+			return
+
+		def resume(controller):
+			with write_session(controller):
+				return send_journaled(controller, journal, remaining)
+
+		self.serial_worker.submit(
+			resume,
+			lambda future: self.report_writes(future, "Escritura completada", "Escritura interrumpida"),
+		)
+
+	def detect_baud_rate(self):
+		self.serial_worker.submit(lambda controller: controller.detect_baud_rate(), self.on_baud_rate_detected)
+
+	def on_baud_rate_detected(self, future):
+		if future.exception() is not None or future.result() is None:
+			wx.MessageBox("No se pudo detectar el baud rate del dispositivo", "Error", wx.OK | wx.ICON_ERROR)
@@ -1,11 +1,15 @@
 import wx
 
+from app.back_logic.protocol import ACINPUT, NOT_CONFIGURED, is_ok
+from app.back_logic.verification import verification_message, write_session
+
 
 class AcInputPanel(wx.ScrolledWindow):
-	def __init__(self, parent, serial_comms_controller):
+	def __init__(self, parent, serial_comms_controller, serial_worker):
 		super(AcInputPanel, self).__init__(parent)
 
 		self.serial_comms_controller = serial_comms_controller
+		self.serial_worker = serial_worker
 
 		self.ac_schedule_info = {
 			"start_schedule": {"value": "", "text_ctrl": None},
@@ -71,7 +75,6 @@ class AcInputPanel(wx.ScrolledWindow):
 
 	def on_read(self, event):
 		if self.serial_comms_controller.is_open():
-			self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)  # entering programming mode to start the device
 			dlg = wx.ProgressDialog(
 				"Leyendo parámetros",
 				"Por favor espere mientras se realiza la lectura",
@@ -79,23 +82,37 @@ class AcInputPanel(wx.ScrolledWindow):
 				parent=self,
 				style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
 			)
-			ac_input_schedule = self.serial_comms_controller.send_command("AT+ACINPUT?\r\n")
-			print(f"AC input schedule: {ac_input_schedule}")
-			dlg.Update(1, "Leyendo la configuración de entrada AC...")
-
-			dlg.Destroy()
-			self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)
 
-			ac_input_list = ac_input_schedule[:-2].split(",")
-			ac_on_schedule = f"{ac_input_list[0]}:{ac_input_list[1]}" if ac_input_list[0] != "99" else "No configurado"
-			ac_off_schedule = f"{ac_input_list[2]}:{ac_input_list[3]}" if ac_input_list[2] != "99" else "No configurado"
+			def read_ac_input(controller):
+				with controller.programming_mode():
+					ac_input_schedule = controller.cache.read(controller, [ACINPUT], refresh=True)[0]
+				self.serial_worker.post(dlg.Update, 1, "Leyendo la configuración de entrada AC...")
+				return ac_input_schedule
 
-			self.ac_schedule_info["start_schedule"]["text_ctrl"].SetValue(ac_on_schedule)
-			self.ac_schedule_info["end_schedule"]["text_ctrl"].SetValue(ac_off_schedule)
+			self.serial_worker.submit(read_ac_input, lambda future: self.on_ac_input_read(future, dlg))
 		else:
 			wx.MessageBox("No se puede leer la configuración de entrada AC, el puerto serial no está abierto",
 						  "Error", wx.OK | wx.ICON_ERROR)
 
+	def on_ac_input_read(self, future, dlg):
+		dlg.Destroy()
+		if future.exception() is None:
+			self.show_ac_input(future.result())
+		else:
+			wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+
+	def show_snapshot(self, snapshot):
+		self.show_ac_input(snapshot.ac_input)
+
+	def show_ac_input(self, ac_input_schedule):
+		print(f"AC input schedule: {ac_input_schedule}")
+
+		ac_on_schedule = f"{ac_input_schedule['start_hour']:02d}:{ac_input_schedule['start_minute']:02d}" if ac_input_schedule["start_hour"] != NOT_CONFIGURED else "No configurado"
+		ac_off_schedule = f"{ac_input_schedule['end_hour']:02d}:{ac_input_schedule['end_minute']:02d}" if ac_input_schedule["end_hour"] != NOT_CONFIGURED else "No configurado"
+
+		self.ac_schedule_info["start_schedule"]["text_ctrl"].SetValue(ac_on_schedule)
+		self.ac_schedule_info["end_schedule"]["text_ctrl"].SetValue(ac_off_schedule)
+
 	def create_title(self, title):
 		title_text = wx.StaticText(self, label=title)
 		title_text.SetFont(wx.Font(wx.FontInfo(12).Bold()))
@@ -200,7 +217,6 @@ class AcInputPanel(wx.ScrolledWindow):
 
 	def on_save(self, event):
 		if self.serial_comms_controller.is_open():
-			self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)  # entering programming mode to start the device
 			start_hour = str(self.current_start_hour).zfill(2)
 			start_minute = str(self.current_start_minute).zfill(2)
 			end_hour = str(self.current_end_hour).zfill(2)
@@ -217,25 +233,40 @@ class AcInputPanel(wx.ScrolledWindow):
 				style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
 			)
 
-			ac_config_msg = f"AT+ACINPUT={start_hour},{start_minute},{end_hour},{end_minute}\r\n"
+			ac_config_msg = ACINPUT.set({
+				"start_hour": start_hour,
+				"start_minute": start_minute,
+				"end_hour": end_hour,
+				"end_minute": end_minute,
+			})
 			print(f"Schedule config message: {ac_config_msg}")
-			response = self.serial_comms_controller.send_command(ac_config_msg)
-			dlg.Update(1, "Cargando configuración de entrada AC...")
-
-			dlg.Destroy()
-			self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)  # exiting programming mode to start the device
-
-			if response == "OK\r\n":
-				wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
-			else:
-				wx.MessageBox(
-					f"No se pudieron guardar los valores",
-					"Error",
-					wx.OK | wx.ICON_ERROR,
-				)
+
+			def write_ac_input(controller):
+				with write_session(controller):
+					response = controller.send_command(ac_config_msg)
+				self.serial_worker.post(dlg.Update, 1, "Cargando configuración de entrada AC...")
+				return response
+
+			self.serial_worker.submit(write_ac_input, lambda future: self.on_ac_input_saved(future, dlg))
 		else:
 			wx.MessageBox(
 				"No se puede guardar la configuración de entrada AC, el puerto serial está cerrado",
 				"Error",
 				wx.OK | wx.ICON_ERROR
 			)
+
+	def on_ac_input_saved(self, future, dlg):
+		dlg.Destroy()
+		failure = verification_message(future)
+		if failure is not None:
+			wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+			return
+
+		if future.exception() is None and is_ok(future.result()):
+			wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
+		else:
+			wx.MessageBox(
+				f"No se pudieron guardar los valores",
+				"Error",
+				wx.OK | wx.ICON_ERROR,
+			)
@@ -1,19 +1,49 @@
-import time
-
 import wx
 
+from app.back_logic.config_manager import save_to_config
+from app.back_logic.protocol import (
+	ACINPUT,
+	DEVID,
+	FPULSE,
+	IN3MODE,
+	NETWORK,
+	NETWORK_TYPES,
+	NOT_CONFIGURED,
+	OFFSET,
+	PULSECOUNT1,
+	PULSECOUNT2,
+	SCHEDULE,
+)
+from app.back_logic.pulse_monitor import (
+	MIN_SAMPLE_INTERVAL,
+	PULSE_INTERVAL_KEY,
+	RATE_WINDOW,
+	PulseMonitor,
+	configured_interval,
+)
+from app.back_logic.telemetry_store import TelemetryStore
+
+REFRESH_INTERVAL = 250  # ms between updates of the monitored values
+
 
 class DeviceStatusPanel(wx.ScrolledWindow):
-	def __init__(self, parent, controller):
+	def __init__(self, parent, controller, serial_worker):
 		super(DeviceStatusPanel, self).__init__(parent)
 
 		self.controller = controller
+		self.serial_worker = serial_worker
 
 		self.device_info = {
 			"network_type": {"value": "", "text_ctrl": None},
 			"device_id": {"value": "", "text_ctrl": None},
 			"pulse_count1": {"value": "", "text_ctrl": None},
 			"pulse_count2": {"value": "", "text_ctrl": None},
+			"pulse_rate1": {"value": "", "text_ctrl": None},
+			"pulse_rate2": {"value": "", "text_ctrl": None},
+			"average_rate1": {"value": "", "text_ctrl": None},
+			"average_rate2": {"value": "", "text_ctrl": None},
+			"energy1": {"value": "", "text_ctrl": None},
+			"energy2": {"value": "", "text_ctrl": None},
 			"dc_input_mode": {"value": "", "text_ctrl": None},
 			"on_schedule": {"value": "", "text_ctrl": None},
 			"off_schedule": {"value": "", "text_ctrl": None},
@@ -23,6 +53,12 @@ class DeviceStatusPanel(wx.ScrolledWindow):
 			"end_schedule": {"value": "", "text_ctrl": None},
 		}
 
+		self.monitor = None
+		self.telemetry = TelemetryStore()
+		self.recorder = None  # set by the main frame when telemetry is recorded
+		self.refresh_timer = wx.Timer(self)
+		self.Bind(wx.EVT_TIMER, self.on_refresh, self.refresh_timer)
+
 		self.init_ui()
 		self.SetScrollRate(5, 5)
 
@@ -56,6 +92,33 @@ class DeviceStatusPanel(wx.ScrolledWindow):
 				"title": "Cuentas de Pulsos Actuales",
 				"type": "multiple"
 			},
+			{
+				"rows": [
+					{
+						"type": "multi-item",
+						"items": [
+							{"label": "Pulsos/s 1", "key": "pulse_rate1", "type": "single"},
+							{"label": "Pulsos/s 2", "key": "pulse_rate2", "type": "single"},
+						],
+					},
+					{
+						"type": "multi-item",
+						"items": [
+							{"label": f"Promedio {RATE_WINDOW:.0f} s 1", "key": "average_rate1", "type": "single"},
+							{"label": f"Promedio {RATE_WINDOW:.0f} s 2", "key": "average_rate2", "type": "single"},
+						],
+					},
+					{
+						"type": "multi-item",
+						"items": [
+							{"label": "Lectura 1", "key": "energy1", "type": "single"},
+							{"label": "Lectura 2", "key": "energy2", "type": "single"},
+						],
+					},
+				],
+				"title": "Monitoreo de Pulsos",
+				"type": "multiple"
+			},
 			{
 				"rows": [
 					{
@@ -111,6 +174,19 @@ class DeviceStatusPanel(wx.ScrolledWindow):
 		for row in rows:
 			sizer.Add(self.create_card(row['title'], row["rows"]))
 
+		monitor_sizer = wx.BoxSizer(wx.HORIZONTAL)
+		monitor_sizer.Add(wx.StaticText(self, label="Intervalo de muestreo (s)"), flag=wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border=5)
+		self.interval_ctrl = wx.SpinCtrlDouble(
+			self, min=MIN_SAMPLE_INTERVAL, max=60, inc=0.1, initial=configured_interval(), size=(80, -1)
+		)
+		self.interval_ctrl.SetDigits(1)
+		monitor_sizer.Add(self.interval_ctrl, flag=wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border=10)
+		self.monitor_button = wx.Button(self, label="Iniciar monitoreo")
+		self.monitor_button.Bind(wx.EVT_BUTTON, self.on_toggle_monitor)
+		monitor_sizer.Add(self.monitor_button, flag=wx.ALIGN_CENTER_VERTICAL)
+
+		sizer.Add(monitor_sizer, flag=wx.LEFT | wx.TOP, border=20)
+
 		button = wx.Button(self, label="Leer valores")
 		button.Bind(wx.EVT_BUTTON, self.on_read)
 
@@ -120,95 +196,150 @@ class DeviceStatusPanel(wx.ScrolledWindow):
 
 	def on_read(self, event):
 		if self.controller.is_open():
-			self.controller.send_command("AT+PROGMODE=1\r\n", False)  # entering programming mode to stop the device
-			time.sleep(1)
-			self.controller.flush_buffer()
-			# from sending data via Modbus
 			dlg = wx.ProgressDialog(
 				"Leyendo parámetros",
 				"Por favor espere mientras se realiza la lectura",
-				maximum=6,
+				maximum=1,
 				parent=self,
 				style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
 			)
-			network_type = self.controller.send_command("AT+NETWORK?\r\n")
-			print(f"Raw network type value: {network_type}")
-			network_type = network_type.split("\r\n")[0].split(": ")[1]
-			print(f"Raw network type value: {network_type}")
-			match network_type:
-				case "0":
-					network_type = "Sigfox"
-				case "1":
-					network_type = "LoRaWAN"
-				case "2":
-					network_type = "Celular"
-				case _:
-					network_type = "Desconocido"
-			print(f"Network type: {network_type}")
-			dlg.Update(0, "Leyendo la configuración de red...")
-
-			device_id = self.controller.send_command("AT+DEVID?\r\n")
-			device_id = device_id.split("\r\n")[0].split(": ")[1].lstrip('0')  # Remove any leading 0 characters
-			print(f"Device ID: {device_id}")
-			dlg.Update(1, "Leyendo el ID del dispositivo...")
-
-			pulse_count_hex_str = self.controller.send_command("AT+PULSECOUNT1?\r\n")
-			print(f"Current pulse count: {pulse_count_hex_str}")
-			pulse_count_hex_str = pulse_count_hex_str.split("\r\n")[0]
-			pulse_count1 = int(pulse_count_hex_str, 16)
-			print(f"Integer pulse count: {pulse_count1}")
-			dlg.Update(2, "Leyendo la cuenta de pulsos 1...")
-
-			pulse_count_hex_str = self.controller.send_command("AT+PULSECOUNT2?\r\n")
-			print(f"Current pulse count: {pulse_count_hex_str}")
-			pulse_count_hex_str = pulse_count_hex_str.split("\r\n")[0]
-			pulse_count2 = int(pulse_count_hex_str, 16)
-			print(f"Integer pulse count: {pulse_count2}")
-			dlg.Update(3, "Leyendo la cuenta de pulsos 2...")
-
-			schedule_config = self.controller.send_command("AT+SCHEDULE?\r\n")
-			schedule_config = schedule_config.split("\r\n")[0]
-			print(f"Schedule config: {schedule_config}")
-			dlg.Update(4, "Leyendo el control por horario...")
-
-			ac_input_schedule = self.controller.send_command("AT+ACINPUT?\r\n")
-			ac_input_schedule = ac_input_schedule.split("\r\n")[0]
-			print(f"AC input schedule: {ac_input_schedule}")
-			dlg.Update(5, "Leyendo la configuración de entrada AC...")
-
-			dc_input = self.controller.send_command("AT+IN3MODE?\r\n")
-			dc_input = dc_input.split("\r\n")[0]
-			print(f"DC input: {dc_input}")
-			dlg.Update(6, "Leyendo la configuración de entrada digital...")
-
-			dlg.Destroy()
-
-			self.controller.send_command("AT+PROGMODE=0\r\n", False)  # exiting programming mode to start the device
-
-			schedule_config_list = schedule_config[:-2].split(",")
-			schedule_on = f"{schedule_config_list[0]}:{schedule_config_list[1]}" if schedule_config_list[0] != "99" else "No configurado"
-			schedule_off = f"{schedule_config_list[3]}:{schedule_config_list[4]}" if schedule_config_list[3] != "99" else "No configurado"
-			contactor_on = ("Cerrado" if schedule_config_list[2] == "1" else "Abierto") if schedule_on != "No configurado" else "No configurado"
-			contactor_off = ("Abierto" if schedule_config_list[2] == "1" else "Cerrado") if schedule_off != "No configurado" else "No configurado"
-
-			ac_input_list = ac_input_schedule[:-2].split(",")
-			ac_on_schedule = f"{ac_input_list[0]}:{ac_input_list[1]}" if ac_input_list[0] != "99" else "No configurado"
-			ac_off_schedule = f"{ac_input_list[2]}:{ac_input_list[3]}" if ac_input_list[2] != "99" else "No configurado"
-
-			self.device_info["network_type"]["text_ctrl"].SetValue(network_type)
-			self.device_info["device_id"]["text_ctrl"].SetValue(device_id)
-			self.device_info["pulse_count1"]["text_ctrl"].SetValue(str(pulse_count1))
-			self.device_info["pulse_count2"]["text_ctrl"].SetValue(str(pulse_count2))
-			self.device_info["on_schedule"]["text_ctrl"].SetValue(schedule_on)
-			self.device_info["off_schedule"]["text_ctrl"].SetValue(schedule_off)
-			self.device_info["on_contactor_state"]["text_ctrl"].SetValue(contactor_on)
-			self.device_info["off_contactor_state"]["text_ctrl"].SetValue(contactor_off)
-			self.device_info["start_schedule"]["text_ctrl"].SetValue(ac_on_schedule)
-			self.device_info["end_schedule"]["text_ctrl"].SetValue(ac_off_schedule)
-			self.device_info["dc_input_mode"]["text_ctrl"].SetValue("Solo alerta" if "OPENING_DETECTION" in dc_input else "Conmutación de relé")
+			dlg.Update(0, "Leyendo la configuración del dispositivo...")
+			self.serial_worker.submit(self.read_device_status, lambda future: self.on_device_status_read(future, dlg))
 		else:
 			wx.MessageBox("No se pudo comunicar con el dispositivo")
 
+	def on_toggle_monitor(self, event):
+		if self.monitor is not None:
+			self.stop_monitor()
+		elif self.controller.is_open():
+			self.start_monitor()
+		else:
+			wx.MessageBox("No se pudo comunicar con el dispositivo")
+
+	def start_monitor(self):
+		interval = self.interval_ctrl.GetValue()
+		save_to_config(PULSE_INTERVAL_KEY, interval)
+
+		# the whole capture is kept for the derived metrics, the monitor's ring only holds the recent samples
+		self.telemetry = TelemetryStore()
+		display_config = self.controller.cache.peek([OFFSET, FPULSE])
+		if display_config is not None:
+			self.telemetry.set_display_config(*display_config)
+
+		self.monitor = PulseMonitor(self.serial_worker, interval, on_sample=self.on_sample)
+		self.monitor.start()
+		self.refresh_timer.Start(REFRESH_INTERVAL)
+		self.interval_ctrl.Disable()
+		self.monitor_button.SetLabel("Detener monitoreo")
+
+	def stop_monitor(self):
+		"""
+		Also called when the port changes or the app closes, so polling never outlives the port.
+		Returns the future of the device leaving programming mode, None if nothing was running.
+		"""
+		if self.monitor is None:
+			return None
+
+		self.refresh_timer.Stop()
+		left = self.monitor.stop()
+		print(f"Pulse monitor stopped: {len(self.monitor.ring)} samples, "
+			  f"{self.monitor.skipped} skipped ticks, {self.monitor.errors} errors")
+		self.monitor = None
+		self.interval_ctrl.Enable()
+		self.monitor_button.SetLabel("Iniciar monitoreo")
+		return left
+
+	def on_sample(self, timestamp, count1, count2):
+		# runs on the serial worker thread
+		self.telemetry.record_pulses(timestamp, count1, count2)
+		recorder = self.recorder
+		if recorder is not None:
+			recorder.record_pulses(timestamp, count1, count2)
+
+	def on_refresh(self, event):
+		latest = self.monitor.ring.latest()
+		if latest is None:
+			return
+
+		_, counts = latest
+		self.device_info["pulse_count1"]["text_ctrl"].SetValue(str(counts[0]))
+		self.device_info["pulse_count2"]["text_ctrl"].SetValue(str(counts[1]))
+
+		rates = self.monitor.ring.rates()
+		if rates is not None:
+			instant, windowed = rates
+			self.device_info["pulse_rate1"]["text_ctrl"].SetValue(f"{instant[0]:.2f}")
+			self.device_info["pulse_rate2"]["text_ctrl"].SetValue(f"{instant[1]:.2f}")
+			self.device_info["average_rate1"]["text_ctrl"].SetValue(f"{windowed[0]:.2f}")
+			self.device_info["average_rate2"]["text_ctrl"].SetValue(f"{windowed[1]:.2f}")
+
+		readings = self.telemetry.energy_totals()
+		if readings is not None:
+			self.device_info["energy1"]["text_ctrl"].SetValue(f"{readings[0]:g}")
+			self.device_info["energy2"]["text_ctrl"].SetValue(f"{readings[1]:g}")
+
+	def read_device_status(self, controller):
+		# programming mode stops the device from sending data via Modbus
+		with controller.programming_mode():
+			# every query answers with a single value line, so all of them go out in one burst
+			return controller.cache.read(
+				controller,
+				[NETWORK, DEVID, PULSECOUNT1, PULSECOUNT2, SCHEDULE, ACINPUT, IN3MODE],
+				refresh=True,
+			)
+
+	def on_device_status_read(self, future, dlg):
+		dlg.Update(1, "Lectura completada")
+		dlg.Destroy()
+
+		if future.exception() is None:
+			self.show_device_status(*future.result())
+		else:
+			wx.MessageBox("No se pudo comunicar con el dispositivo")
+
+	def show_snapshot(self, snapshot):
+		self.show_device_status(
+			snapshot.network_type,
+			snapshot.device_id,
+			snapshot.pulse_count1,
+			snapshot.pulse_count2,
+			snapshot.schedule,
+			snapshot.ac_input,
+			snapshot.in3_mode,
+		)
+
+	def show_device_status(self, network_type, device_id, pulse_count1, pulse_count2, schedule, ac_input, dc_input):
+		network_type = NETWORK_TYPES.get(network_type, "Desconocido")
+		print(f"Network type: {network_type}")
+
+		device_id = device_id.lstrip('0')  # Remove any leading 0 characters
+		print(f"Device ID: {device_id}")
+
+		print(f"Integer pulse counts: {pulse_count1}, {pulse_count2}")
+		print(f"Schedule config: {schedule}")
+		print(f"AC input schedule: {ac_input}")
+		print(f"DC input: {dc_input}")
+
+		schedule_on = f"{schedule['on_hour']:02d}:{schedule['on_minute']:02d}" if schedule["on_hour"] != NOT_CONFIGURED else "No configurado"
+		schedule_off = f"{schedule['off_hour']:02d}:{schedule['off_minute']:02d}" if schedule["off_hour"] != NOT_CONFIGURED else "No configurado"
+		contactor_on = ("Cerrado" if schedule["on_relay"] == 1 else "Abierto") if schedule_on != "No configurado" else "No configurado"
+		contactor_off = ("Abierto" if schedule["on_relay"] == 1 else "Cerrado") if schedule_off != "No configurado" else "No configurado"
+
+		ac_on_schedule = f"{ac_input['start_hour']:02d}:{ac_input['start_minute']:02d}" if ac_input["start_hour"] != NOT_CONFIGURED else "No configurado"
+		ac_off_schedule = f"{ac_input['end_hour']:02d}:{ac_input['end_minute']:02d}" if ac_input["end_hour"] != NOT_CONFIGURED else "No configurado"
+
+		self.device_info["network_type"]["text_ctrl"].SetValue(network_type)
+		self.device_info["device_id"]["text_ctrl"].SetValue(device_id)
+		self.device_info["pulse_count1"]["text_ctrl"].SetValue(str(pulse_count1))
+		self.device_info["pulse_count2"]["text_ctrl"].SetValue(str(pulse_count2))
+		self.device_info["on_schedule"]["text_ctrl"].SetValue(schedule_on)
+		self.device_info["off_schedule"]["text_ctrl"].SetValue(schedule_off)
+		self.device_info["on_contactor_state"]["text_ctrl"].SetValue(contactor_on)
+		self.device_info["off_contactor_state"]["text_ctrl"].SetValue(contactor_off)
+		self.device_info["start_schedule"]["text_ctrl"].SetValue(ac_on_schedule)
+		self.device_info["end_schedule"]["text_ctrl"].SetValue(ac_off_schedule)
+		self.device_info["dc_input_mode"]["text_ctrl"].SetValue("Solo alerta" if dc_input == 1 else "Conmutación de relé")
+
 	def create_card(self, title, rows):
 		box = wx.StaticBox(self, label=title, size=(300, -1))  # Set a fixed width for the box
 		font = wx.Font(11, wx.DEFAULT, wx.NORMAL, wx.BOLD)
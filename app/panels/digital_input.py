@@ -1,11 +1,15 @@
 import wx
 
+from app.back_logic.protocol import IN3MODE, is_ok
+from app.back_logic.verification import verification_message, write_session
+
 
 class DigitalInputPanel(wx.ScrolledWindow):
-    def __init__(self, parent, serial_comms_controller):
+    def __init__(self, parent, serial_comms_controller, serial_worker):
         super(DigitalInputPanel, self).__init__(parent)
 
         self.serial_comms_controller = serial_comms_controller
+        self.serial_worker = serial_worker
 
         self.dc_input_info = {
             "dc_input_mode": {"value": "", "text_ctrl": None},
@@ -62,7 +66,6 @@ class DigitalInputPanel(wx.ScrolledWindow):
 
     def on_read(self, event):
         if self.serial_comms_controller.is_open():
-            self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)
             dlg = wx.ProgressDialog(
                 "Leyendo parámetros",
                 "Por favor espere mientras se realiza la lectura",
@@ -71,16 +74,13 @@ class DigitalInputPanel(wx.ScrolledWindow):
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
 
-            dc_input = self.serial_comms_controller.send_command("AT+IN3MODE?\r\n")
-            print(f"DC input: {dc_input}")
-            dlg.Update(1, "Leyendo la configuración de entrada digital...")
-
-            dlg.Destroy()
-            self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)
-
-            dc_input_text = "Solo alerta" if "OPENING_DETECTION" in dc_input else "Conmutación de relé"
+            def read_dc_input(controller):
+                with controller.programming_mode():
+                    dc_input = controller.cache.read(controller, [IN3MODE], refresh=True)[0]
+                self.serial_worker.post(dlg.Update, 1, "Leyendo la configuración de entrada digital...")
+                return dc_input
 
-            self.dc_input_info["dc_input_mode"]["text_ctrl"].SetValue(dc_input_text)
+            self.serial_worker.submit(read_dc_input, lambda future: self.on_dc_input_read(future, dlg))
         else:
             wx.MessageBox(
                 "No se puede leer la configuración de entrada Digital, el puerto serial no está abierto",
@@ -88,6 +88,23 @@ class DigitalInputPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR,
             )
 
+    def on_dc_input_read(self, future, dlg):
+        dlg.Destroy()
+        if future.exception() is None:
+            self.show_dc_input(future.result())
+        else:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+
+    def show_snapshot(self, snapshot):
+        self.show_dc_input(snapshot.in3_mode)
+
+    def show_dc_input(self, dc_input):
+        print(f"DC input: {dc_input}")
+
+        dc_input_text = "Solo alerta" if dc_input == 1 else "Conmutación de relé"
+
+        self.dc_input_info["dc_input_mode"]["text_ctrl"].SetValue(dc_input_text)
+
     def create_title(self, title):
         title_text = wx.StaticText(self, label=title)
         title_text.SetFont(wx.Font(wx.FontInfo(12).Bold()))
@@ -169,7 +186,6 @@ class DigitalInputPanel(wx.ScrolledWindow):
 
     def on_save(self, event):
         if self.serial_comms_controller.is_open():
-            self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)
             digital_input_mode = (
                 1 if self.current_digital_input_mode == "Solo alerta" else 0
             )
@@ -185,26 +201,16 @@ class DigitalInputPanel(wx.ScrolledWindow):
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
 
-            dc_config_msg = f"AT+CONFIG={'16' if digital_input_mode == 1 else '00'},00\r\n"
+            dc_config_msg = IN3MODE.set(digital_input_mode)
             print(f"DC config msg: {dc_config_msg}")
-            response = self.serial_comms_controller.send_command(dc_config_msg)
-            dlg.Update(1, "Cargando el control por horario...")
-
-            dlg.Destroy()
-            self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)
-
-            if response == "OK\r\n":
-                wx.MessageBox(
-                    f"Valores guardados correctamente!",
-                    "Info",
-                    wx.OK | wx.ICON_INFORMATION,
-                )
-            else:
-                wx.MessageBox(
-                    f"No se pudieron guardar los valores",
-                    "Error",
-                    wx.OK | wx.ICON_ERROR,
-                )
+
+            def write_dc_input(controller):
+                with write_session(controller):
+                    response = controller.send_command(dc_config_msg)
+                self.serial_worker.post(dlg.Update, 1, "Cargando el control por horario...")
+                return response
+
+            self.serial_worker.submit(write_dc_input, lambda future: self.on_dc_input_saved(future, dlg))
         else:
             wx.MessageBox(
                 "No se puede guardar la configuración de entrada digital, el puerto serial está cerrado",
@@ -212,6 +218,26 @@ class DigitalInputPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR
             )
 
+    def on_dc_input_saved(self, future, dlg):
+        dlg.Destroy()
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        if future.exception() is None and is_ok(future.result()):
+            wx.MessageBox(
+                f"Valores guardados correctamente!",
+                "Info",
+                wx.OK | wx.ICON_INFORMATION,
+            )
+        else:
+            wx.MessageBox(
+                f"No se pudieron guardar los valores",
+                "Error",
+                wx.OK | wx.ICON_ERROR,
+            )
+
     def get_status_text(self):
         return (
             f"Solo envio Alertas"
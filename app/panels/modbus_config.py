@@ -1,11 +1,16 @@
-import time
 import wx
 
+from app.back_logic.protocol import MBADDR, MBREGCFG, encode_register, is_ok
+from app.back_logic.register_transfer import read_registers, registers_journal, write_registers
+from app.back_logic.verification import verification_message, write_session
+from app.back_logic.write_journal import PendingJournalError
+
 
 class ModbusConfigPanel(wx.ScrolledWindow):
-    def __init__(self, parent, modbus_controller):
+    def __init__(self, parent, modbus_controller, serial_worker):
         super().__init__(parent)
         self.controller = modbus_controller
+        self.serial_worker = serial_worker
 
         # We'll store an address for the slave, e.g., "1"
         self.slave_address_value = ""
@@ -13,6 +18,9 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         # We'll store the list of rows for the modbus registers
         self.modbus_info = []
 
+        # CSV row per register position as the device has it, so on_save only sends what changed
+        self.device_rows = {}
+
         self.data_type_choices = [
             "char", "int", "float",
             "unsigned char", "unsigned int",
@@ -107,6 +115,15 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         regs_update_button.Bind(wx.EVT_BUTTON, self.on_save)
         regs_button_sizer.Add(regs_update_button, flag=wx.ALIGN_CENTER | wx.ALL, border=5)
 
+        # Tab switches render from the device cache, this forces a fresh read
+        regs_refresh_button = wx.Button(self, label="Refrescar")
+        regs_refresh_button.Bind(wx.EVT_BUTTON, lambda event: self.on_enter(refresh=True))
+        regs_button_sizer.Add(regs_refresh_button, flag=wx.ALIGN_CENTER | wx.ALL, border=5)
+
+        # Shows progress while the rows are still arriving, the table stays usable
+        self.read_status = wx.StaticText(self, label="")
+        regs_button_sizer.Add(self.read_status, flag=wx.ALIGN_CENTER_VERTICAL | wx.ALL, border=5)
+
         regs_box_sizer.Add(regs_button_sizer, flag=wx.ALIGN_RIGHT | wx.ALL, border=5)
 
         # Add the “Card #2” box to the main_sizer
@@ -145,9 +162,6 @@ class ModbusConfigPanel(wx.ScrolledWindow):
 
         # Optionally send to device, e.g.:
         if self.controller.is_open():
-            self.controller.send_command("AT+PROGMODE=1\r\n", False)
-            time.sleep(0.5)
-            self.controller.flush_buffer()
             dlg = wx.ProgressDialog(
                 "Actualizando dirección del esclavo Modbus",
                 "Por favor espere mientras se actualiza el equipo",
@@ -155,17 +169,14 @@ class ModbusConfigPanel(wx.ScrolledWindow):
                 parent=self,
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
-            cmd = f"AT+MBADDR={new_addr_str}\r\n"
+            cmd = MBADDR.set(new_addr_str)
             dlg.Update(0, "Escribiendo nueva dirección")
-            response = self.controller.send_command(cmd)
-            self.controller.send_command("AT+PROGMODE=0\r\n", False)
-            dlg.Destroy()
-            if response.strip() == "OK":
-                wx.MessageBox("Dirección de slave actualizada correctamente.", "Info", wx.OK | wx.ICON_INFORMATION)
-            else:
-                wx.MessageBox(f"Error actualizando dirección de slave.\nRespuesta: {response}",
-                              "Error",
-                              wx.OK | wx.ICON_ERROR)
+
+            def write_slave_address(controller):
+                with write_session(controller):
+                    return controller.send_command(cmd)
+
+            self.serial_worker.submit(write_slave_address, lambda future: self.on_slave_address_saved(future, dlg))
         else:
             wx.MessageBox(
                 "No se puede actualizar la dirección de slave.\nEl puerto serial no está abierto.",
@@ -173,6 +184,21 @@ class ModbusConfigPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR
             )
 
+    def on_slave_address_saved(self, future, dlg):
+        dlg.Destroy()
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        response = future.result() if future.exception() is None else ""
+        if is_ok(response):
+            wx.MessageBox("Dirección de slave actualizada correctamente.", "Info", wx.OK | wx.ICON_INFORMATION)
+        else:
+            wx.MessageBox(f"Error actualizando dirección de slave.\nRespuesta: {response}",
+                          "Error",
+                          wx.OK | wx.ICON_ERROR)
+
     # ====================
     #  CARD #2 METHODS
     # ====================
@@ -183,77 +209,115 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         showing the register address in hex form (e.g. 0x64).
         """
         for register in self.modbus_info:
-            # 1) Position
-            position_text = wx.StaticText(self, label=str(register["register_position"]))
-            self.table_sizer.Add(position_text, flag=wx.EXPAND | wx.ALL, border=2)
-
-            # 2) Enable Flag
-            enable_checkbox = wx.CheckBox(self)
-            enable_checkbox.SetValue(bool(register["enable_flag"]))
-            enable_checkbox.Bind(
-                wx.EVT_CHECKBOX,
-                lambda evt, c=enable_checkbox: self.on_enable_flag_change(evt, c)
-            )
-            self.table_sizer.Add(enable_checkbox, flag=wx.EXPAND | wx.ALL, border=2)
+            self.add_data_row(register)
+
+        self.Layout()
 
-            # 3) Modbus Address (shown as hex)
+    def add_data_row(self, register):
+        # 1) Position
+        position_text = wx.StaticText(self, label=str(register["register_position"]))
+        self.table_sizer.Add(position_text, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 2) Enable Flag
+        enable_checkbox = wx.CheckBox(self)
+        enable_checkbox.Bind(
+            wx.EVT_CHECKBOX,
+            lambda evt, c=enable_checkbox: self.on_enable_flag_change(evt, c)
+        )
+        self.table_sizer.Add(enable_checkbox, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 3) Modbus Address (shown as hex)
+        modbus_address_ctrl = wx.TextCtrl(self)
+        self.table_sizer.Add(modbus_address_ctrl, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 4) Data type
+        data_type = wx.ComboBox(self, choices=self.data_type_choices, style=wx.CB_READONLY)
+        self.table_sizer.Add(data_type, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 5) Num bytes
+        num_bytes = wx.TextCtrl(self)
+        self.table_sizer.Add(num_bytes, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 6) Sampling frequency
+        sampling_frequency = wx.TextCtrl(self)
+        self.table_sizer.Add(sampling_frequency, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 7) Decimal positions
+        decimal_positions = wx.TextCtrl(self)
+        self.table_sizer.Add(decimal_positions, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # 8) Cumulative flag
+        cumulative_flag = wx.ComboBox(self, choices=self.cumulative_choices, style=wx.CB_READONLY)
+        self.table_sizer.Add(cumulative_flag, flag=wx.EXPAND | wx.ALL, border=2)
+
+        # Store references
+        controls_for_this_row = {
+            "position_text": position_text,
+            "enable_checkbox": enable_checkbox,
+            "modbus_address": modbus_address_ctrl,  # now has hex
+            "data_type": data_type,
+            "num_bytes": num_bytes,
+            "sampling_frequency": sampling_frequency,
+            "decimal_positions": decimal_positions,
+            "cumulative_flag": cumulative_flag
+        }
+        self.row_controls.append(controls_for_this_row)
+
+        self.set_row_values(controls_for_this_row, register)
+
+    def normalized_register(self, register):
+        """
+        The register as its row shows it: data types and cumulative flags outside the
+        choices are shown as the nearest one, and read back from the row that way.
+        """
+        register = dict(register)
+        register["data_type"] = max(1, min(int(register["data_type"]), len(self.data_type_choices)))
+        register["cumulative_flag"] = max(0, min(int(register["cumulative_flag"]), len(self.cumulative_choices) - 1))
+        return register
+
+    def set_row_values(self, controls, register):
+        """
+        Writes one register into the widgets of an existing row.
+        """
+        register = self.normalized_register(register)
+        controls["enable_checkbox"].SetValue(bool(register["enable_flag"]))
+
+        addr_dec = 0
+        try:
+            # If your data is stored as a string with decimal:
+            addr_dec = int(register["modbus_register_address"])
+        except ValueError:
             addr_dec = 0
-            try:
-                # If your data is stored as a string with decimal:
-                addr_dec = int(register["modbus_register_address"])
-            except ValueError:
-                addr_dec = 0
-            addr_hex_str = f"0x{addr_dec:X}"  # e.g. 0x64 if decimal is 100
-
-            modbus_address_ctrl = wx.TextCtrl(self, value=addr_hex_str)
-            self.table_sizer.Add(modbus_address_ctrl, flag=wx.EXPAND | wx.ALL, border=2)
-
-            # 4) Data type
-            data_type = wx.ComboBox(self, choices=self.data_type_choices, style=wx.CB_READONLY)
-            data_type_idx = max(
-                0,
-                min(register["data_type"] - 1, len(self.data_type_choices) - 1)
-            )
-            data_type.SetSelection(data_type_idx)
-            self.table_sizer.Add(data_type, flag=wx.EXPAND | wx.ALL, border=2)
+        controls["modbus_address"].SetValue(f"0x{addr_dec:X}")  # e.g. 0x64 if decimal is 100
 
-            # 5) Num bytes
-            num_bytes = wx.TextCtrl(self, value=str(register["num_bytes"]))
-            self.table_sizer.Add(num_bytes, flag=wx.EXPAND | wx.ALL, border=2)
+        controls["data_type"].SetSelection(register["data_type"] - 1)
 
-            # 6) Sampling frequency
-            sampling_frequency = wx.TextCtrl(self, value=str(register["sampling_frequency"]))
-            self.table_sizer.Add(sampling_frequency, flag=wx.EXPAND | wx.ALL, border=2)
+        controls["num_bytes"].SetValue(str(register["num_bytes"]))
+        controls["sampling_frequency"].SetValue(str(register["sampling_frequency"]))
+        controls["decimal_positions"].SetValue(str(register["decimal_positions"]))
 
-            # 7) Decimal positions
-            decimal_positions = wx.TextCtrl(self, value=str(register["decimal_positions"]))
-            self.table_sizer.Add(decimal_positions, flag=wx.EXPAND | wx.ALL, border=2)
+        controls["cumulative_flag"].SetSelection(register["cumulative_flag"])
 
-            # 8) Cumulative flag
-            cumu_choice_idx = max(
-                0,
-                min(register["cumulative_flag"], len(self.cumulative_choices) - 1)
-            )
-            cumulative_flag = wx.ComboBox(self, choices=self.cumulative_choices, style=wx.CB_READONLY)
-            cumulative_flag.SetSelection(cumu_choice_idx)
-            self.table_sizer.Add(cumulative_flag, flag=wx.EXPAND | wx.ALL, border=2)
-
-            # Store references
-            controls_for_this_row = {
-                "position_text": position_text,
-                "enable_checkbox": enable_checkbox,
-                "modbus_address": modbus_address_ctrl,  # now has hex
-                "data_type": data_type,
-                "num_bytes": num_bytes,
-                "sampling_frequency": sampling_frequency,
-                "decimal_positions": decimal_positions,
-                "cumulative_flag": cumulative_flag
-            }
-            self.row_controls.append(controls_for_this_row)
-
-            # enable/disable
-            self.update_controls_state(controls_for_this_row, bool(register["enable_flag"]))
+        # enable/disable
+        self.update_controls_state(controls, bool(register["enable_flag"]))
 
+    def show_register(self, register):
+        """
+        Shows one register read from the device, updating its row in place when the
+        table already has it instead of rebuilding the table.
+        """
+        position = register["register_position"]
+        self.modbus_info = [item for item in self.modbus_info if item["register_position"] != position]
+        self.modbus_info.append(dict(register))
+        # compared with what on_save reads back from the row, so clamped values are no change
+        self.device_rows[position] = encode_register(self.normalized_register(register))
+
+        for controls in self.row_controls:
+            if int(controls["position_text"].GetLabel()) == position:
+                self.set_row_values(controls, register)
+                return
+
+        self.add_data_row(register)
         self.Layout()
 
     def clear_data_rows(self):
@@ -268,60 +332,41 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         self.row_controls.clear()
         self.Layout()
 
-    def on_enter(self):
+    def on_enter(self, refresh=False):
         """
         Called when this panel becomes the selected tab in the notebook.
-        Re-read modbus_info and show them in hex form in the address field.
+        Shows modbus_info from the device cache when it is there, otherwise
+        (or with `refresh`) reads it from the device, filling in each row as
+        soon as it arrives. Addresses are shown in hex form.
         """
         print("Inside the modbus config panel")
-        self.modbus_info = []
 
         if self.controller.is_open():
-            self.controller.send_command("AT+PROGMODE=1\r\n", False)
-            time.sleep(0.5)
-            self.controller.flush_buffer()
-            dlg = wx.ProgressDialog(
-                "Leyendo parámetros",
-                "Por favor espere mientras se realiza la lectura",
-                maximum=2,
-                parent=self,
-                style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
-            )
-            time.sleep(0.5)  # optional delay
-            self.controller.flush_buffer()
-
-            modbus_slave_addr = self.controller.send_command("AT+MBADDR?\r\n")
-            dlg.Update(1, "Leyendo la dirección del Esclavo Modbus...")
-            print(f"Received Modbus Slave Address: {modbus_slave_addr}")
-            self.slave_address_ctrl.SetValue(modbus_slave_addr.split("\r\n")[0])
-
-            modbus_reg_data = self.controller.send_command("AT+MBREGCFG?\r\n")
-            print(f"Received Modbus Reg Data: {modbus_reg_data}")
-            dlg.Update(2, "Leyendo la configuración Registros Modbus...")
-            modbus_reg_data_array = modbus_reg_data.split("\r\n")
-            print(f"Modbus Reg Data: {modbus_reg_data_array}")
-
-            for item in modbus_reg_data_array:
-                if item:
-                    parts = item.split(",")
-                    self.modbus_info.append({
-                        "register_position": int(parts[0]),
-                        "enable_flag": int(parts[1]),
-                        "modbus_register_address": parts[2],  # decimal (string), we'll show as hex
-                        "data_type": int(parts[3]),
-                        "num_bytes": parts[4],
-                        "sampling_frequency": parts[5],
-                        "decimal_positions": parts[6],
-                        "cumulative_flag": int(parts[7]),
-                    })
+            cached = None if refresh else self.controller.cache.peek([MBADDR, MBREGCFG])
+            if cached is not None:
+                self.show_modbus_config(*cached)
+                return
 
-            self.clear_data_rows()
-            self.populate_data_rows()
+            self.read_status.SetLabel("Leyendo la configuración Registros Modbus...")
 
-            dlg.Destroy()
-            self.controller.send_command("AT+PROGMODE=0\r\n", False)
+            def read_modbus_config(controller):
+                with controller.programming_mode():
+                    modbus_slave_addr = controller.cache.read(controller, [MBADDR], refresh)[0]
+                    self.serial_worker.post(self.slave_address_ctrl.SetValue, str(modbus_slave_addr))
+
+                    modbus_reg_data = []
+                    for register in read_registers(controller):
+                        modbus_reg_data.append(register)
+                        self.serial_worker.post(self.show_register, register)
+
+                controller.cache.store(MBREGCFG, modbus_reg_data)
+                return modbus_reg_data
+
+            self.serial_worker.submit(read_modbus_config, self.on_modbus_config_read)
         else:
-            # fallback or demo data
+            # fallback or demo data, nothing here was read from a device
+            self.device_rows = {}
+            self.modbus_info = []
             for i in range(10):
                 self.modbus_info.append({
                     "register_position": i,
@@ -343,6 +388,26 @@ class ModbusConfigPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR
             )
 
+    def on_modbus_config_read(self, future):
+        self.read_status.SetLabel("")
+        if future.exception() is not None:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        print(f"Received Modbus Reg Data: {future.result()}")
+
+    def show_snapshot(self, snapshot):
+        self.show_modbus_config(snapshot.modbus_address, snapshot.registers)
+
+    def show_modbus_config(self, modbus_slave_addr, modbus_reg_data):
+        print(f"Received Modbus Slave Address: {modbus_slave_addr}")
+        self.slave_address_ctrl.SetValue(str(modbus_slave_addr))
+
+        print(f"Received Modbus Reg Data: {modbus_reg_data}")
+        # modbus_register_address is decimal, set_row_values shows it as hex
+        for register in modbus_reg_data:
+            self.show_register(register)
+
     def on_enable_flag_change(self, event, checkbox):
         """
         If user toggles the checkbox, we enable or disable the row's controls.
@@ -375,13 +440,19 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         rows_for_sending = []
         for row in self.row_controls:
             line = self.extract_data_from_row(row)
-            print(f"Row data: {line}")
-            rows_for_sending.append(line)
+            register_position = int(line.split(",")[0])
+            # only rows that differ from what was last read from the device
+            if self.device_rows.get(register_position) != line:
+                print(f"Row data: {line}")
+                rows_for_sending.append(line)
 
         if not rows_for_sending:
-            wx.MessageBox("No hay filas para guardar.", "Info", wx.OK | wx.ICON_INFORMATION)
+            wx.MessageBox("No hay cambios para guardar.", "Info", wx.OK | wx.ICON_INFORMATION)
             return
 
+        self.send_rows(rows_for_sending)
+
+    def send_rows(self, rows_for_sending):
         total_rows = len(rows_for_sending)
         dialog = wx.ProgressDialog(
             "Guardando parámetros",
@@ -391,32 +462,63 @@ class ModbusConfigPanel(wx.ScrolledWindow):
             style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE | wx.PD_SMOOTH
         )
 
-        self.controller.send_command("AT+PROGMODE=1\r\n", False)
-
-        for i, row_str in enumerate(rows_for_sending, start=1):
-            register_position = row_str.split(",")[0]
-            dialog_msg = f"Guardando parámetros para el registro {register_position}..."
-            dialog.Update(i, dialog_msg)
-
-            cmd = f"AT+MBREGCFG={row_str}\r\n"
-            response = self.controller.send_command(cmd)
-            print(f"Sent: {cmd.strip()}, Received: {response.strip()}")
-            time.sleep(0.5)  # optional delay
-
-            if response.strip() != "OK":
-                wx.MessageBox(
-                    f"Error al guardar registro {register_position}.\n"
-                    f"Respuesta del dispositivo: {response}",
-                    "Error",
-                    wx.OK | wx.ICON_ERROR
-                )
-                dialog.Destroy()
-                self.controller.send_command("AT+PROGMODE=0\r\n", False)
-                return
+        def write_rows(controller):
+            """
+            Runs on the serial worker. Returns {register_position: response}
+            for the rows that failed, empty when every row was accepted.
+            """
+            def on_progress(done, total, register_position):
+                dialog_msg = f"Guardando parámetros para el registro {register_position}..."
+                self.serial_worker.post(dialog.Update, done, dialog_msg)
+
+            with write_session(controller):
+                # if the cable drops midway, the journal lets the push resume on reconnect
+                journal = registers_journal(controller, rows_for_sending)
+                return write_registers(controller, rows_for_sending, on_progress=on_progress, journal=journal)
 
-        self.controller.send_command("AT+PROGMODE=0\r\n", False)
+        self.serial_worker.submit(write_rows, lambda future: self.on_registers_saved(future, dialog, rows_for_sending))
+
+    def on_registers_saved(self, future, dialog, rows_for_sending):
         dialog.Destroy()
 
+        if isinstance(future.exception(), PendingJournalError):
+            # the main window asks whether to finish or drop the interrupted session
+            wx.GetTopLevelParent(self).offer_resume(future.exception().journal)
+            return
+
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        if future.exception() is not None:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        failures = future.result()
+
+        # the device now holds every row it accepted
+        for row_str in rows_for_sending:
+            register_position = int(row_str.split(",")[0])
+            if register_position not in failures:
+                self.device_rows[register_position] = row_str
+
+        if failures:
+            details = "\n".join(
+                f"Registro {register_position}: {response or 'sin respuesta'}"
+                for register_position, response in failures.items()
+            )
+            answer = wx.MessageBox(
+                f"Error al guardar los registros {', '.join(str(position) for position in failures)}.\n"
+                f"{details}\n\n"
+                "¿Reintentar solo estos registros?",
+                "Error",
+                wx.YES_NO | wx.ICON_ERROR
+            )
+            if answer == wx.YES:
+                self.send_rows([row_str for row_str in rows_for_sending if int(row_str.split(",")[0]) in failures])
+            return
+
         wx.MessageBox(
             "Todos los parámetros han sido enviados correctamente.",
             "Info",
@@ -442,7 +544,10 @@ class ModbusConfigPanel(wx.ScrolledWindow):
         # remove the 0x prefix if present
         addr_str = addr_str.replace("0x", "").replace("0X", "")
 
-        modbus_register_address_str = addr_str
+        try:
+            modbus_register_address_str = str(int(addr_str, 16))
+        except ValueError:
+            modbus_register_address_str = "0"
 
         # 4) data_type
         data_type_str = row["data_type"].GetValue()
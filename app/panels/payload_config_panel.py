@@ -1,10 +1,14 @@
 import wx
 import wx.lib.scrolledpanel as scrolled
 
+from app.back_logic.protocol import MSGVAR, MSGVAR_RESET, is_ok
+from app.back_logic.verification import verification_message, write_session
+
 class PayloadConfigPanel(scrolled.ScrolledPanel):
-    def __init__(self, parent, controller):
+    def __init__(self, parent, controller, serial_worker):
         super().__init__(parent)
         self.controller = controller
+        self.serial_worker = serial_worker
 
         # We'll store a list of rows, e.g.: {"position": 0, "assigned_value": "Pulse Counter 1"}
         self.msg_info = []
@@ -77,6 +81,11 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
         reset_button.Bind(wx.EVT_BUTTON, self.on_reset)
         button_sizer.Add(reset_button, flag=wx.ALL, border=5)
 
+        # Tab switches render from the device cache, this forces a fresh read
+        refresh_button = wx.Button(self, label="Refrescar")
+        refresh_button.Bind(wx.EVT_BUTTON, lambda event: self.on_enter(refresh=True))
+        button_sizer.Add(refresh_button, flag=wx.ALL, border=5)
+
         main_sizer.Add(button_sizer, flag=wx.ALIGN_CENTER | wx.ALL, border=10)
 
         # Tell the panel to use main_sizer for layout
@@ -96,15 +105,24 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
 
         return v_sizer
 
-    def on_enter(self):
+    def on_enter(self, pending_writes=None, refresh=False, success_message=None):
         """
         Called when this panel becomes the selected tab in the notebook.
-        We'll query the device for the MSGVAR values and populate them.
+        We'll take the MSGVAR values from the device cache, or query the device
+        for them (always with `refresh`) and populate them.
         Also shows a progress dialog while reading data.
+        Any `pending_writes` are sent first, in the same programming mode session,
+        and `success_message` is shown once they went through.
         """
         print("Inside PayloadConfigPanel - reading from device...")
 
         if self.controller.is_open():
+            cached = None if pending_writes or refresh else self.controller.cache.peek([MSGVAR])
+            if cached is not None:
+                self.set_msgvar_slots(cached[0])
+                self.refresh_rows()
+                return
+
             # Show a small progress dialog
             dlg = wx.ProgressDialog(
                 "Leyendo configuración",
@@ -114,15 +132,10 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
 
-            self.controller.send_command("AT+PROGMODE=1\r\n", False)
-            cmd_response = self.controller.send_command("AT+MSGVAR?\r\n")
-            self.controller.send_command("AT+PROGMODE=0\r\n", False)
-
-            dlg.Update(1, "Lectura completada")
-            dlg.Destroy()
-
-            lines = cmd_response.split("\n")
-            self.parse_msgvar_response(lines)
+            self.serial_worker.submit(
+                lambda controller: self.read_msgvar(controller, pending_writes or [], refresh),
+                lambda future: self.on_msgvar_read(future, dlg, success_message),
+            )
         else:
             # Fallback if device is not open
             self.msg_info = [
@@ -133,44 +146,64 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
                 "Error",
                 wx.OK | wx.ICON_ERROR
             )
+            self.refresh_rows()
+
+    def read_msgvar(self, controller, pending_writes, refresh):
+        """
+        Returns the MSGVAR slots and the writes the device rejected.
+        """
+        rejected = []
+        with controller.programming_mode():
+            with write_session(controller):
+                for cmd in pending_writes:
+                    if not is_ok(controller.send_command(cmd)):
+                        rejected.append(cmd.strip())
+            # the writes drop MSGVAR from the cache, so it is read back from the device
+            # unless the verification already did
+            return controller.cache.read(controller, [MSGVAR], refresh)[0], rejected
+
+    def on_msgvar_read(self, future, dlg, success_message=None):
+        dlg.Update(1, "Lectura completada")
+        dlg.Destroy()
+
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+        elif future.exception() is None:
+            slots, rejected = future.result()
+            self.set_msgvar_slots(slots)
+            if rejected:
+                failed = "\n".join(rejected)
+                wx.MessageBox(f"El dispositivo rechazó los siguientes comandos:\n{failed}", "Error", wx.OK | wx.ICON_ERROR)
+            elif success_message:
+                wx.MessageBox(success_message, "Info", wx.OK | wx.ICON_INFORMATION)
+        else:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+
+        self.refresh_rows()
+
+    def show_snapshot(self, snapshot):
+        self.set_msgvar_slots(snapshot.msgvar)
+        self.refresh_rows()
 
+    def refresh_rows(self):
         self.clear_data_rows()
         self.populate_data_rows()
 
         # Recompute scrolling after data changes
         self.SetupScrolling(scroll_x=False, scroll_y=True)
 
-    def parse_msgvar_response(self, lines):
+    def set_msgvar_slots(self, slots):
         """
-        Parse lines like '0 - 10' or '1 - unassigned'.
+        Fill msg_info from the parsed MSGVAR? slots ({position: code or None}).
         """
         self.msg_info.clear()
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            if " - " not in line:
-                continue
-
-            parts = line.split(" - ")
-            if len(parts) != 2:
-                continue
-
-            position_str, var_str = parts
-            try:
-                position = int(position_str)
-            except ValueError:
-                continue
-
-            if var_str.lower() == "unassigned":
+        for position, var_value in slots.items():
+            if var_value is None:
                 assigned_value = "unassigned"
             else:
-                try:
-                    var_value = int(var_str)
-                    assigned_value = self.VAR_TYPE_MAP.get(var_value, f"Desconocido ({var_value})")
-                except ValueError:
-                    assigned_value = f"Desconocido ({var_str})"
+                assigned_value = self.VAR_TYPE_MAP.get(var_value, f"Desconocido ({var_value})")
 
             self.msg_info.append({
                 "position": position,
@@ -265,6 +298,7 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
         """
         # 1) If we have a combo box (the first unassigned row),
         # read its value and find the code in VAR_TYPE_MAP
+        pending_writes = []
         name_to_code = {v: k for k, v in self.VAR_TYPE_MAP.items()}
         for row_ctrls in self.row_controls:
             assigned_ctrl = row_ctrls["assigned_ctrl"]
@@ -273,28 +307,19 @@ class PayloadConfigPanel(scrolled.ScrolledPanel):
                 if chosen_name:
                     code = name_to_code.get(chosen_name)
                     print(f"Combo selection: '{chosen_name}' => code {code}")
-                    self.controller.send_command("AT+PROGMODE=1\r\n", False)
-                    res = self.controller.send_command(f"AT+MSGVAR={code}\r\n")
-                    self.controller.send_command("AT+PROGMODE=0\r\n", False)
+                    pending_writes.append(MSGVAR.set(code))
                 else:
                     print("Combo selection is empty.")
                     # Show a dialog telling the user to select an option if needed.
                 # There's only one combo box, so we can break after reading it.
                 break
 
-        # 2) Then do the normal refresh (which calls on_enter)
-        self.on_enter()
+        # 2) Then do the normal refresh (which calls on_enter), writing the selection first
+        self.on_enter(pending_writes)
 
     def on_reset(self, event):
         """Clear all assignments (make them 'unassigned')."""
-        self.controller.send_command("AT+PROGMODE=1\r\n", False)
-        self.controller.send_command("AT+MSGVAR=255\r\n")
-        self.controller.send_command("AT+PROGMODE=0\r\n", False)
-
-        wx.MessageBox(
-            "Se ha reiniciado la configuración del payload.",
-            "Info",
-            wx.OK | wx.ICON_INFORMATION
+        self.on_enter(
+            [MSGVAR.set(MSGVAR_RESET)],
+            success_message="Se ha reiniciado la configuración del payload.",
         )
-
-        self.on_enter()
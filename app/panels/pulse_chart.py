@@ -0,0 +1,200 @@
+import time
+
+import numpy as np
+import wx
+
+from app.back_logic.decimation import DecimatedSeries
+from app.back_logic.telemetry_store import PULSE_SERIES
+
+FRAME_INTERVAL = 50  # ms, redraws requested in between are merged into the next frame
+ZOOM_STEP = 1.25
+MIN_SPAN = 2.0  # seconds, the narrowest zoom
+MARGIN = 60  # px left of the plots for the axis labels
+CHANNEL_COLOURS = [wx.Colour(31, 119, 180), wx.Colour(214, 39, 40)]
+
+
+class PulseChartPanel(wx.Panel):
+	"""
+	Live plot of the pulse counters (top) and their rates (bottom) recorded by the status
+	tab's monitor. Once per frame the samples that arrived in the telemetry store since the
+	last one are reduced into decimated series built over the store's own arrays, so the
+	history is not copied, each frame only processes what is new, and at most two points
+	per pixel column are drawn however long the capture is.
+
+	The mouse wheel zooms around the pointer, dragging pans, and a double click goes back
+	to following the whole capture.
+	"""
+
+	def __init__(self, parent, controller, serial_worker):
+		super(PulseChartPanel, self).__init__(parent)
+
+		self.controller = controller
+		self.serial_worker = serial_worker
+		self.source = None  # the DeviceStatusPanel whose monitor feeds the chart
+
+		self.store = None
+		self.consumed = 0
+		self.counts = None  # DecimatedSeries over the store's pulse series, once it has one
+		self.rates = None
+
+		self.view = None  # (start, end) in seconds, None follows the whole capture
+		self.drag_x = None
+		self.dirty = True
+
+		self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+		self.Bind(wx.EVT_PAINT, self.on_paint)
+		self.Bind(wx.EVT_SIZE, self.on_size)
+		self.Bind(wx.EVT_MOUSEWHEEL, self.on_wheel)
+		self.Bind(wx.EVT_LEFT_DOWN, self.on_left_down)
+		self.Bind(wx.EVT_LEFT_UP, self.on_left_up)
+		self.Bind(wx.EVT_MOTION, self.on_motion)
+		self.Bind(wx.EVT_LEFT_DCLICK, self.on_double_click)
+
+		self.frame_timer = wx.Timer(self)
+		self.Bind(wx.EVT_TIMER, self.on_frame, self.frame_timer)
+		self.frame_timer.Start(FRAME_INTERVAL)
+
+	def on_frame(self, event):
+		self.take_new_samples()
+		if self.dirty and self.IsShownOnScreen():
+			self.dirty = False
+			self.Refresh(eraseBackground=False)
+
+	def take_new_samples(self):
+		store = self.source.telemetry if self.source is not None else None
+		if store is not self.store:
+			# a new monitoring session started, the chart starts over with it
+			self.store = store
+			self.reset()
+		if store is None or PULSE_SERIES not in store:
+			return
+
+		series = store[PULSE_SERIES]
+		if self.counts is None:
+			self.counts = DecimatedSeries(series)
+			self.rates = DecimatedSeries(series, rates=True)
+		if len(series) == self.consumed:
+			return
+
+		self.counts.update()
+		self.rates.update()
+		self.consumed = len(series)
+		self.dirty = True
+
+	def reset(self):
+		self.consumed = 0
+		self.counts = None
+		self.rates = None
+		self.view = None
+		self.dirty = True
+
+	def visible_range(self) -> tuple[float, float] | None:
+		if self.counts is None:
+			return None
+		time_range = self.counts.time_range()
+		if time_range is None:
+			return None
+		if self.view is None:
+			start, end = time_range
+			return start, max(end, start + MIN_SPAN)
+		return self.view
+
+	def on_size(self, event):
+		self.dirty = True
+		event.Skip()
+
+	def on_wheel(self, event):
+		visible = self.visible_range()
+		if visible is None:
+			return
+
+		start, end = visible
+		width = max(self.GetClientSize().width - MARGIN, 1)
+		anchor = start + (end - start) * min(max(event.GetX() - MARGIN, 0), width) / width
+		scale = 1 / ZOOM_STEP if event.GetWheelRotation() > 0 else ZOOM_STEP
+		span = max((end - start) * scale, MIN_SPAN)
+		start = anchor - (anchor - start) * span / (end - start)
+		self.view = (start, start + span)
+		self.dirty = True
+
+	def on_left_down(self, event):
+		self.drag_x = event.GetX()
+		self.CaptureMouse()
+
+	def on_left_up(self, event):
+		self.drag_x = None
+		if self.HasCapture():
+			self.ReleaseMouse()
+
+	def on_motion(self, event):
+		visible = self.visible_range()
+		if self.drag_x is None or not event.Dragging() or visible is None:
+			return
+
+		start, end = visible
+		width = max(self.GetClientSize().width - MARGIN, 1)
+		shift = (self.drag_x - event.GetX()) * (end - start) / width
+		self.view = (start + shift, end + shift)
+		self.drag_x = event.GetX()
+		self.dirty = True
+
+	def on_double_click(self, event):
+		self.view = None
+		self.dirty = True
+
+	def on_paint(self, event):
+		dc = wx.AutoBufferedPaintDC(self)
+		dc.SetBackground(wx.WHITE_BRUSH)
+		dc.Clear()
+
+		size = self.GetClientSize()
+		visible = self.visible_range()
+		if visible is None:
+			dc.DrawText("Inicie el monitoreo en la pestaña Estado del Dispositivo para ver la gráfica", 20, 20)
+			return
+
+		start, end = visible
+		half = size.height // 2
+		self.draw_plot(dc, self.counts, "Pulsos", start, end, wx.Rect(MARGIN, 10, size.width - MARGIN - 10, half - 30))
+		self.draw_plot(dc, self.rates, "Pulsos/s", start, end, wx.Rect(MARGIN, half + 10, size.width - MARGIN - 10, half - 30))
+
+		dc.SetTextForeground(wx.BLACK)
+		dc.DrawText(time.strftime("%H:%M:%S", time.localtime(start)), MARGIN, size.height - 18)
+		end_label = time.strftime("%H:%M:%S", time.localtime(end))
+		dc.DrawText(end_label, size.width - 10 - dc.GetTextExtent(end_label).width, size.height - 18)
+
+	def draw_plot(self, dc, series, title, start, end, rect):
+		if rect.width <= 0 or rect.height <= 0:
+			return
+
+		dc.SetPen(wx.LIGHT_GREY_PEN)
+		dc.SetBrush(wx.TRANSPARENT_BRUSH)
+		dc.DrawRectangle(rect)
+		dc.SetTextForeground(wx.BLACK)
+		dc.DrawText(title, rect.x + 5, rect.y + 2)
+
+		columns, minima, maxima = series.decimate(start, end, rect.width)
+		if not len(columns):
+			return
+
+		bottom, top = np.nanmin(minima), np.nanmax(maxima)
+		if not np.isfinite(bottom) or not np.isfinite(top):
+			return
+		if top == bottom:
+			top, bottom = top + 1, bottom - 1
+
+		dc.DrawText(f"{top:g}", 2, rect.y)
+		dc.DrawText(f"{bottom:g}", 2, rect.GetBottom() - 14)
+
+		scale = (rect.height - 1) / (top - bottom)
+		x = rect.x + columns
+		for channel, colour in enumerate(CHANNEL_COLOURS):
+			low = np.nan_to_num(rect.GetBottom() - (minima[:, channel] - bottom) * scale, nan=rect.GetBottom())
+			high = np.nan_to_num(rect.GetBottom() - (maxima[:, channel] - bottom) * scale, nan=rect.GetBottom())
+			# each column runs from its minimum to its maximum, and on to the next column
+			points = np.empty((2 * len(columns), 2), dtype=np.int64)
+			points[0::2, 0] = points[1::2, 0] = x
+			points[0::2, 1] = low
+			points[1::2, 1] = high
+			dc.SetPen(wx.Pen(colour))
+			dc.DrawLines([tuple(point) for point in points.tolist()])
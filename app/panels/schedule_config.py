@@ -1,11 +1,15 @@
 import wx
 
+from app.back_logic.protocol import NOT_CONFIGURED, SCHEDULE, is_ok
+from app.back_logic.verification import verification_message, write_session
+
 
 class ScheduleConfigPanel(wx.ScrolledWindow):
-    def __init__(self, parent, serial_comms_controller):
+    def __init__(self, parent, serial_comms_controller, serial_worker):
         super(ScheduleConfigPanel, self).__init__(parent)
 
         self.serial_comms_controller = serial_comms_controller
+        self.serial_worker = serial_worker
 
         self.schedule_info = {
             "on_schedule": {"value": "", "text_ctrl": None},
@@ -77,7 +81,6 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
 
     def on_read(self, event):
         if self.serial_comms_controller.is_open():
-            self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)
             dlg = wx.ProgressDialog(
                 "Leyendo parámetros",
                 "Por favor espere mientras se realiza la lectura",
@@ -85,29 +88,14 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
                 parent=self,
                 style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE
             )
-            schedule_config = self.serial_comms_controller.send_command("AT+SCHEDULE?\r\n")
-            schedule_config = schedule_config.replace("OK\r\n", "")
-            print(f"Schedule config: {schedule_config}")
-            dlg.Update(1, "Leyendo el control por horario...")
-
-            dlg.Destroy()
-            self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)
-
-            schedule_config_list = schedule_config[:-2].split(",")
-            schedule_on = f"{schedule_config_list[0]}:{schedule_config_list[1]}" if schedule_config_list[
-                                                                                        0] != "99" else "No configurado"
-            schedule_off = f"{schedule_config_list[3]}:{schedule_config_list[4]}" if schedule_config_list[
-                                                                                         3] != "99" else "No configurado"
-            contactor_on = ("Cerrado" if schedule_config_list[
-                                             2] == "1" else "Abierto") if schedule_on != "No configurado" else "No configurado"
-            contactor_off = ("Abierto" if schedule_config_list[
-                                              2] == "1" else "Cerrado") if schedule_off != "No configurado" else "No configurado"
-
-            self.schedule_info["on_schedule"]["text_ctrl"].SetValue(schedule_on)
-            self.schedule_info["off_schedule"]["text_ctrl"].SetValue(schedule_off)
-            self.schedule_info["on_contactor_state"]["text_ctrl"].SetValue(contactor_on)
-            self.schedule_info["off_contactor_state"]["text_ctrl"].SetValue(contactor_off)
 
+            def read_schedule(controller):
+                with controller.programming_mode():
+                    schedule_config = controller.cache.read(controller, [SCHEDULE], refresh=True)[0]
+                self.serial_worker.post(dlg.Update, 1, "Leyendo el control por horario...")
+                return schedule_config
+
+            self.serial_worker.submit(read_schedule, lambda future: self.on_schedule_read(future, dlg))
         else:
             wx.MessageBox(
                 "No se puede leer la configuración de horario, el puerto serial está cerrado",
@@ -115,6 +103,29 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR
             )
 
+    def on_schedule_read(self, future, dlg):
+        dlg.Destroy()
+        if future.exception() is None:
+            self.show_schedule(future.result())
+        else:
+            wx.MessageBox("No se pudo comunicar con el dispositivo", "Error", wx.OK | wx.ICON_ERROR)
+
+    def show_snapshot(self, snapshot):
+        self.show_schedule(snapshot.schedule)
+
+    def show_schedule(self, schedule_config):
+        print(f"Schedule config: {schedule_config}")
+
+        schedule_on = f"{schedule_config['on_hour']:02d}:{schedule_config['on_minute']:02d}" if schedule_config["on_hour"] != NOT_CONFIGURED else "No configurado"
+        schedule_off = f"{schedule_config['off_hour']:02d}:{schedule_config['off_minute']:02d}" if schedule_config["off_hour"] != NOT_CONFIGURED else "No configurado"
+        contactor_on = ("Cerrado" if schedule_config["on_relay"] == 1 else "Abierto") if schedule_on != "No configurado" else "No configurado"
+        contactor_off = ("Abierto" if schedule_config["on_relay"] == 1 else "Cerrado") if schedule_off != "No configurado" else "No configurado"
+
+        self.schedule_info["on_schedule"]["text_ctrl"].SetValue(schedule_on)
+        self.schedule_info["off_schedule"]["text_ctrl"].SetValue(schedule_off)
+        self.schedule_info["on_contactor_state"]["text_ctrl"].SetValue(contactor_on)
+        self.schedule_info["off_contactor_state"]["text_ctrl"].SetValue(contactor_off)
+
     def create_title(self, title):
         title_text = wx.StaticText(self, label=title)
         title_text.SetFont(wx.Font(wx.FontInfo(12).Bold()))
@@ -232,7 +243,6 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
 
     def on_save(self, event):
         if self.serial_comms_controller.is_open():
-            self.serial_comms_controller.send_command("AT+PROGMODE=1\r\n", False)
             open_hour = str(self.current_open_hour).zfill(2)
             open_minute = str(self.current_open_minute).zfill(2)
             open_relay_status = "1" if self.current_open_contact == "NA" else "0"
@@ -254,22 +264,23 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
             )
 
             # Add logic to save to serial controller or perform other actions
-            schedule_config_msg = f"AT+SCHEDULE={open_hour},{open_minute},{open_relay_status},{close_hour},{close_minute},{close_relay_status}\r\n"
+            schedule_config_msg = SCHEDULE.set({
+                "on_hour": open_hour,
+                "on_minute": open_minute,
+                "on_relay": open_relay_status,
+                "off_hour": close_hour,
+                "off_minute": close_minute,
+                "off_relay": close_relay_status,
+            })
             print(f"Schedule config message: {schedule_config_msg}")
-            response = self.serial_comms_controller.send_command(schedule_config_msg)
-            dlg.Update(1, "Cargando el control por horario...")
-
-            dlg.Destroy()
-            self.serial_comms_controller.send_command("AT+PROGMODE=0\r\n", False)
-
-            if response == "OK\r\n":
-                wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
-            else:
-                wx.MessageBox(
-                    f"No se pudieron guardar los valores",
-                    "Error",
-                    wx.OK | wx.ICON_ERROR,
-                )
+
+            def write_schedule(controller):
+                with write_session(controller):
+                    response = controller.send_command(schedule_config_msg)
+                self.serial_worker.post(dlg.Update, 1, "Cargando el control por horario...")
+                return response
+
+            self.serial_worker.submit(write_schedule, lambda future: self.on_schedule_saved(future, dlg))
         else:
             wx.MessageBox(
                 "No se puede guardar la configuración de horario, el puerto serial está cerrado",
@@ -277,6 +288,22 @@ class ScheduleConfigPanel(wx.ScrolledWindow):
                 wx.OK | wx.ICON_ERROR
             )
 
+    def on_schedule_saved(self, future, dlg):
+        dlg.Destroy()
+        failure = verification_message(future)
+        if failure is not None:
+            wx.MessageBox(failure, "Error", wx.OK | wx.ICON_ERROR)
+            return
+
+        if future.exception() is None and is_ok(future.result()):
+            wx.MessageBox("Valores cargados correctamente", "Info", wx.OK | wx.ICON_INFORMATION)
+        else:
+            wx.MessageBox(
+                f"No se pudieron guardar los valores",
+                "Error",
+                wx.OK | wx.ICON_ERROR,
+            )
+
     def get_schedule_text(self, hour_key, minute_key, relay_status_key):
         return (
             f"Hora: {self.schedule_info[hour_key]}:{self.schedule_info[minute_key]}, "
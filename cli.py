@@ -1,4 +1,115 @@
-from app.main import main
+import argparse
+import sys
+
+
+def export_profile(args) -> int:
+	from app.back_logic.profiles import read_profile, save_profile
+	from app.back_logic.serial_controller import SerialController
+
+	controller = SerialController(args.port, baudrate=args.baud_rate)
+	if not controller.is_open():
+		print(f"Could not open {args.port}")
+		return 1
+
+	try:
+		profile = read_profile(controller, args.name or "")
+	finally:
+		controller.close()
+
+	save_profile(args.file, profile)
+	print(f"Profile of device {profile['source_device']} saved to {args.file}")
+	return 0
+
+
+def apply_profile(args) -> int:
+	from app.back_logic.profiles import ProfileError, load_profile
+	from app.back_logic.provisioning import provision_fleet
+
+	try:
+		profile = load_profile(args.file)
+	except (OSError, ProfileError) as e:
+		print(f"Could not load {args.file}: {e}")
+		return 1
+
+	results = provision_fleet(args.ports, profile["config"], baudrate=args.baud_rate, verify=args.verify)
+	for result in results:
+		for command, response in result.failures:
+			print(f"{result.port}: {command} -> {response or 'no response'}")
+		for mismatch in result.mismatches:
+			print(f"{result.port}: {mismatch}")
+
+	return 0 if all(result.success for result in results) else 1
+
+
+def parse_time(value: str) -> float:
+	"""
+	Seconds since the epoch, or a local "YYYY-MM-DD HH:MM:SS" date and time.
+	"""
+	import time
+
+	try:
+		return float(value)
+	except ValueError:
+		pass
+	try:
+		return time.mktime(time.strptime(value, "%Y-%m-%d %H:%M:%S"))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid time: {value!r}") from None
+
+
+def replay_session(args) -> int:
+	from app.back_logic.session_recorder import SessionReader
+
+	try:
+		reader = SessionReader(args.file)
+	except (OSError, ValueError) as e:
+		print(f"Could not open {args.file}: {e}")
+		return 1
+
+	with reader:
+		for record in reader.records(args.start, args.end):
+			print(record)
+	return 0
+
+
+def main(argv=None) -> int:
+	"""
+	Without arguments the GUI starts. The profile commands run without wx, e.g.:
+
+		cli.py export COM3 clone.ecmp
+		cli.py apply clone.ecmp COM3 COM4 COM5
+	"""
+	parser = argparse.ArgumentParser(description="ECM Config")
+	commands = parser.add_subparsers(dest="command")
+
+	export_parser = commands.add_parser("export", help="save the configuration of a device as a profile")
+	export_parser.add_argument("port")
+	export_parser.add_argument("file", help="profile file, .ecmp for the binary form, JSON otherwise")
+	export_parser.add_argument("--name", help="name stored in the profile")
+	export_parser.add_argument("--baud-rate", type=int, default=9600)
+	export_parser.set_defaults(run=export_profile)
+
+	apply_parser = commands.add_parser("apply", help="write a profile to one or more devices")
+	apply_parser.add_argument("file")
+	apply_parser.add_argument("ports", nargs="+")
+	apply_parser.add_argument("--baud-rate", type=int, default=9600)
+	apply_parser.add_argument("--verify", action="store_true", help="read every value back after writing it")
+	apply_parser.set_defaults(run=apply_profile)
+
+	replay_parser = commands.add_parser("replay", help="print the records of a session log")
+	replay_parser.add_argument("file")
+	replay_parser.add_argument("--from", dest="start", type=parse_time, help="first time to print")
+	replay_parser.add_argument("--to", dest="end", type=parse_time, help="last time to print")
+	replay_parser.set_defaults(run=replay_session)
+
+	args = parser.parse_args(argv)
+	if args.command is None:
+		from app.main import main as run_gui
+		run_gui()
+		return 0
+
+	return args.run(args)
+
 
 if __name__ == "__main__":
-	main()
+	sys.exit(main())
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def config_home(tmp_path, monkeypatch):
+	# config_manager keeps its file under ~/ECMConfig, never touch the real one
+	monkeypatch.setenv("HOME", str(tmp_path))
+	return tmp_path
@@ -0,0 +1,139 @@
+import time
+
+
+class FakePort:
+	"""
+	In-memory stand-in for the serial.Serial an ECM is attached to. Every CRLF-terminated
+	command written to it is answered from `replies`, `delay` seconds after the device is
+	done with the previous one. A reply may also be a function of the command line;
+	commands without a reply get OK for a write and ERROR for anything else.
+	"""
+
+	def __init__(self, replies: dict | None = None, delay: float = 0.0):
+		self.replies = dict(replies or {})
+		self.delay = delay
+		self.written = []  # command lines, without the line break
+		self.scheduled = []  # (due time, reply bytes), in order
+		self.received = bytearray()
+		self.partial = b""
+		self.busy_until = 0.0
+		self.is_open = True
+		self.port = "fake"
+		self.baudrate = 9600
+
+	def write(self, data: bytes) -> int:
+		*lines, self.partial = (self.partial + bytes(data)).split(b"\r\n")
+		for line in lines:
+			command = line.decode("utf-8")
+			self.written.append(command)
+			self.busy_until = max(self.busy_until, time.monotonic()) + self.delay
+			reply = self.reply(command)
+			# a list is sent piece by piece, `delay` apart
+			for piece in reply if isinstance(reply, list) else [reply]:
+				if piece:
+					self.scheduled.append((self.busy_until, piece.encode("utf-8") if isinstance(piece, str) else piece))
+				if piece is not reply:
+					self.busy_until += self.delay
+		return len(data)
+
+	def reply(self, command: str) -> str | bytes | list | None:
+		reply = self.replies.get(command, "OK\r\n" if "=" in command else "ERROR\r\n")
+		return reply(command) if callable(reply) else reply
+
+	@property
+	def in_waiting(self) -> int:
+		now = time.monotonic()
+		while self.scheduled and self.scheduled[0][0] <= now:
+			self.received += self.scheduled.pop(0)[1]
+		return len(self.received)
+
+	def read(self, size: int = 1) -> bytes:
+		size = min(size, self.in_waiting)
+		data = bytes(self.received[:size])
+		del self.received[:size]
+		return data
+
+	def readinto(self, buffer) -> int:
+		data = self.read(len(buffer))
+		buffer[:len(data)] = data
+		return len(data)
+
+	def read_all(self) -> bytes:
+		return self.read(self.in_waiting)
+
+	def reset_input_buffer(self):
+		self.in_waiting
+		self.received.clear()
+
+	def reset_output_buffer(self):
+		pass
+
+	def flush(self):
+		pass
+
+	def open(self):
+		self.is_open = True
+
+	def close(self):
+		self.is_open = False
+
+
+ECM_REPLIES = {
+	"AT+NETWORK?": "NETWORK: 1\r\nOK\r\n",
+	"AT+DEVID?": "DEVID: 00ABC123\r\nOK\r\n",
+	"AT+PULSECOUNT1?": "0000001A\r\n",
+	"AT+PULSECOUNT2?": "000000FF\r\n",
+	"AT+SCHEDULE?": "07,30,1,18,45,0\r\nOK\r\n",
+	"AT+ACINPUT?": "06,00,19,00\r\nOK\r\n",
+	"AT+IN3MODE?": "IN3MODE: OPENING_DETECTION\r\nOK\r\n",
+	"AT+MBADDR?": "MBADDR: 1\r\nOK\r\n",
+	"AT+MBREGCFG?": "".join(f"{i},{i % 2},{100 + i},2,2,60,1,0\r\n" for i in range(10)),
+	"AT+MSGVAR?": "0 - 10\r\n1 - 11\r\n2 - unassigned\r\nOK\r\n",
+	"AT+OFFSET?": "OFFSET: 120\r\nOK\r\n",
+	"AT+FPULSE?": "FPULSE: 0.5\r\nOK\r\n",
+}
+
+
+class FakeEcm(FakePort):
+	"""
+	A FakePort that keeps the configuration written to it, so later queries answer with
+	the new values like the device does.
+	"""
+
+	def __init__(self, replies: dict | None = None, delay: float = 0.0):
+		super().__init__(dict(ECM_REPLIES, **(replies or {})), delay)
+		self.msgvar = [10, 11]
+
+	def reply(self, command: str) -> str | bytes | list | None:
+		if "=" not in command or command in self.replies:
+			return super().reply(command)
+
+		name, value = command[3:].split("=", 1)
+		if name == "CONFIG":
+			mode = "OPENING_DETECTION" if value.startswith("16") else "RELAY"
+			self.replies["AT+IN3MODE?"] = f"IN3MODE: {mode}\r\nOK\r\n"
+		elif name == "MBREGCFG":
+			rows = self.replies["AT+MBREGCFG?"].split("\r\n")[:-1]
+			rows[int(value.split(",")[0])] = value
+			self.replies["AT+MBREGCFG?"] = "".join(row + "\r\n" for row in rows)
+		elif name == "MSGVAR":
+			self.msgvar = [] if value == "255" else self.msgvar + [int(value)]
+			slots = [f"{i} - {code}" for i, code in enumerate(self.msgvar)] + [f"{len(self.msgvar)} - unassigned"]
+			self.replies["AT+MSGVAR?"] = "".join(slot + "\r\n" for slot in slots) + "OK\r\n"
+		elif name in ("MBADDR", "OFFSET", "FPULSE"):
+			self.replies[f"AT+{name}?"] = f"{name}: {value}\r\nOK\r\n"
+		elif name in ("SCHEDULE", "ACINPUT"):
+			self.replies[f"AT+{name}?"] = f"{value}\r\nOK\r\n"
+		return "OK\r\n"
+
+
+def fake_controller(port: FakePort):
+	"""
+	A SerialController talking to `port` instead of a real serial port.
+	"""
+	from app.back_logic.serial_controller import SerialController
+
+	controller = SerialController(port.port)
+	controller.serial = port
+	controller.serial_created = True
+	return controller
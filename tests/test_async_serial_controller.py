@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from app.back_logic.async_serial_controller import AsyncSerialController
+from app.back_logic.serial_controller import IDLE_GAP, READ_LIMIT_FACTOR
+
+# loop:// hands back every byte written to it, so each command is answered with itself
+
+
+def run(coroutine):
+	return asyncio.run(coroutine)
+
+
+def test_open_send_and_close_over_loop():
+	async def exchange():
+		controller = AsyncSerialController("loop://")
+		assert await controller.open()
+		assert controller.is_open()
+		response = await controller.send_command("AT+PULSECOUNT1?\r\n", expected_lines=1)
+		await controller.close()
+		return response, controller.is_open()
+
+	assert run(exchange()) == ("AT+PULSECOUNT1?\r\n", False)
+
+
+def test_terminated_and_counted_responses_in_one_batch():
+	async def exchange():
+		controller = AsyncSerialController("loop://")
+		await controller.open()
+		responses = await controller.send_batch(["NETWORK: 1\r\nOK\r\n", "0000001A\r\n"], [None, 1])
+		await controller.close()
+		return responses
+
+	assert run(exchange()) == ["NETWORK: 1\r\nOK\r\n", "0000001A\r\n"]
+
+
+def test_flush_drops_unread_bytes():
+	async def exchange():
+		controller = AsyncSerialController("loop://")
+		await controller.open()
+		controller.serial.write(b"stale reply\r\n")
+		await asyncio.sleep(0.05)
+		await controller.flush_buffer()
+		response = await controller.send_command("OK\r\n")
+		await controller.close()
+		return response
+
+	assert run(exchange()) == "OK\r\n"
+
+
+def test_a_line_that_never_goes_quiet_is_given_up():
+	async def noise(controller):
+		for _ in range(400):
+			controller.serial.write(b"\x00")
+			await asyncio.sleep(0.005)
+
+	async def exchange():
+		controller = AsyncSerialController("loop://")
+		await controller.open()
+		task = asyncio.create_task(noise(controller))
+		start = time.monotonic()
+		await controller.send_command("AT+SCHEDULE?\r\n", deadline=0.2)
+		elapsed = time.monotonic() - start
+		task.cancel()
+		await controller.close()
+		return elapsed
+
+	assert 0.2 * READ_LIMIT_FACTOR <= run(exchange()) < 0.2 * READ_LIMIT_FACTOR + 0.2
+
+
+def test_many_ports_wait_concurrently():
+	async def exchange(controller):
+		await controller.open()
+		# no terminator and no line count: the response ends after an idle gap
+		response = await controller.send_command("AT+SCHEDULE?\r\n")
+		await controller.close()
+		return response
+
+	async def gather_all():
+		controllers = [AsyncSerialController("loop://") for _ in range(20)]
+		return await asyncio.gather(*(exchange(controller) for controller in controllers))
+
+	start = time.monotonic()
+	responses = run(gather_all())
+	elapsed = time.monotonic() - start
+	assert responses == ["AT+SCHEDULE?\r\n"] * 20
+	assert elapsed < 5 * IDLE_GAP
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from app.back_logic.decimation import BLOCK_FACTOR, DecimatedSeries
+from app.back_logic.telemetry_store import TelemetrySeries, rate
+
+SAMPLES = 100_000
+
+
+@pytest.fixture(scope="module")
+def capture():
+	rng = np.random.default_rng(0)
+	times = np.cumsum(rng.uniform(0.5, 1.5, SAMPLES))
+	values = rng.normal(size=(SAMPLES, 2)).cumsum(axis=0)
+	return times, values
+
+
+@pytest.fixture(scope="module")
+def series(capture):
+	times, values = capture
+	stored = TelemetrySeries("capture", 2)
+	series = DecimatedSeries(stored)
+	# arriving in uneven pieces, like the chart takes them from the store
+	for start in range(0, SAMPLES, 7777):
+		stored.extend(times[start:start + 7777], values[start:start + 7777])
+		series.update()
+	return series
+
+
+def test_levels_summarize_the_blocks_below(capture, series):
+	times, values = capture
+	for depth in range(len(series.levels)):
+		size = BLOCK_FACTOR ** (depth + 1)
+		starts, ends, minima, maxima = series.blocks(depth)
+		assert len(starts) == SAMPLES // size
+		blocks = values[:len(starts) * size].reshape(len(starts), size, 2)
+		assert starts.tolist() == times[:len(starts) * size:size].tolist()
+		assert ends.tolist() == times[size - 1:len(starts) * size:size].tolist()
+		assert np.array_equal(minima, blocks.min(axis=1))
+		assert np.array_equal(maxima, blocks.max(axis=1))
+
+
+def test_incremental_levels_match_a_single_pass(capture, series):
+	times, values = capture
+	stored = TelemetrySeries("capture", 2)
+	stored.extend(times, values)
+	whole = DecimatedSeries(stored)
+	whole.update()
+	for depth in range(len(whole.levels)):
+		for mine, theirs in zip(series.blocks(depth), whole.blocks(depth)):
+			assert np.array_equal(mine, theirs)
+
+
+def test_full_history_view_costs_about_the_width(capture, series):
+	times, values = capture
+	starts, minima, maxima = series.view(times[0], times[-1], 500)
+	assert len(starts) <= 2 * BLOCK_FACTOR * 500 + BLOCK_FACTOR ** 2
+
+	columns, minima, maxima = series.decimate(times[0], times[-1], 500)
+	assert len(columns) == 500 and columns.tolist() == sorted(columns.tolist())
+	assert np.array_equal(minima.min(axis=0), values.min(axis=0))
+	assert np.array_equal(maxima.max(axis=0), values.max(axis=0))
+
+
+def test_zoomed_in_views_use_the_raw_samples(capture, series):
+	times, values = capture
+	starts, minima, maxima = series.view(times[1000], times[1099], 800)
+	assert starts.tolist() == times[1000:1100].tolist()
+	assert np.array_equal(minima, values[1000:1100])
+	# read from the store, not from a copy of it
+	assert np.shares_memory(minima, series.series.data()[1])
+
+
+def test_rates_are_decimated_without_storing_them():
+	rng = np.random.default_rng(1)
+	times = np.cumsum(rng.uniform(0.5, 1.5, 5000))
+	counts = np.cumsum(rng.integers(0, 50, (5000, 2)), axis=0) % 1000
+	stored = TelemetrySeries("pulses", 2, dtype=np.int64, counter=True, modulus=1000)
+	rates = DecimatedSeries(stored, rates=True)
+	for start in range(0, len(times), 333):
+		stored.extend(times[start:start + 333], counts[start:start + 333])
+		rates.update()
+
+	totals = stored.unwrapped()[1]
+	expected = rate(times, totals)
+	starts, _, minima, maxima = rates.blocks(0)
+	blocks = expected[:len(starts) * BLOCK_FACTOR].reshape(len(starts), BLOCK_FACTOR, 2)
+	assert starts.tolist() == times[1:len(starts) * BLOCK_FACTOR + 1:BLOCK_FACTOR].tolist()
+	assert np.array_equal(minima, blocks.min(axis=1))
+	assert np.array_equal(maxima, blocks.max(axis=1))
+
+	starts, minima, _ = rates.view(times[100], times[150], 800)
+	assert starts.tolist() == times[100:151].tolist()
+	assert np.array_equal(minima, expected[99:150])
+
+	columns, minima, maxima = rates.decimate(times[0], times[-1], 300)
+	assert np.array_equal(minima.min(axis=0), expected.min(axis=0))
+	assert np.array_equal(maxima.max(axis=0), expected.max(axis=0))
+
+
+def test_empty_series():
+	series = DecimatedSeries(TelemetrySeries("empty"))
+	series.update()
+	assert series.time_range() is None
+	columns, minima, maxima = series.decimate(0, 10, 100)
+	assert len(columns) == 0 and minima.shape == (0, 1)
+
+
+def test_any_window_matches_the_raw_samples_in_it(capture, series):
+	times, values = capture
+	rng = np.random.default_rng(3)
+	for _ in range(300):
+		start, end = np.sort(rng.uniform(times[0] - 10, times[-1] + 10, 2))
+		width = int(rng.integers(50, 1000))
+		columns, minima, maxima = series.decimate(start, end, width)
+
+		inside = (times >= start) & (times <= end)
+		if not inside.any():
+			assert len(columns) == 0
+			continue
+		assert np.array_equal(minima.min(axis=0), values[inside].min(axis=0))
+		assert np.array_equal(maxima.max(axis=0), values[inside].max(axis=0))
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from app.back_logic.protocol import MBREGCFG, MSGVAR, OFFSET, PULSECOUNT1, SCHEDULE
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+
+@pytest.fixture
+def port():
+	return FakePort(ECM_REPLIES)
+
+
+@pytest.fixture
+def controller(port):
+	return fake_controller(port)
+
+
+def queries(port) -> list[str]:
+	return [line for line in port.written if line.endswith("?") and line != "AT+DEVID?"]
+
+
+def test_values_are_read_once_and_then_served_from_the_cache(controller, port):
+	registers, slots = controller.cache.read(controller, [MBREGCFG, MSGVAR])
+	assert len(registers) == 10 and slots == {0: 10, 1: 11, 2: None}
+	assert queries(port) == ["AT+MBREGCFG?", "AT+MSGVAR?"]
+	assert controller.cache.device_id == "00ABC123"
+
+	port.written.clear()
+	assert controller.cache.read(controller, [MSGVAR, MBREGCFG]) == [slots, registers]
+	assert controller.cache.peek([MBREGCFG]) == [registers]
+	assert port.written == []
+
+
+def test_only_the_missing_values_are_read(controller, port):
+	controller.cache.read(controller, [OFFSET])
+	port.written.clear()
+	controller.cache.read(controller, [OFFSET, SCHEDULE])
+	assert queries(port) == ["AT+SCHEDULE?"]
+
+
+def test_refresh_reads_again(controller, port):
+	controller.cache.read(controller, [OFFSET])
+	port.replies["AT+OFFSET?"] = "OFFSET: 5\r\nOK\r\n"
+	assert controller.cache.read(controller, [OFFSET]) == [120]
+	assert controller.cache.read(controller, [OFFSET], refresh=True) == [5]
+
+
+def test_writes_invalidate_what_they_change(controller, port):
+	controller.cache.read(controller, [OFFSET, MSGVAR, MBREGCFG])
+	controller.send_command("AT+OFFSET=5\r\nAT+MSGVAR=255\r\n")
+	assert controller.cache.peek([OFFSET]) is None
+	assert controller.cache.peek([MSGVAR]) is None
+	assert controller.cache.peek([MBREGCFG]) is not None
+
+
+def test_values_expire(controller, port):
+	controller.cache.ttl = 0.05
+	controller.cache.read(controller, [OFFSET])
+	time.sleep(0.06)
+	assert controller.cache.peek([OFFSET]) is None
+	port.written.clear()
+	controller.cache.read(controller, [OFFSET])
+	assert queries(port) == ["AT+OFFSET?"]
+
+
+def test_another_device_on_the_port_is_not_served_the_old_values(controller, port):
+	controller.cache.read(controller, [OFFSET])
+	controller.close()
+	controller.serial = FakePort(dict(ECM_REPLIES, **{
+		"AT+DEVID?": "DEVID: 00DEF456\r\nOK\r\n",
+		"AT+OFFSET?": "OFFSET: 7\r\nOK\r\n",
+	}))
+	assert controller.cache.peek([OFFSET]) is None
+	assert controller.cache.read(controller, [OFFSET]) == [7]
+	assert controller.cache.device_id == "00DEF456"
+	assert controller.cache.lookup("00ABC123", OFFSET) == (120,)
+
+
+def test_pulse_counters_are_always_read_from_the_device(controller, port):
+	counts = iter(range(1, 10))
+	port.replies["AT+PULSECOUNT1?"] = lambda command: f"{next(counts):08X}\r\n"
+
+	assert controller.cache.read(controller, [OFFSET, PULSECOUNT1]) == [120, 1]
+	assert controller.cache.read(controller, [OFFSET, PULSECOUNT1]) == [120, 2]
+	assert queries(port) == ["AT+OFFSET?", "AT+PULSECOUNT1?", "AT+PULSECOUNT1?"]
+
+	controller.cache.store(PULSECOUNT1, 99)
+	assert controller.cache.peek([PULSECOUNT1]) is None
+	assert controller.cache.lookup("00ABC123", PULSECOUNT1) is None
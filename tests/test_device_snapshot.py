@@ -0,0 +1,47 @@
+import pytest
+
+from app.back_logic.device_snapshot import SNAPSHOT_COMMANDS, read_snapshot
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+
+@pytest.fixture
+def port():
+	port = FakePort(ECM_REPLIES)
+	port.bursts = []
+	write = port.write
+	port.write = lambda data: port.bursts.append(data.decode("utf-8").splitlines()) or write(data)
+	return port
+
+
+@pytest.fixture
+def controller(port):
+	return fake_controller(port)
+
+
+def test_every_parameter_is_read_in_one_session_and_one_batch(controller, port):
+	snapshot = read_snapshot(controller)
+
+	assert port.written.count("AT+PROGMODE=1") == 1
+	batch = [burst for burst in port.bursts if len(burst) > 1]
+	assert batch == [[command.query().strip() for command in SNAPSHOT_COMMANDS]]
+
+	assert snapshot.device_id == "00ABC123"
+	assert snapshot.network_type == 1
+	assert (snapshot.pulse_count1, snapshot.pulse_count2) == (26, 255)
+	assert snapshot.schedule["on_hour"] == 7 and snapshot.ac_input["end_hour"] == 19
+	assert snapshot.in3_mode == 1 and snapshot.modbus_address == 1
+	assert [register["register_position"] for register in snapshot.registers] == list(range(10))
+	assert snapshot.msgvar == {0: 10, 1: 11, 2: None}
+	assert (snapshot.offset, snapshot.pulse_factor) == (120, 0.5)
+
+
+def test_panels_are_served_from_the_cache_afterwards(controller, port):
+	snapshot = read_snapshot(controller)
+	port.written.clear()
+
+	again = read_snapshot(controller)
+	# only the counters, which change on their own, go to the device again
+	assert [line for line in port.written if line.endswith("?") and line != "AT+DEVID?"] == ["AT+PULSECOUNT1?", "AT+PULSECOUNT2?"]
+	assert again.registers == snapshot.registers
+	assert read_snapshot(controller, refresh=True).device_id == "00ABC123"
+	assert "AT+MBREGCFG?" in port.written
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from app.back_logic import discovery
+from app.back_logic.discovery import discover_devices
+from app.back_logic.serial_controller import SerialController
+from tests.fake_port import FakePort
+
+
+@pytest.fixture
+def ports(monkeypatch):
+	ports = {}
+
+	def connect(port, baudrate=9600, timeout=None, response_deadline=None):
+		if port == "hung":
+			time.sleep(1.0)
+		controller = SerialController(port, baudrate=baudrate, response_deadline=response_deadline)
+		controller.serial = ports.get(port)
+		return controller
+
+	monkeypatch.setattr(discovery, "SerialController", connect)
+	return ports
+
+
+def ecm(device_id, network="1", delay=0.01):
+	return FakePort({
+		"AT+DEVID?": f"DEVID: {device_id}\r\nOK\r\n",
+		"AT+NETWORK?": f"NETWORK: {network}\r\nOK\r\n",
+	}, delay)
+
+
+def test_only_ecm_devices_are_reported(ports):
+	ports["COM4"] = ecm("00ABC123")
+	ports["COM3"] = ecm("00DEF456", network="2")
+	ports["COM5"] = FakePort({"AT+DEVID?": None, "AT+NETWORK?": None})  # a modem that never answers
+	ports["COM6"] = FakePort()  # answers ERROR to everything
+
+	devices = discover_devices(["COM3", "COM4", "COM5", "COM6", "COM7"], budget=1.0)
+
+	assert [(device.port, device.device_id, device.network_type) for device in devices] == [
+		("COM3", "00DEF456", "Celular"),
+		("COM4", "00ABC123", "LoRaWAN"),
+	]
+	assert all(0 < device.latency < 0.5 for device in devices)
+	assert ports["COM4"].written == ["AT+DEVID?", "AT+NETWORK?"]
+
+
+def test_a_hung_port_does_not_hold_up_the_scan(ports):
+	ports["COM1"] = ecm("00ABC123")
+	start = time.monotonic()
+	devices = discover_devices(["hung", "COM1"], budget=0.4)
+	assert time.monotonic() - start < 0.8
+	assert [device.port for device in devices] == ["COM1"]
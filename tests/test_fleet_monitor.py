@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.back_logic.fleet_monitor import FleetMonitor, contactor_state
+from app.back_logic.protocol import NOT_CONFIGURED
+from app.back_logic.serial_controller import SerialController
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+PORTS = ["COM1", "COM2", "COM3", "COM4"]
+
+
+def at(hour: int, minute: int) -> time.struct_time:
+	return time.struct_time((2026, 1, 1, hour, minute, 0, 3, 1, 0))
+
+
+def schedule(on_hour, on_minute, off_hour, off_minute, on_relay=1) -> dict:
+	return {
+		"on_hour": on_hour, "on_minute": on_minute, "on_relay": on_relay,
+		"off_hour": off_hour, "off_minute": off_minute, "off_relay": 1 - on_relay,
+	}
+
+
+@pytest.mark.parametrize("now, state", [((7, 29), "Abierto"), ((7, 30), "Cerrado"), ((18, 45), "Abierto")])
+def test_contactor_follows_the_schedule(now, state):
+	assert contactor_state(schedule(7, 30, 18, 45), at(*now)) == state
+
+
+def test_contactor_schedule_across_midnight():
+	night = schedule(22, 0, 6, 0, on_relay=0)
+	assert contactor_state(night, at(23, 0)) == "Abierto"
+	assert contactor_state(night, at(5, 59)) == "Abierto"
+	assert contactor_state(night, at(12, 0)) == "Cerrado"
+	assert contactor_state(schedule(NOT_CONFIGURED, 0, 6, 0), at(12, 0)) == "No configurado"
+
+
+@pytest.fixture
+def ports(monkeypatch):
+	ports = {port: FakePort(dict(ECM_REPLIES, **{"AT+DEVID?": f"DEVID: 0000000{i + 1}\r\nOK\r\n"})) for i, port in enumerate(PORTS)}
+
+	def open_port(monitor, port):
+		if port not in ports:
+			return SerialController(port)  # nothing there, the port does not open
+		return fake_controller(ports[port])
+
+	monkeypatch.setattr(FleetMonitor, "open_port", open_port)
+	return ports
+
+
+def run_monitor(ports, interval: float, duration: float):
+	updates = []
+	polls = []
+	lock = threading.Lock()
+
+	def on_update(reading):
+		with lock:
+			updates.append(reading)
+
+	monitor = FleetMonitor(list(ports), on_update, interval=interval)
+	poll = monitor.poll
+
+	def timed_poll(controller, port):
+		polls.append((time.monotonic(), port))
+		poll(controller, port)
+
+	monitor.poll = timed_poll
+	monitor.start()
+	time.sleep(duration)
+	monitor.stop()
+	return monitor, updates, polls
+
+
+def test_polls_are_spaced_evenly_across_ports(ports):
+	monitor, updates, polls = run_monitor(PORTS, interval=0.4, duration=1.3)
+
+	# programming mode entry delays the first round, after it the ports take turns
+	steady = polls[len(PORTS):]
+	assert [port for _, port in steady] == [PORTS[i % len(PORTS)] for i in range(len(steady))]
+	assert np.diff([moment for moment, _ in steady]) == pytest.approx(0.1, abs=0.04)
+
+	latest = {reading.port: reading for reading in updates}
+	assert [latest[port].device_id for port in PORTS] == ["1", "2", "3", "4"]
+	assert latest["COM1"].cells()[2:8] == ["26", "255", "07:30", "18:45", latest["COM1"].contactor, "OK"]
+
+
+def test_broken_and_missing_devices_do_not_hold_up_the_others(ports):
+	ports["COM2"].replies["AT+PULSECOUNT1?"] = "garbage\r\n"
+	monitor, updates, polls = run_monitor(PORTS + ["COM9"], interval=0.5, duration=1.5)
+
+	latest = {reading.port: reading.status for reading in updates}
+	assert latest == {"COM1": "OK", "COM2": "Sin respuesta", "COM3": "OK", "COM4": "OK", "COM9": "No disponible"}
+	assert sum(1 for _, port in polls if port == "COM1") >= 2
+
+
+def test_stop_leaves_programming_mode_everywhere(ports):
+	run_monitor(PORTS, interval=0.4, duration=0.5)
+	for port in ports.values():
+		assert port.written.count("AT+PROGMODE=1") == 1
+		assert port.written[-1] == "AT+PROGMODE=0"
+		assert not port.is_open
+
+
+def test_ports_are_released_together(ports):
+	monitor = FleetMonitor(PORTS, lambda reading: None, interval=10)
+	monitor.start()
+	time.sleep(0.6)
+	for port in ports.values():
+		port.delay = 0.3
+
+	start = time.monotonic()
+	monitor.stop()
+	elapsed = time.monotonic() - start
+
+	# one exchange of 0.3 s per port, all of them at the same time
+	assert elapsed < 0.3 * len(PORTS) / 2
+	assert all(port.written[-1] == "AT+PROGMODE=0" for port in ports.values())
+
+
+def test_stopping_is_bounded_by_the_timeout(ports):
+	monitor = FleetMonitor(PORTS, lambda reading: None, interval=10)
+	monitor.start()
+	time.sleep(0.6)
+	ports["COM3"].delay = 3.0
+
+	start = time.monotonic()
+	monitor.stop(timeout=0.5)
+	assert time.monotonic() - start < 1.0
+	assert ports["COM1"].written[-1] == "AT+PROGMODE=0"
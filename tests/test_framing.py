@@ -0,0 +1,103 @@
+import pytest
+
+from app.back_logic.line_framer import LineFramer
+from app.back_logic.serial_controller import ResponseFramer
+
+SCHEDULE = ("AT+SCHEDULE?\r\n", None)
+PULSECOUNT1 = ("AT+PULSECOUNT1?\r\n", 1)
+MBREGCFG = ("AT+MBREGCFG?\r\n", 10)
+MSGVAR = ("AT+MSGVAR?\r\n", None)
+OFFSET = ("AT+OFFSET?\r\n", None)
+
+# a pipelined batch: OK-terminated, one value line without OK, ten lines without OK, OK-terminated
+COMMANDS = [SCHEDULE, PULSECOUNT1, MBREGCFG, MSGVAR]
+RESPONSES = [
+	"07,30,1,18,45,0\r\nOK\r\n",
+	"0000001A\r\n",
+	"".join(f"{i},{i % 2},{100 + i},2,2,60,1,0\r\n" for i in range(10)),
+	"0 - 10\r\n1 - 11\r\n2 - unassigned\r\nOK\r\n",
+]
+STREAM = "".join(RESPONSES).encode("utf-8")
+
+
+def chunks(data: bytes, size: int):
+	return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def frame(data_chunks, commands=COMMANDS, buffer_size=16):
+	rx = LineFramer(buffer_size)
+	framer = ResponseFramer([query for query, _ in commands], [lines for _, lines in commands])
+	for chunk in data_chunks:
+		rx.feed(chunk)
+		for line, valid in rx.lines():
+			framer.feed(line, valid)
+	return framer, framer.finish(rx)
+
+
+def test_line_framer_hands_out_complete_lines_only():
+	rx = LineFramer()
+	rx.feed(b"DEVID: 00AB")
+	assert list(rx.lines()) == []
+	rx.feed(b"C123\r")
+	assert list(rx.lines()) == []
+	rx.feed(b"\nOK\r\nPART")
+	assert list(rx.lines()) == [("DEVID: 00ABC123", True), ("OK", True)]
+	assert rx.pending == 4
+	assert rx.take_partial() == ("PART", True)
+	assert rx.pending == 0
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64])
+def test_line_framer_across_chunk_boundaries(size):
+	expected = [(line, True) for line in "".join(RESPONSES).split("\r\n")[:-1]]
+	rx = LineFramer(8)  # smaller than most lines, so it has to grow
+	lines = []
+	for chunk in chunks(STREAM, size):
+		rx.feed(chunk)
+		lines.extend(rx.lines())
+	assert lines == expected
+	assert rx.framing_errors == 0
+
+
+def test_line_framer_flags_undecodable_lines():
+	rx = LineFramer()
+	rx.feed(b"\xff\xfe,30,1\r\nOK\r\n")
+	(text, valid), ok = list(rx.lines())
+	assert not valid and text.endswith(",30,1")
+	assert ok == ("OK", True)
+	assert rx.framing_errors == 1
+
+
+@pytest.mark.parametrize("size", range(1, 24))
+def test_response_framer_across_chunk_boundaries(size):
+	framer, responses = frame(chunks(STREAM, size))
+	assert responses == [response.removesuffix("\r\n") + "\r\n" for response in RESPONSES]
+	assert not framer.corrupted and not framer.cut_short
+
+
+def test_every_split_point_frames_the_same():
+	_, whole = frame([STREAM])
+	for split in range(1, len(STREAM)):
+		assert frame([STREAM[:split], STREAM[split:]])[1] == whole
+
+
+def test_trailing_ok_is_folded_into_a_counted_response():
+	# a firmware that does end the value line with OK, followed by another query
+	framer, responses = frame([b"0000001A\r\nOK\r\nOFFSET: 5\r\nOK\r\n"], [PULSECOUNT1, OFFSET])
+	assert responses == ["0000001A\r\nOK\r\n", "OFFSET: 5\r\nOK\r\n"]
+
+
+def test_cut_short_response_keeps_what_arrived():
+	data = STREAM[:STREAM.index(b"5,1,105")] + b"5,1,1"
+	framer, responses = frame(chunks(data, 5))
+	assert responses[:2] == RESPONSES[:2]
+	assert responses[2].endswith("5,1,1")
+	assert responses[3] is None
+	assert 2 in framer.cut_short
+
+
+def test_corrupted_response_is_reported():
+	data = STREAM.replace(b"0 - 10", b"\xff - 10")
+	framer, responses = frame(chunks(data, 4))
+	assert framer.corrupted == {3}
+	assert responses[:3] == RESPONSES[:3]
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app.back_logic.latency import MAX_DEADLINE, MIN_DEADLINE, MIN_SAMPLES, LatencyTracker, command_verb
+from app.back_logic.serial_controller import RESPONSE_DEADLINE, SerialController
+from tests.fake_port import FakePort
+
+
+def test_commands_share_a_verb_with_their_arguments():
+	assert command_verb("AT+MBREGCFG=0,1,352,2,2,60,1,0\r\n") == "AT+MBREGCFG="
+	assert command_verb("AT+MBREGCFG?\r\n") == "AT+MBREGCFG?"
+
+
+def test_default_until_there_are_enough_samples():
+	tracker = LatencyTracker(default=1.0)
+	for _ in range(MIN_SAMPLES - 1):
+		tracker.record("AT+DEVID?\r\n", 0.02)
+	assert tracker.deadline("AT+DEVID?\r\n") == 1.0
+	tracker.record("AT+DEVID?\r\n", 0.02)
+	assert tracker.deadline("AT+DEVID?\r\n") == pytest.approx(max(0.02 * 2 + 0.05, MIN_DEADLINE))
+
+
+def test_each_verb_gets_its_own_deadline():
+	tracker = LatencyTracker(default=1.0)
+	for _ in range(10):
+		tracker.record("AT+DEVID?\r\n", 0.02)
+		tracker.record("AT+MBREGCFG?\r\n", 0.4)
+	assert tracker.deadline("AT+DEVID?\r\n") < tracker.deadline("AT+MBREGCFG?\r\n")
+	assert tracker.deadline("AT+MBREGCFG?\r\n") == pytest.approx(0.85)
+	assert tracker.batch_deadline(["AT+DEVID?\r\n", "AT+MBREGCFG?\r\n"]) == tracker.deadline("AT+MBREGCFG?\r\n")
+	assert tracker.deadline("AT+MSGVAR?\r\n") == 1.0
+
+
+def test_deadlines_are_clamped():
+	tracker = LatencyTracker(default=1.0)
+	for _ in range(10):
+		tracker.record("AT+MBREGCFG?\r\n", 10.0)
+	assert tracker.deadline("AT+MBREGCFG?\r\n") == MAX_DEADLINE
+
+
+def test_a_timeout_falls_back_to_the_default():
+	tracker = LatencyTracker(default=1.0)
+	for _ in range(10):
+		tracker.record("AT+DEVID?\r\n", 0.02)
+		tracker.record("AT+OFFSET?\r\n", 0.02)
+	tracker.record_timeout("AT+DEVID?\r\n")
+	assert tracker.deadline("AT+DEVID?\r\n") == 1.0
+	assert tracker.deadline("AT+OFFSET?\r\n") < 1.0
+
+
+def test_a_silent_device_does_not_push_the_deadline_up():
+	tracker = LatencyTracker(default=1.0)
+	for _ in range(20):
+		tracker.record_timeout("AT+DEVID?\r\n")
+	assert tracker.deadline("AT+DEVID?\r\n") == 1.0
+
+
+def test_a_dead_device_is_noticed_within_the_learned_deadline():
+	controller = SerialController("fake")
+	controller.serial = FakePort({"AT+DEVID?": "DEVID: 00ABC123\r\nOK\r\n"}, delay=0.01)
+	for _ in range(MIN_SAMPLES):
+		controller.send_command("AT+DEVID?\r\n")
+
+	controller.serial.replies["AT+DEVID?"] = None
+	start = time.monotonic()
+	# a single attempt, the retries each wait the same learned deadline
+	assert controller.send_command("AT+DEVID?\r\n", retries=0) == ""
+	assert time.monotonic() - start < RESPONSE_DEADLINE / 2
+
+
+def test_samples_are_forgotten_when_the_port_changes():
+	controller = SerialController("fake")
+	controller.serial = FakePort({"AT+DEVID?": "DEVID: 00ABC123\r\nOK\r\n"}, delay=0.01)
+	controller.serial_created = True
+	for _ in range(MIN_SAMPLES):
+		controller.send_command("AT+DEVID?\r\n")
+	assert controller.latency.deadline("AT+DEVID?\r\n") < RESPONSE_DEADLINE
+
+	controller.update_port("other")
+	assert controller.latency.deadline("AT+DEVID?\r\n") == RESPONSE_DEADLINE
@@ -0,0 +1,76 @@
+import pytest
+
+from app.back_logic.profiles import (
+	ProfileError,
+	apply_profile,
+	dumps_binary,
+	load_profile,
+	loads_binary,
+	loads_json,
+	read_profile,
+	save_profile,
+)
+from tests.fake_port import FakeEcm, fake_controller
+
+SOURCE = {
+	"AT+DEVID?": "DEVID: 00SOURCE\r\nOK\r\n",
+	"AT+SCHEDULE?": "06,15,1,20,00,0\r\nOK\r\n",
+	"AT+IN3MODE?": "IN3MODE: RELAY\r\nOK\r\n",
+	"AT+MBADDR?": "MBADDR: 17\r\nOK\r\n",
+	"AT+MBREGCFG?": "".join(f"{i},1,{400 + i},3,4,30,2,1\r\n" for i in range(10)),
+	"AT+MSGVAR?": "0 - 4\r\n1 - 9\r\n2 - 2\r\n3 - unassigned\r\nOK\r\n",
+	"AT+OFFSET?": "OFFSET: 33\r\nOK\r\n",
+	"AT+FPULSE?": "FPULSE: 0.25\r\nOK\r\n",
+}
+
+
+@pytest.fixture
+def profile():
+	return read_profile(fake_controller(FakeEcm(SOURCE)), "Rack A")
+
+
+def test_profile_captures_the_device(profile):
+	config = profile["config"]
+	assert profile["name"] == "Rack A" and profile["source_device"] == "00SOURCE"
+	assert config["schedule"]["on_minute"] == 15 and config["in3_mode"] == 0
+	assert config["msgvar"] == [4, 9, 2]
+	assert config["modbus_address"] == 17 and config["pulse_factor"] == 0.25
+
+
+@pytest.mark.parametrize("file_name", ["rack.json", "rack.ecmp"])
+def test_profile_round_trip_through_a_file(tmp_path, profile, file_name):
+	path = str(tmp_path / file_name)
+	save_profile(path, profile)
+	assert load_profile(path) == profile
+
+
+def test_applied_profile_reads_back_the_same(profile):
+	target = FakeEcm({"AT+DEVID?": "DEVID: 00TARGET\r\nOK\r\n"})
+	controller = fake_controller(target)
+	progress = []
+	assert apply_profile(controller, profile, lambda done, total: progress.append(done)) == []
+	assert target.written.count("AT+PROGMODE=1") == 1
+	assert progress[-1] == len(progress)
+
+	copy = read_profile(controller)
+	assert copy["source_device"] == "00TARGET"
+	assert copy["config"] == profile["config"]
+
+
+@pytest.mark.parametrize("verify", [None, True])
+def test_rejected_writes_are_reported(profile, verify):
+	target = FakeEcm({"AT+OFFSET=33": "ERROR\r\n"})
+	assert apply_profile(fake_controller(target), profile, verify=verify) == [("AT+OFFSET=33", "ERROR")]
+
+
+def test_damaged_profiles_are_refused(profile):
+	data = bytearray(dumps_binary(profile))
+	data[20] ^= 0xFF
+	with pytest.raises(ProfileError, match="checksum"):
+		loads_binary(bytes(data))
+	with pytest.raises(ProfileError):
+		loads_binary(dumps_binary(profile)[:-3])
+	with pytest.raises(ProfileError, match="unknown profile keys"):
+		loads_json('{"format": "ecm-profile", "version": 1, "config": {"baud_rate": 9600}}')
+	with pytest.raises(ProfileError, match="version"):
+		loads_json('{"format": "ecm-profile", "version": 99, "config": {}}')
@@ -0,0 +1,113 @@
+import pytest
+
+from app.back_logic.protocol import (
+	ACINPUT,
+	COMMANDS,
+	DEVID,
+	FPULSE,
+	IN3MODE,
+	MBADDR,
+	MBREGCFG,
+	MSGVAR,
+	MSGVAR_RESET,
+	NETWORK,
+	NOT_CONFIGURED,
+	OFFSET,
+	PULSECOUNT1,
+	SCHEDULE,
+	ResponseError,
+	is_error,
+	is_ok,
+)
+
+REGISTER = {
+	"register_position": 3,
+	"enable_flag": 1,
+	"modbus_register_address": 352,
+	"data_type": 2,
+	"num_bytes": 2,
+	"sampling_frequency": 60,
+	"decimal_positions": 1,
+	"cumulative_flag": 0,
+}
+
+
+def set_arguments(command, *args) -> str:
+	line = command.set(*args)
+	assert line.startswith(command.set_prefix) and line.endswith("\r\n")
+	return line[len(command.set_prefix):-2]
+
+
+@pytest.mark.parametrize("command, value", [
+	(SCHEDULE, {"on_hour": 7, "on_minute": 5, "on_relay": 1, "off_hour": 18, "off_minute": 45, "off_relay": 0}),
+	(SCHEDULE, {"on_hour": NOT_CONFIGURED, "on_minute": 0, "on_relay": 0, "off_hour": 0, "off_minute": 0, "off_relay": 1}),
+	(ACINPUT, {"start_hour": 6, "start_minute": 0, "end_hour": 19, "end_minute": 30}),
+	(MBADDR, 17),
+	(OFFSET, 120),
+	(FPULSE, 0.5),
+])
+def test_set_arguments_parse_back_as_the_query_value(command, value):
+	# the device answers a query with the same text the set command takes
+	assert command.parse(set_arguments(command, value) + "\r\nOK\r\n") == value
+
+
+def test_register_round_trip():
+	row = set_arguments(MBREGCFG, REGISTER)
+	assert row == "3,1,352,2,2,60,1,0"
+	assert MBREGCFG.parse(row + "\r\n") == [REGISTER]
+	# an already formatted row is sent as it is
+	assert set_arguments(MBREGCFG, row) == row
+
+
+def test_time_fields_are_zero_padded():
+	schedule = {"on_hour": 7, "on_minute": 5, "on_relay": 1, "off_hour": 18, "off_minute": 0, "off_relay": 0}
+	assert SCHEDULE.set(schedule) == "AT+SCHEDULE=07,05,1,18,00,0\r\n"
+
+
+def test_in3_mode_is_written_through_config():
+	assert IN3MODE.set(1) == "AT+CONFIG=16,00\r\n"
+	assert IN3MODE.set(0) == "AT+CONFIG=00,00\r\n"
+	assert IN3MODE.parse("IN3MODE: OPENING_DETECTION\r\nOK\r\n") == 1
+	assert IN3MODE.parse("IN3MODE: RELAY\r\nOK\r\n") == 0
+
+
+@pytest.mark.parametrize("command, response, value", [
+	(NETWORK, "NETWORK: 1\r\nOK\r\n", 1),
+	(DEVID, "DEVID: 00ABC123\r\nOK\r\n", "00ABC123"),
+	(PULSECOUNT1, "0000001A\r\n", 26),
+	(OFFSET, "OFFSET: 12.5\r\nOK\r\n", 12.5),
+	(MBADDR, "MBADDR: 5\r\nOK\r\n", 5),
+	(SCHEDULE, "07,30,1,18,45,0,\r\nOK\r\n", {
+		"on_hour": 7, "on_minute": 30, "on_relay": 1, "off_hour": 18, "off_minute": 45, "off_relay": 0,
+	}),
+])
+def test_parse_responses(command, response, value):
+	assert command.parse(response) == value
+
+
+def test_msgvar_slots():
+	slots = MSGVAR.parse("0 - 10\r\n1 - 11\r\n2 - unassigned\r\nOK\r\n")
+	assert slots == {0: 10, 1: 11, 2: None}
+	assert MSGVAR.set(MSGVAR_RESET) == "AT+MSGVAR=255\r\n"
+
+
+@pytest.mark.parametrize("response", [None, "ERROR\r\n", "OK\r\n", "NETWORK: 1\r\nOK\r\n"])
+def test_bad_device_id_responses_raise(response):
+	with pytest.raises(ResponseError):
+		DEVID.parse(response)
+
+
+def test_parse_errors_name_the_command():
+	with pytest.raises(ResponseError, match="^SCHEDULE: "):
+		SCHEDULE.parse("07,30\r\nOK\r\n")
+
+
+def test_ok_and_error():
+	assert is_ok("OK\r\n") and not is_ok(None) and not is_ok("ERROR\r\n")
+	assert is_error("+CME ERROR\r\n") and not is_error("OK\r\n") and not is_error(None)
+
+
+def test_registry_covers_every_query_once():
+	queries = [command.query() for command in COMMANDS.values() if command.query() is not None]
+	assert len(queries) == len(set(queries))
+	assert all(query.startswith("AT+") and query.endswith("?\r\n") for query in queries)
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from app.back_logic import provisioning
+from app.back_logic.provisioning import build_commands, provision_fleet
+from app.back_logic.serial_controller import SerialController
+from tests.fake_port import FakePort
+
+CONFIG = {
+	"schedule": {"on_hour": 7, "on_minute": 30, "on_relay": 1, "off_hour": 18, "off_minute": 45, "off_relay": 0},
+	"in3_mode": 1,
+	"modbus_registers": ["0,1,352,2,2,60,1,0", "1,1,354,2,2,60,1,0"],
+	"msgvar": [3, 4],
+	"offset": 120,
+}
+
+
+@pytest.fixture
+def ports(monkeypatch):
+	ports = {}
+
+	def connect(port, baudrate=None):
+		controller = SerialController(port, baudrate=baudrate)
+		controller.serial = ports.get(port)
+		return controller
+
+	monkeypatch.setattr(provisioning, "SerialController", connect)
+	return ports
+
+
+def add_device(ports, name, device_id, delay=0.01):
+	ports[name] = FakePort({"AT+DEVID?": f"DEVID: {device_id}\r\nOK\r\n"}, delay)
+	return ports[name]
+
+
+def test_commands_follow_the_panel_order():
+	assert build_commands(CONFIG) == [
+		"AT+SCHEDULE=07,30,1,18,45,0\r\n",
+		"AT+CONFIG=16,00\r\n",
+		"AT+MBREGCFG=0,1,352,2,2,60,1,0\r\n",
+		"AT+MBREGCFG=1,1,354,2,2,60,1,0\r\n",
+		"AT+MSGVAR=255\r\n",  # the payload is rebuilt from scratch
+		"AT+MSGVAR=3\r\n",
+		"AT+MSGVAR=4\r\n",
+		"AT+OFFSET=120\r\n",
+	]
+	assert build_commands({}) == []
+
+
+def test_every_device_gets_the_configuration_and_a_report(ports):
+	for index in range(4):
+		add_device(ports, f"port{index}", f"0000000{index}")
+	add_device(ports, "port4", "00000004").replies["AT+OFFSET=120"] = "ERROR\r\n"
+
+	results = provision_fleet(["port0", "port1", "port2", "port3", "port4", "missing"], CONFIG)
+
+	assert [result.port for result in results] == ["port0", "port1", "port2", "port3", "port4", "missing"]
+	assert [result.device_id for result in results[:5]] == [f"0000000{index}" for index in range(5)]
+	assert all(result.success and result.sent == 8 for result in results[:4])
+	assert results[4].failures == [("AT+OFFSET=120", "ERROR")]
+	assert results[5].error is not None and not results[5].success
+	for name in ["port0", "port4"]:
+		written = ports[name].written
+		assert written[0] == "AT+PROGMODE=1" and written[-1] == "AT+PROGMODE=0"
+		assert [line + "\r\n" for line in written if "=" in line][1:-1] == build_commands(CONFIG)
+
+
+def test_devices_are_provisioned_concurrently(ports):
+	names = [f"port{index}" for index in range(8)]
+	for index, name in enumerate(names):
+		add_device(ports, name, f"0000000{index}", delay=0.03)
+
+	start = time.monotonic()
+	results = provision_fleet(names, CONFIG)
+	elapsed = time.monotonic() - start
+
+	assert all(result.success for result in results)
+	assert elapsed < 2 * max(result.elapsed for result in results)
+	assert elapsed < sum(result.elapsed for result in results) / 3
@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.back_logic.pulse_monitor import COUNTER_MODULUS, PulseMonitor, PulseRing
+from app.back_logic.serial_worker import SerialWorker
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+
+def counting(port, step: int):
+	count = 0
+
+	def answer(command):
+		nonlocal count
+		count += step
+		return f"{count:08X}\r\n"
+
+	port.replies["AT+PULSECOUNT1?"] = answer
+
+
+@pytest.fixture
+def port():
+	port = FakePort(ECM_REPLIES, delay=0.002)
+	counting(port, 3)
+	return port
+
+
+@pytest.fixture
+def worker(port):
+	worker = SerialWorker(fake_controller(port))
+	yield worker
+	worker.stop(timeout=5)
+
+
+def test_ring_keeps_the_last_samples_in_constant_memory():
+	ring = PulseRing(capacity=4)
+	buffers = (ring.times, ring.counts)
+	for second in range(6):
+		ring.append(float(second), second * 10, 0)
+
+	times, counts = ring.samples()
+	assert len(ring) == 4
+	assert times.tolist() == [2.0, 3.0, 4.0, 5.0]
+	assert counts[:, 0].tolist() == [20, 30, 40, 50]
+	assert ring.samples(last=2)[0].tolist() == [4.0, 5.0]
+	assert ring.latest()[0] == 5.0
+	assert (ring.times, ring.counts) == buffers
+
+
+def test_rates_survive_a_counter_wrap():
+	ring = PulseRing(capacity=16)
+	for second, count in enumerate([COUNTER_MODULUS - 20, COUNTER_MODULUS - 10, 0, 10]):
+		ring.append(float(second), count, 2 * second)
+
+	instant, windowed = ring.rates(window=60)
+	assert instant.tolist() == [10.0, 2.0]
+	assert windowed.tolist() == [10.0, 2.0]
+
+
+def test_windowed_rate_only_covers_the_window():
+	ring = PulseRing(capacity=16)
+	for second in range(10):
+		ring.append(float(second), 100 * second if second < 5 else 500 + second, 0)
+
+	instant, windowed = ring.rates(window=3)
+	assert instant[0] == 1.0
+	# from the sample just before the window start (t=6) to t=9
+	assert windowed[0] == pytest.approx(1.0)
+	assert ring.rates(window=60)[1][0] == pytest.approx(509 / 9)
+
+
+def test_monitor_samples_steadily_in_one_programming_mode_session(worker, port):
+	monitor = PulseMonitor(worker, interval=0.2)
+	monitor.start()
+	time.sleep(1.3)
+	# done once the device has left programming mode
+	monitor.stop().result(timeout=5)
+
+	times, counts = monitor.ring.samples()
+	# entering programming mode takes the first tick or two
+	assert 4 <= len(times) <= 7
+	assert np.diff(counts[:, 0]).tolist() == [3] * (len(times) - 1)
+	assert np.diff(times)[1:] == pytest.approx(0.2, abs=0.05)
+	assert port.written.count("AT+PROGMODE=1") == 1
+	assert port.written[-1] == "AT+PROGMODE=0"
+	assert not monitor.running
+	assert monitor.stop() is None
+
+
+def test_slow_device_skips_ticks_instead_of_queueing_polls(worker, port):
+	port.delay = 0.1
+	monitor = PulseMonitor(worker, interval=0.1)
+	monitor.start()
+	time.sleep(0.8)
+	monitor.stop().result(timeout=5)
+
+	# each poll is two queries, 0.2 s on this device
+	assert monitor.skipped > 0
+	assert port.written.count("AT+PULSECOUNT1?") <= 5
+
+
+def test_jobs_submitted_after_stop_run_once_programming_mode_is_left(worker, port):
+	monitor = PulseMonitor(worker, interval=0.1)
+	monitor.start()
+	time.sleep(0.3)
+	monitor.stop()
+	# nothing waits on the exit: the close is queued behind it on the worker
+	closed = worker.submit(lambda controller: (controller.progmode_depth, list(port.written)))
+	depth, written = closed.result(timeout=5)
+	assert depth == 0
+	assert written[-1] == "AT+PROGMODE=0"
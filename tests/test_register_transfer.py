@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from app.back_logic import write_journal
+from app.back_logic.protocol import ResponseError
+from app.back_logic.register_transfer import read_registers, registers_journal, write_registers
+from app.back_logic.write_journal import journal_path
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+ROWS = [f"{i},1,{300 + i},2,2,60,1,0" for i in range(10)]
+
+
+@pytest.fixture
+def port():
+	port = FakePort(ECM_REPLIES, delay=0.005)
+	port.bursts = []
+	write = port.write
+	port.write = lambda data: port.bursts.append(data.decode("utf-8").count("\r\n")) or write(data)
+	return port
+
+
+@pytest.fixture
+def controller(port):
+	return fake_controller(port)
+
+
+def reject(port, row: int, times: int):
+	rejections = iter(range(times))
+	port.replies[f"AT+MBREGCFG={ROWS[row]}"] = lambda command: "ERROR\r\n" if next(rejections, None) is not None else "OK\r\n"
+
+
+def test_rows_stream_within_the_window(controller, port):
+	progress = []
+	failures = write_registers(controller, ROWS, window=3, on_progress=lambda *args: progress.append(args))
+	assert failures == {}
+	assert port.written == [f"AT+MBREGCFG={row}" for row in ROWS]
+	assert port.bursts[0] == 3 and sum(port.bursts) == 10
+	assert progress == [(done + 1, 10, done) for done in range(10)]
+
+
+def test_rejected_rows_are_retried_on_their_own(controller, port):
+	reject(port, 3, times=1)
+	reject(port, 7, times=1)
+	assert write_registers(controller, ROWS, window=4) == {}
+	assert port.written[10:] == [f"AT+MBREGCFG={ROWS[3]}", f"AT+MBREGCFG={ROWS[7]}"]
+
+
+def test_journaled_retries_leave_no_journal_behind(controller, port, tmp_path, monkeypatch):
+	monkeypatch.setattr(write_journal, "JOURNAL_DIR", str(tmp_path))
+	reject(port, 3, times=1)
+	journal = registers_journal(controller, ROWS)
+	assert write_registers(controller, ROWS, window=4, journal=journal) == {}
+	rows = [line for line in port.written if line.startswith("AT+MBREGCFG=")]
+	assert rows[10:] == [f"AT+MBREGCFG={ROWS[3]}"]
+	assert not os.path.exists(journal_path(journal.device_id))
+
+
+def test_failures_name_the_register_positions(controller, port):
+	reject(port, 5, times=5)
+	assert write_registers(controller, ROWS, window=4, retries=1) == {5: "ERROR"}
+	assert port.written.count(f"AT+MBREGCFG={ROWS[5]}") == 2
+
+
+def test_unanswered_rows_are_failures(controller, port):
+	port.replies[f"AT+MBREGCFG={ROWS[9]}"] = None
+	assert write_registers(controller, ROWS, retries=0) == {9: ""}
+
+
+def test_registers_are_yielded_as_their_lines_arrive(controller, port):
+	port.delay = 0.02
+	port.replies["AT+MBREGCFG?"] = [f"{row}\r\n" for row in ROWS]
+
+	arrivals = []
+	for register in read_registers(controller):
+		arrivals.append((time.monotonic(), register["register_position"]))
+
+	assert [position for _, position in arrivals] == list(range(10))
+	assert arrivals[-1][0] - arrivals[0][0] >= 8 * port.delay
+
+
+def test_a_rejected_read_raises(controller, port):
+	port.replies["AT+MBREGCFG?"] = "ERROR\r\n"
+	with pytest.raises(ResponseError):
+		list(read_registers(controller))
@@ -0,0 +1,106 @@
+import pytest
+
+from app.back_logic.protocol import DEVID, NETWORK, OFFSET, PULSECOUNT1, ResponseError, read_value, read_values
+from app.back_logic.register_transfer import read_registers
+from tests.fake_port import ECM_REPLIES, FakePort, fake_controller
+
+
+@pytest.fixture
+def port():
+	return FakePort(ECM_REPLIES, delay=0.005)
+
+
+@pytest.fixture
+def controller(port):
+	controller = fake_controller(port)
+	controller.response_deadline = controller.latency.default = 0.1
+	return controller
+
+
+def once(port, command: str, first):
+	"""
+	The device answers `command` with `first` the first time, normally afterwards.
+	"""
+	answers = iter([first])
+	normal = port.replies[command]
+	port.replies[command] = lambda line: next(answers, normal)
+
+
+def late(port, command: str, delay: float):
+	normal = port.replies[command]
+
+	def answer(line):
+		port.busy_until += delay
+		port.replies[command] = normal
+		return normal
+
+	port.replies[command] = answer
+
+
+def test_garbled_reply_is_asked_again(controller, port):
+	once(port, "AT+DEVID?", b"\xff\xfeVID: 00ABC123\r\nOK\r\n")
+	assert read_value(controller, DEVID) == "00ABC123"
+	assert port.written == ["AT+DEVID?", "AT+DEVID?"]
+
+
+def test_send_command_retries_a_damaged_query_but_not_a_write(controller, port):
+	once(port, "AT+OFFSET?", b"OFFSET: 1\xff0\r\nOK\r\n")
+	assert controller.send_command("AT+OFFSET?\r\n") == "OFFSET: 120\r\nOK\r\n"
+
+	port.replies["AT+OFFSET=5"] = None
+	assert controller.send_command("AT+OFFSET=5\r\n") == ""
+	assert port.written == ["AT+OFFSET?", "AT+OFFSET?", "AT+OFFSET=5"]
+
+
+def test_only_the_damaged_replies_of_a_batch_are_asked_again(controller, port):
+	once(port, "AT+OFFSET?", b"OFFSET: 1\xff0\r\nOK\r\n")
+	assert read_values(controller, [DEVID, OFFSET, PULSECOUNT1]) == ["00ABC123", 120, 26]
+	assert port.written == ["AT+DEVID?", "AT+OFFSET?", "AT+PULSECOUNT1?", "AT+OFFSET?"]
+
+
+def test_a_late_reply_does_not_leak_into_the_next_query(controller, port):
+	late(port, "AT+DEVID?", 0.25)
+	assert read_values(controller, [DEVID, NETWORK]) == ["00ABC123", 1]
+	# the late DEVID reply was drained, not taken as the next answer
+	assert read_value(controller, NETWORK) == 1
+
+
+def test_an_error_is_a_final_answer(controller, port):
+	port.replies["AT+OFFSET?"] = "ERROR\r\n"
+	with pytest.raises(ResponseError):
+		read_value(controller, OFFSET)
+	assert port.written == ["AT+OFFSET?"]
+
+
+def test_writes_are_never_sent_twice(controller, port):
+	port.replies["AT+OFFSET=5"] = None
+	port.replies["AT+DEVID?"] = None
+	responses = controller.send_batch(["AT+OFFSET=5\r\n", "AT+DEVID?\r\n"])
+	assert responses == [None, None]
+	assert port.written.count("AT+OFFSET=5") == 1
+	assert port.written.count("AT+DEVID?") == 3
+
+
+def test_giving_up_raises(controller, port):
+	port.replies["AT+DEVID?"] = "garbage\r\n"
+	with pytest.raises(ResponseError):
+		read_value(controller, DEVID)
+	assert port.written.count("AT+DEVID?") == 3
+
+
+ROWS = [f"{i},1,{300 + i},2,2,60,1,0\r\n" for i in range(10)]
+
+
+def test_streamed_rows_are_resumed_after_a_garbled_line(controller, port):
+	garbled = ROWS[:4] + [b"\xff\xfe1,300,2,2,60,1,0\r\n"] + ROWS[5:]
+	once(port, "AT+MBREGCFG?", garbled)
+	registers = list(read_registers(controller))
+	assert [register["register_position"] for register in registers] == list(range(10))
+	assert port.written == ["AT+MBREGCFG?", "AT+MBREGCFG?"]
+
+
+def test_streamed_reply_cut_short_is_asked_again(controller, port):
+	once(port, "AT+MBREGCFG?", ROWS[:6] + ["6,1,30"])
+	registers = list(read_registers(controller))
+	assert [register["register_position"] for register in registers] == list(range(10))
+	assert port.written.count("AT+MBREGCFG?") == 2
@@ -0,0 +1,148 @@
+import time
+
+import pytest
+
+from app.back_logic.serial_controller import IDLE_GAP, READ_LIMIT_FACTOR, SerialController, cached_baud_rate
+from tests.fake_port import FakePort
+
+REPLIES = {
+	"AT+DEVID?": "DEVID: 00ABC123\r\nOK\r\n",
+	"AT+PULSECOUNT1?": "0000001A\r\n",
+	"AT+SCHEDULE?": "07,30,1,18,45,0\r\n",
+}
+
+
+@pytest.fixture
+def port():
+	return FakePort(REPLIES, delay=0.02)
+
+
+@pytest.fixture
+def controller(port):
+	controller = SerialController("fake")
+	controller.serial = port
+	controller.serial_created = True
+	return controller
+
+
+def timed(call, *args, **kwargs):
+	start = time.monotonic()
+	result = call(*args, **kwargs)
+	return result, time.monotonic() - start
+
+
+def test_returns_on_the_terminating_line(controller, port):
+	response, elapsed = timed(controller.send_command, "AT+DEVID?\r\n")
+	assert response == "DEVID: 00ABC123\r\nOK\r\n"
+	assert port.written == ["AT+DEVID?"]
+	assert elapsed < IDLE_GAP
+
+
+def test_returns_after_the_expected_lines(controller):
+	response, elapsed = timed(controller.send_command, "AT+PULSECOUNT1?\r\n", expected_lines=1)
+	assert response == "0000001A\r\n"
+	# a bare OK may still follow the counted line, that is worth one idle gap at most
+	assert elapsed < 2 * IDLE_GAP
+
+
+def test_idle_gap_ends_an_unterminated_response(controller):
+	response, elapsed = timed(controller.send_command, "AT+SCHEDULE?\r\n", deadline=2.0)
+	assert response == "07,30,1,18,45,0\r\n"
+	assert IDLE_GAP <= elapsed < 1.0
+
+
+def test_silent_device_gives_up_at_the_deadline(controller, port):
+	port.replies["AT+DEVID?"] = None
+	response, elapsed = timed(controller.send_command, "AT+DEVID?\r\n", deadline=0.2, retries=0)
+	assert response == ""
+	assert 0.2 <= elapsed < 0.5
+
+
+def test_a_line_that_never_goes_quiet_is_given_up(controller, port):
+	# two seconds of noise without a line break, a few milliseconds apart
+	port.replies["AT+DEVID?"] = [b"\x00\xff"] * int(2.0 / port.delay)
+	response, elapsed = timed(controller.send_command, "AT+DEVID?\r\n", deadline=0.2, retries=0)
+	assert not response.endswith("OK\r\n")
+	assert 0.2 * READ_LIMIT_FACTOR <= elapsed < 0.2 * READ_LIMIT_FACTOR + 0.2
+
+
+def test_slow_device_is_waited_for(controller, port):
+	port.delay = 0.3
+	response, elapsed = timed(controller.send_command, "AT+DEVID?\r\n")
+	assert response == "DEVID: 00ABC123\r\nOK\r\n"
+	assert elapsed >= 0.3
+
+
+def test_batch_splits_the_stream_into_one_response_per_command(controller, port):
+	bursts = []
+	write = port.write
+	port.write = lambda data: bursts.append(data) or write(data)
+
+	commands = ["AT+DEVID?\r\n", "AT+PULSECOUNT1?\r\n", "AT+OFFSET=5\r\n", "AT+SCHEDULE?\r\n"]
+	responses = controller.send_batch(commands, [None, 1, None, 1])
+	assert responses == ["DEVID: 00ABC123\r\nOK\r\n", "0000001A\r\n", "OK\r\n", "07,30,1,18,45,0\r\n"]
+	assert len(bursts) == 1
+
+
+def test_batch_reports_partial_results_when_the_device_drops_out(controller, port):
+	port.replies["AT+MBREGCFG?"] = "".join(f"{i},1,{100 + i},2,2,60,1,0\r\n" for i in range(4))
+	port.replies["AT+PULSECOUNT2?"] = None
+	commands = ["AT+DEVID?\r\n", "AT+MBREGCFG?\r\n", "AT+PULSECOUNT2?\r\n"]
+	responses = controller.send_batch(commands, [None, 10, 1], deadline=0.3)
+	assert responses[0] == "DEVID: 00ABC123\r\nOK\r\n"
+	assert responses[1].splitlines() == [f"{i},1,{100 + i},2,2,60,1,0" for i in range(4)]
+	assert responses[2] is None
+
+
+def test_nested_programming_mode_switches_once(controller, port):
+	with controller.programming_mode():
+		controller.send_command("AT+PULSECOUNT1?\r\n", expected_lines=1)
+		with controller.programming_mode():
+			controller.send_command("AT+OFFSET=5\r\n")
+		assert "AT+PROGMODE=0" not in port.written
+	assert port.written == [
+		"AT+PROGMODE=1", "AT+DEVID?", "AT+PULSECOUNT1?", "AT+OFFSET=5", "AT+PROGMODE=0",
+	]
+
+
+def test_programming_mode_is_left_when_the_block_fails(controller, port):
+	with pytest.raises(RuntimeError):
+		with controller.programming_mode():
+			raise RuntimeError("panel failed")
+	assert port.written[-1] == "AT+PROGMODE=0"
+	assert controller.progmode_depth == 0
+
+
+def test_entering_programming_mode_waits_for_the_device(controller, port):
+	answers = iter(["", "", "DEVID: 00ABC123\r\nOK\r\n"])
+	port.replies["AT+DEVID?"] = lambda command: next(answers)
+	controller.response_deadline = 0.1
+	assert controller.enter_programming_mode()
+	assert port.written == ["AT+PROGMODE=1", "AT+DEVID?", "AT+DEVID?", "AT+DEVID?"]
+
+
+def baud_dependent_port(baudrate):
+	port = FakePort()
+	# at any other rate the reply arrives as noise
+	port.replies["AT+DEVID?"] = lambda command: (
+		"DEVID: 00ABC123\r\nOK\r\n" if port.baudrate == baudrate else b"\xf8\x80\xfe\x00\r\n\xe0\r\n"
+	)
+	return port
+
+
+def test_baud_rate_is_detected_and_remembered(controller):
+	controller.serial = baud_dependent_port(38400)
+	assert controller.detect_baud_rate() == 38400
+	assert controller.baudrate == 38400
+	assert cached_baud_rate("fake") == 38400
+
+	# the next connection starts with the rate that worked
+	controller.update_baud_rate(9600)
+	assert controller.baud_rate_candidates()[0] == 38400
+
+
+def test_baud_rate_is_kept_when_nothing_answers(controller, port):
+	port.replies["AT+DEVID?"] = None
+	assert controller.detect_baud_rate(deadline=0.05) is None
+	assert controller.baudrate == 9600
+	assert cached_baud_rate("fake") is None
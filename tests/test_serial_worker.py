@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from app.back_logic.serial_worker import SerialWorker
+
+
+@pytest.fixture
+def worker():
+	worker = SerialWorker(controller="controller")
+	yield worker
+	worker.stop(timeout=5)
+
+
+def test_jobs_run_in_order_on_the_worker_thread(worker):
+	threads = []
+	order = []
+
+	def job(index):
+		def run(controller):
+			assert controller == "controller"
+			threads.append(threading.current_thread().name)
+			order.append(index)
+			return index
+		return run
+
+	futures = [worker.submit(job(index)) for index in range(5)]
+	assert [future.result(timeout=5) for future in futures] == list(range(5))
+	assert order == list(range(5))
+	assert set(threads) == {"serial-worker"}
+
+
+def test_failures_end_up_in_the_future_and_the_callback_still_runs(worker):
+	done = []
+	finished = threading.Event()
+
+	def on_done(future):
+		done.append(future)
+		finished.set()
+
+	future = worker.submit(lambda controller: 1 / 0, on_done)
+	assert finished.wait(5)
+	assert done == [future]
+	with pytest.raises(ZeroDivisionError):
+		future.result()
+	# the worker keeps going after a failed job
+	assert worker.submit(lambda controller: "next").result(timeout=5) == "next"
+
+
+def test_callbacks_go_through_dispatch():
+	dispatched = []
+	worker = SerialWorker("controller", dispatch=lambda fn, *args: dispatched.append((fn, args)))
+	worker.post(print, "progress")
+	future = worker.submit(lambda controller: None, print)
+	worker.stop(timeout=5)
+	assert dispatched == [(print, ("progress",)), (print, (future,))]
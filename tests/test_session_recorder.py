@@ -0,0 +1,114 @@
+import pytest
+
+from app.back_logic import session_recorder
+from app.back_logic.protocol import PULSECOUNT1, PULSECOUNT2
+from app.back_logic.session_recorder import (
+	COMMAND_IDS,
+	RECEIVED,
+	SAMPLE,
+	SENT,
+	SessionReader,
+	SessionRecorder,
+)
+
+START = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def small_index(monkeypatch):
+	# small blocks, so a few hundred records already span several of them
+	monkeypatch.setattr(session_recorder, "INDEX_INTERVAL", 64)
+	monkeypatch.setattr(session_recorder, "INDEX_STRIDE", 8)
+
+
+def record_samples(recorder, count: int):
+	for second in range(count):
+		recorder.record_sample(COMMAND_IDS[PULSECOUNT1.name], [second], START + second)
+
+
+def test_exchanges_and_samples_read_back(tmp_path):
+	path = str(tmp_path / "session.ecms")
+	recorder = SessionRecorder(path)
+	recorder.record_sent("AT+PULSECOUNT1?\r\nAT+CONFIG=16,00\r\n")
+	recorder.record_received("AT+PULSECOUNT1?\r\n", "0000001A")
+	recorder.record_received("", "OK")
+	recorder.record_pulses(START, 26, 255)
+	recorder.close()
+
+	with SessionReader(path) as reader:
+		records = list(reader.records())
+
+	assert [(record.direction, record.command_name) for record in records] == [
+		(SENT, "PULSECOUNT1"),
+		(SENT, "IN3MODE"),
+		(RECEIVED, "PULSECOUNT1"),
+		(RECEIVED, "IN3MODE"),  # a reply without its command goes with the last line sent
+		(SAMPLE, "PULSECOUNT1"),
+		(SAMPLE, "PULSECOUNT2"),
+	]
+	assert records[1].payload == b"AT+CONFIG=16,00"
+	assert records[2].payload == b"0000001A"
+	assert list(records[4].values()) == [26.0]
+	assert records[5].command == COMMAND_IDS[PULSECOUNT2.name]
+	assert records[5].timestamp == START
+
+
+def test_time_range_and_seek(tmp_path):
+	path = str(tmp_path / "session.ecms")
+	recorder = SessionRecorder(path)
+	record_samples(recorder, 1000)
+	recorder.close()
+
+	with SessionReader(path) as reader:
+		assert len(reader.blocks) > 10
+		assert reader.time_range() == (START, START + 999)
+		seconds = [record.values()[0] for record in reader.records(START + 123.5, START + 130)]
+		assert seconds == list(range(124, 131))
+		assert [record.values()[0] for record in reader.records(START + 995)] == [995, 996, 997, 998, 999]
+		assert next(reader.records(START - 10)).values()[0] == 0
+		assert list(reader.records(START + 2000)) == []
+
+
+def test_seeks_read_at_most_a_stride(tmp_path, monkeypatch):
+	path = str(tmp_path / "session.ecms")
+	recorder = SessionRecorder(path)
+	record_samples(recorder, 500)
+	recorder.file.flush()  # still recording: the last records have no index block yet
+
+	scanned = 0
+	scan = SessionReader.scan
+
+	def counting_scan(reader, offset):
+		nonlocal scanned
+		for item in scan(reader, offset):
+			scanned += 1
+			yield item
+
+	with SessionReader(path) as reader:
+		assert len(reader.tail)
+		monkeypatch.setattr(SessionReader, "scan", counting_scan)
+		for second in range(0, 500, 3):
+			scanned = 0
+			assert next(reader.records(START + second)).values()[0] == second
+			assert scanned <= session_recorder.INDEX_STRIDE + 1
+	recorder.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+	path = str(tmp_path / "session.ecms")
+	recorder = SessionRecorder(path)
+	record_samples(recorder, 100)
+	recorder.close()
+	with open(path, "ab") as log:
+		log.write(b"\x02\x00\x00\x00")
+
+	with SessionReader(path) as reader:
+		assert sum(1 for _ in reader.records()) == 100
+		assert reader.time_range() == (START, START + 99)
+
+
+def test_other_files_are_rejected(tmp_path):
+	path = tmp_path / "other.bin"
+	path.write_bytes(b"not a session log")
+	with pytest.raises(ValueError):
+		SessionReader(str(path))
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from app.back_logic.pulse_monitor import COUNTER_MODULUS
+from app.back_logic.telemetry_store import (
+	CHUNK_SIZE,
+	PULSE_SERIES,
+	TelemetrySeries,
+	TelemetryStore,
+	moving_average,
+	unwrap_counter,
+	windowed_rate,
+)
+
+
+def test_series_grows_by_chunks_and_keeps_earlier_views():
+	series = TelemetrySeries("power")
+	series.append(0.0, 1.5)
+	times, values = series.data()
+
+	series.extend(np.arange(1, 3 * CHUNK_SIZE), np.arange(1, 3 * CHUNK_SIZE) * 2.0)
+	assert len(series) == 3 * CHUNK_SIZE
+	assert len(series.times) % CHUNK_SIZE == 0
+	assert (times[0], values[0, 0]) == (0.0, 1.5)
+
+	times, values = series.data()
+	assert times[-1] == 3 * CHUNK_SIZE - 1
+	assert values[-1, 0] == 2.0 * (3 * CHUNK_SIZE - 1)
+
+
+def test_counter_wraps_are_undone():
+	values = np.array([[COUNTER_MODULUS - 2, 5], [COUNTER_MODULUS - 1, 6], [3, 6], [10, 7]])
+	assert unwrap_counter(values).tolist() == [
+		[COUNTER_MODULUS - 2, 5], [COUNTER_MODULUS - 1, 6], [COUNTER_MODULUS + 3, 6], [COUNTER_MODULUS + 10, 7],
+	]
+
+
+def test_rates_of_a_counter():
+	store = TelemetryStore()
+	for second, count in enumerate([COUNTER_MODULUS - 10, 0, 20, 50]):
+		store.record_pulses(100.0 + second, count, second)
+
+	times, rates = store[PULSE_SERIES].rate()
+	assert times.tolist() == [101.0, 102.0, 103.0]
+	assert rates[:, 0].tolist() == [10.0, 20.0, 30.0]
+
+	times, windowed = store[PULSE_SERIES].moving_average(2.0)
+	assert np.isnan(windowed[0, 0])
+	assert windowed[1:, 0].tolist() == [10.0, 15.0, 25.0]
+
+
+def test_moving_average_matches_a_plain_loop():
+	rng = np.random.default_rng(1)
+	times = np.cumsum(rng.uniform(0.1, 2.0, 500))
+	values = rng.normal(size=500)
+	expected = [values[(times > t - 5.0 - 1e-9) & (times <= t)].mean() for t in times]
+	assert moving_average(times, values, 5.0) == pytest.approx(expected)
+
+
+def test_windowed_rate_matches_a_plain_loop():
+	rng = np.random.default_rng(2)
+	times = np.cumsum(rng.uniform(0.5, 1.5, 300))
+	totals = np.cumsum(rng.integers(0, 20, 300))
+	rates = windowed_rate(times, totals, 10.0)
+	for i in range(1, 300):
+		start = np.flatnonzero(times >= times[i] - 10.0)[0]
+		if start < i:
+			assert rates[i] == pytest.approx((totals[i] - totals[start]) / (times[i] - times[start]))
+
+
+def test_energy_applies_the_display_offset_and_factor():
+	store = TelemetryStore()
+	assert store.add_series(PULSE_SERIES, 2, np.int64, counter=True) is store[PULSE_SERIES]
+	assert store.energy_totals() is None
+
+	store.set_display_config(offset=100, pulse_factor=None)
+	store.set_display_config(offset=None, pulse_factor=0.5)
+	store.record_pulses(0.0, COUNTER_MODULUS - 1, 10)
+	store.record_pulses(1.0, 1, 20)
+	assert store.energy_totals().tolist() == [100 + (COUNTER_MODULUS + 1) * 0.5, 110.0]
+
+
+def test_plain_values_get_their_own_series():
+	store = TelemetryStore()
+	store.record("voltage", 0.0, 230.0)
+	store.record("voltage", 1.0, 232.0)
+	assert "voltage" in store and PULSE_SERIES not in store
+	times, values = store["voltage"].unwrapped()
+	assert values[:, 0].tolist() == [230.0, 232.0]
+
+
+def test_totals_carry_on_across_appends():
+	series = TelemetrySeries("pulses", 1, np.int64, counter=True)
+	readings = [COUNTER_MODULUS - 5, COUNTER_MODULUS - 1, 2, 9, 1, 4]
+	series.append(0.0, readings[0])
+	series.extend([1.0, 2.0], readings[1:3])
+	series.extend([3.0, 4.0, 5.0], readings[3:])
+
+	_, totals = series.unwrapped()
+	assert totals[:, 0].tolist() == unwrap_counter(np.array(readings)).tolist()
+	assert series.last_total().tolist() == [totals[-1, 0]]
+	assert unwrap_counter([5], previous=COUNTER_MODULUS - 1, total=100).tolist() == [106]
+
+
+def test_nothing_recorded_has_no_energy_total():
+	assert TelemetryStore().energy_totals("voltage") is None
+	assert TelemetrySeries("voltage").last_total() is None
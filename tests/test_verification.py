@@ -0,0 +1,123 @@
+import pytest
+
+from app.back_logic.protocol import MBREGCFG, MSGVAR, OFFSET
+from app.back_logic.serial_worker import SerialWorker
+from app.back_logic.config_manager import save_to_config
+from app.back_logic.verification import (
+	VERIFY_WRITES_KEY,
+	VerificationError,
+	verification_enabled,
+	verification_message,
+	write_session,
+	written_values,
+)
+from tests.fake_port import FakeEcm, fake_controller
+
+ROW = "3,1,352,2,2,60,1,0"
+
+
+@pytest.fixture
+def port():
+	return FakeEcm()
+
+
+@pytest.fixture
+def controller(port):
+	return fake_controller(port)
+
+
+def write(controller, *commands):
+	for command in commands:
+		controller.send_command(command)
+
+
+def read_back(port) -> list[str]:
+	# past the programming mode probe, leaving out the query that identifies the device
+	queries = port.written[port.written.index("AT+PROGMODE=1") + 2:]
+	return [line for line in queries if line.endswith("?") and line != "AT+DEVID?"]
+
+
+def test_kept_values_pass_with_one_batched_read_back(controller, port):
+	with write_session(controller, verify=True):
+		write(controller, "AT+OFFSET=5\r\n", f"AT+MBREGCFG={ROW}\r\n", "AT+MSGVAR=255\r\n", "AT+MSGVAR=7\r\n")
+
+	assert read_back(port) == ["AT+OFFSET?", "AT+MBREGCFG?", "AT+MSGVAR?"]
+	assert port.written[-1] == "AT+PROGMODE=0"
+	# the values read back are left in the cache
+	assert controller.cache.peek([OFFSET, MSGVAR]) == [5, {0: 7, 1: None}]
+
+
+def test_values_the_device_did_not_keep_are_reported(controller, port):
+	port.replies["AT+OFFSET=5"] = "OK\r\n"  # acknowledged, but the device keeps its old value
+	port.replies[f"AT+MBREGCFG={ROW}"] = "OK\r\n"
+
+	with pytest.raises(VerificationError) as error:
+		with write_session(controller, verify=True):
+			write(controller, "AT+OFFSET=5\r\n", f"AT+MBREGCFG={ROW}\r\n", "AT+FPULSE=2\r\n")
+
+	assert [mismatch.name for mismatch in error.value.mismatches] == ["OFFSET", "MBREGCFG 3"]
+	assert error.value.mismatches[0].actual == 120
+	assert port.written[-1] == "AT+PROGMODE=0"
+
+
+def test_appended_payload_codes_are_checked_against_the_last_slots(controller, port):
+	with write_session(controller, verify=True):
+		write(controller, "AT+MSGVAR=7\r\n", "AT+MSGVAR=8\r\n")
+	assert port.msgvar == [10, 11, 7, 8]
+
+
+def test_nothing_is_read_back_without_verification(controller, port):
+	with write_session(controller, verify=False):
+		write(controller, "AT+OFFSET=5\r\n")
+	assert read_back(port) == []
+
+
+def test_rejected_writes_are_not_read_back(controller, port):
+	port.replies["AT+OFFSET=5"] = "ERROR\r\n"
+	with write_session(controller, verify=True):
+		write(controller, "AT+OFFSET=5\r\n", "AT+FPULSE=2\r\n")
+	assert read_back(port) == []
+	assert port.written[-1] == "AT+PROGMODE=0"
+
+
+def test_a_write_retried_after_an_error_is_verified(controller, port):
+	port.replies["AT+OFFSET=5"] = "ERROR\r\n"
+	with pytest.raises(VerificationError):
+		with write_session(controller, verify=True):
+			write(controller, "AT+OFFSET=5\r\n")
+			port.replies["AT+OFFSET=5"] = "OK\r\n"  # accepted the second time, but not kept
+			write(controller, "AT+OFFSET=5\r\n")
+
+
+def test_verification_is_off_until_enabled():
+	assert not verification_enabled()
+	save_to_config(VERIFY_WRITES_KEY, True)
+	assert verification_enabled()
+
+
+def test_written_values_are_typed_like_the_queries():
+	values = written_values([
+		"AT+OFFSET=5", "AT+OFFSET=6", "AT+CONFIG=16,00", "AT+MSGVAR=255", "AT+MSGVAR=4", f"AT+MBREGCFG={ROW}",
+	])
+	assert values["OFFSET"] == 6
+	assert values["IN3MODE"] == 1
+	assert values["MSGVAR"] == (True, [4])
+	assert values[MBREGCFG.name] == {3: MBREGCFG.parse(ROW + "\r\n")[0]}
+
+
+def test_verification_message_only_describes_mismatches(controller, port):
+	port.replies["AT+OFFSET=5"] = "OK\r\n"
+
+	def push(controller):
+		with write_session(controller, verify=True):
+			write(controller, "AT+OFFSET=5\r\n")
+
+	worker = SerialWorker(controller)
+	failed = worker.submit(push)
+	other = worker.submit(lambda controller: 1 / 0)
+	fine = worker.submit(lambda controller: None)
+	worker.stop(timeout=5)
+
+	assert verification_message(failed) == "El dispositivo no guardó los valores escritos:\nOFFSET: expected 5, read 120"
+	assert verification_message(other) is None
+	assert verification_message(fine) is None
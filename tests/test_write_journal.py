@@ -0,0 +1,131 @@
+import pytest
+import serial
+
+from app.back_logic import write_journal
+from app.back_logic.device_cache import DeviceCache
+from app.back_logic.protocol import DEVID
+from app.back_logic.write_journal import (
+	PendingJournalError,
+	WriteJournal,
+	journal_path,
+	send_journaled,
+	start_journal,
+)
+
+DEVICE_ID = "00ABC123"
+COMMANDS = [f"AT+MBREGCFG={i},1,{300 + i},2,2,60,1,0\r\n" for i in range(10)]
+
+
+class FakeController:
+	"""
+	Stands in for the port: acknowledges every write until `fail_after` of them went
+	through, then the line drops. The writes in `rejected` are answered ERROR.
+	"""
+
+	def __init__(self, fail_after: int | None = None, rejected: tuple[str, ...] = ()):
+		self.fail_after = fail_after
+		self.rejected = rejected
+		self.sent = []
+		self.cache = DeviceCache()
+		# the device is already identified, start_journal never touches the port
+		self.cache.device_id = DEVICE_ID
+		self.cache.store(DEVID, DEVICE_ID)
+
+	def send_windowed(self, commands, window=None, on_response=None):
+		responses = []
+		for index, command in enumerate(commands):
+			if self.fail_after is not None and len(self.sent) >= self.fail_after:
+				raise serial.SerialException("device disconnected")
+			self.sent.append(command)
+			response = "ERROR\r\n" if command in self.rejected else "OK\r\n"
+			responses.append(response)
+			on_response(index, response)
+		return responses
+
+
+@pytest.fixture(autouse=True)
+def journal_dir(tmp_path, monkeypatch):
+	monkeypatch.setattr(write_journal, "JOURNAL_DIR", str(tmp_path))
+	return tmp_path
+
+
+def interrupt_push(fail_after: int, commands=COMMANDS) -> WriteJournal:
+	controller = FakeController(fail_after)
+	journal = start_journal(controller, commands, "Registros Modbus")
+	with pytest.raises(serial.SerialException):
+		send_journaled(controller, journal)
+	return journal
+
+
+def test_completed_push_deletes_its_journal():
+	controller = FakeController()
+	journal = start_journal(controller, COMMANDS)
+	assert send_journaled(controller, journal) == []
+	assert controller.sent == COMMANDS
+	assert WriteJournal.load(DEVICE_ID) is None
+
+
+def test_interrupted_push_resumes_from_the_first_unacknowledged_write():
+	interrupt_push(fail_after=6)
+
+	pending = WriteJournal.load(DEVICE_ID)
+	assert pending.acked == set(range(6))
+	assert pending.label == "Registros Modbus"
+	assert pending.remaining() == [6, 7, 8, 9]
+
+	controller = FakeController()
+	journal = start_journal(controller, COMMANDS)
+	assert send_journaled(controller, journal, journal.remaining()) == []
+	assert controller.sent == COMMANDS[6:]
+	assert WriteJournal.load(DEVICE_ID) is None
+
+
+def test_rejected_writes_finish_the_session():
+	controller = FakeController(rejected=(COMMANDS[2], COMMANDS[7]))
+	journal = start_journal(controller, COMMANDS)
+	assert send_journaled(controller, journal) == [(COMMANDS[2].strip(), "ERROR"), (COMMANDS[7].strip(), "ERROR")]
+	assert WriteJournal.load(DEVICE_ID) is None
+
+	# so pushing other writes afterwards is not held up by it
+	assert start_journal(FakeController(), ["AT+OFFSET=5\r\n"]).commands == ["AT+OFFSET=5\r\n"]
+
+
+def test_rejected_writes_are_not_resent_on_resume():
+	controller = FakeController(fail_after=6, rejected=(COMMANDS[2],))
+	journal = start_journal(controller, COMMANDS)
+	with pytest.raises(serial.SerialException):
+		send_journaled(controller, journal)
+
+	pending = WriteJournal.load(DEVICE_ID)
+	assert pending.nacked == {2}
+	assert pending.remaining() == [6, 7, 8, 9]
+
+
+def test_torn_last_line_is_ignored(journal_dir):
+	interrupt_push(fail_after=3)
+	with open(journal_path(DEVICE_ID), "a", encoding="utf-8") as journal_file:
+		journal_file.write('{"ack": 3')
+
+	assert WriteJournal.load(DEVICE_ID).remaining() == list(range(3, 10))
+
+
+def test_other_writes_do_not_overwrite_an_unfinished_journal():
+	interrupt_push(fail_after=4)
+
+	with pytest.raises(PendingJournalError) as error:
+		start_journal(FakeController(), ["AT+OFFSET=5\r\n"], "Perfil")
+	assert error.value.journal.remaining() == list(range(4, 10))
+	assert WriteJournal.load(DEVICE_ID).commands == COMMANDS
+
+	WriteJournal.load(DEVICE_ID).discard()
+	assert start_journal(FakeController(), ["AT+OFFSET=5\r\n"]).commands == ["AT+OFFSET=5\r\n"]
+
+
+def test_payload_is_rebuilt_from_its_reset():
+	commands = ["AT+OFFSET=1\r\n", "AT+MSGVAR=255\r\n", "AT+MSGVAR=3\r\n", "AT+MSGVAR=4\r\n", "AT+FPULSE=2\r\n"]
+	interrupt_push(fail_after=3, commands=commands)
+
+	journal = WriteJournal.load(DEVICE_ID)
+	# sending AT+MSGVAR=4 alone would append it after whatever the payload holds now
+	assert journal.resume_index() == 1
+	assert journal.remaining() == [1, 2, 3, 4]